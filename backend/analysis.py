@@ -10,14 +10,16 @@ from __future__ import annotations
 import csv
 import re
 import unicodedata
-from collections import Counter, defaultdict
-from dataclasses import dataclass
+from collections import Counter
+from dataclasses import dataclass, field
 from datetime import date
 from pathlib import Path
 from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
+import numpy as np
+
 from .config import CSV_DELIMITER, CSV_ENCODING
-from .filterscripts import location_filter
+from .filterscripts import location_filter, schema, snapshot
 
 # Paths ---------------------------------------------------------------------
 
@@ -206,6 +208,27 @@ def _parse_date_any(raw: Optional[str]) -> Optional[date]:
     return None
 
 
+def _date_ordinal(raw: Optional[str]) -> Optional[int]:
+    parsed = _parse_date_any(raw)
+    return parsed.toordinal() if parsed else None
+
+
+# Numeric and date fields the analyzer sums, with the converters of their cells.
+_NUMBER_FIELDS = {
+    "oppervlakte": _to_float,
+    "working_min": _to_int,
+    "working_max": _to_int,
+    "oprichtingsdatum": _date_ordinal,
+}
+
+
+def _int_sum(values: np.ndarray) -> int:
+    """Total of a typed integer column (float64 only if a value overflowed int64)."""
+    if values.dtype.kind == "i":
+        return int(values.sum(dtype=np.int64))
+    return int(sum(values.tolist()))
+
+
 def _parse_sbi_cell(cell: Optional[str]) -> List[str]:
     if not cell:
         return []
@@ -238,14 +261,6 @@ def _canonical_province(name: Optional[str]) -> Optional[str]:
     return PROVINCE_KEY_MAP.get(_normalize_province_key(name))
 
 
-def _find_index(header: Sequence[str], candidates: Sequence[str]) -> Optional[int]:
-    normalized = {str(col).strip().lower(): idx for idx, col in enumerate(header)}
-    for cand in candidates:
-        if cand in normalized:
-            return normalized[cand]
-    return None
-
-
 # Province locator -----------------------------------------------------------
 
 
@@ -254,12 +269,17 @@ class ProvinceLocator:
 
     def __init__(self, header: Sequence[str], warnings: List[str]):
         self._warnings = warnings
-        self._lon_idx = _find_index(header, location_filter.LON_CANDS)
-        self._lat_idx = _find_index(header, location_filter.LAT_CANDS)
+        cols = schema.for_header(header)
+        # Repeated names resolve to their last column, as the analyzer always did.
+        self._lon_idx = cols.find(location_filter.LON_CANDS, last=True)
+        self._lat_idx = cols.find(location_filter.LAT_CANDS, last=True)
         self._tree = None
         self._geoms: List = []
         self._names: List[str] = []
         self._point_cls = None
+        self._labels: List[str] = []
+        self._column_for = None
+        self._column = None
         self.enabled = False
 
         if self._lon_idx is None or self._lat_idx is None:
@@ -278,13 +298,31 @@ class ProvinceLocator:
                 return
             self._tree = STRtree(self._geoms)
             self._point_cls = Point
+            self._labels = [_canonical_province(n) or n for n in self._names]
             self.enabled = True
         except Exception as exc:  # pragma: no cover - depends on shapely availability
             warnings.append(f"Shapely unavailable ({exc}) — province breakdown skipped.")
 
+    def _snapshot_column(self, snap):
+        """Cached province index per snapshot row (see location_filter.province_column)."""
+        if self._column_for is not snap:
+            self._column_for = snap
+            try:
+                self._column = location_filter.province_column(snap, self._lon_idx, self._lat_idx)
+            except Exception as exc:
+                self._warnings.append(f"Province column unavailable ({exc}) — resolving per row.")
+                self._column = None
+        return self._column
+
     def resolve(self, row: Sequence[str]) -> Optional[str]:
         if not self.enabled or self._tree is None or self._point_cls is None:
             return None
+        row_id = getattr(row, "row_id", None)
+        if row_id is not None:
+            column = self._snapshot_column(row.snapshot)
+            if column is not None and len(self._labels) == len(location_filter._PROV_NAMES):
+                code = int(column[row_id])
+                return self._labels[code] if code >= 0 else None
         try:
             lon = float(row[self._lon_idx])
             lat = float(row[self._lat_idx])
@@ -311,6 +349,89 @@ class ProvinceLocator:
         return None
 
 
+# Mergeable partial state ----------------------------------------------------
+
+# Additive scalar aggregates and Counter aggregates of AnalysisState.
+_STATE_SUMS: Sequence[str] = (
+    "total_rows",
+    "contact_count",
+    "econ_true",
+    "phone_count",
+    "fax_count",
+    "surface_sum",
+    "surface_n",
+    "wmin_sum",
+    "wmin_n",
+    "wmax_sum",
+    "wmax_n",
+    "date_sum",
+    "date_n",
+)
+_STATE_COUNTERS: Sequence[str] = (
+    "gebruiks_counts",
+    "kvk_counts",
+    "rechtsvorm_counts",
+    "province_counts",
+    "sbi_counts",
+)
+
+
+@dataclass
+class AnalysisState:
+    """Partial aggregates over a subset of rows.
+
+    States of disjoint row sets (file ranges, snapshot blocks, worker
+    processes) combine with merge(); to_dict()/from_dict() give a plain
+    JSON/pickle friendly form.
+    """
+
+    total_rows: int = 0
+    contact_count: int = 0
+    econ_true: int = 0
+    media_counts: Dict[str, int] = field(default_factory=lambda: {f: 0 for f in MEDIA_FIELDS})
+    phone_count: int = 0
+    fax_count: int = 0
+    gebruiks_counts: Counter = field(default_factory=Counter)
+    surface_sum: float = 0.0
+    surface_n: int = 0
+    wmin_sum: int = 0
+    wmin_n: int = 0
+    wmax_sum: int = 0
+    wmax_n: int = 0
+    date_sum: int = 0
+    date_n: int = 0
+    kvk_counts: Counter = field(default_factory=Counter)
+    rechtsvorm_counts: Counter = field(default_factory=Counter)
+    province_counts: Counter = field(default_factory=Counter)
+    sbi_counts: Counter = field(default_factory=Counter)
+
+    def merge(self, other: "AnalysisState") -> "AnalysisState":
+        for name in _STATE_SUMS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        for key, count in other.media_counts.items():
+            self.media_counts[key] = self.media_counts.get(key, 0) + count
+        for name in _STATE_COUNTERS:
+            getattr(self, name).update(getattr(other, name))
+        return self
+
+    def to_dict(self) -> Dict[str, object]:
+        out: Dict[str, object] = {name: getattr(self, name) for name in _STATE_SUMS}
+        out["media_counts"] = dict(self.media_counts)
+        for name in _STATE_COUNTERS:
+            out[name] = dict(getattr(self, name))
+        return out
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, object]) -> "AnalysisState":
+        state = cls()
+        for name in _STATE_SUMS:
+            setattr(state, name, data.get(name, 0))
+        state.media_counts.update(data.get("media_counts") or {})
+        for name in _STATE_COUNTERS:
+            getattr(state, name).update(data.get(name) or {})
+        return state
+
+
 # Streaming aggregator -------------------------------------------------------
 
 
@@ -343,31 +464,14 @@ class StreamingAnalyzer:
 
     def __init__(self, header: Sequence[str]):
         self.header = list(header)
-        self.total_rows = 0
-        self.contact_count = 0
-        self.econ_true = 0
-        self.media_counts = {field: 0 for field in MEDIA_FIELDS}
-        self.phone_count = 0
-        self.fax_count = 0
-        self.gebruiks_counts: Counter[str] = Counter()
-        self.surface_sum = 0.0
-        self.surface_n = 0
-        self.wmin_sum = 0
-        self.wmin_n = 0
-        self.wmax_sum = 0
-        self.wmax_n = 0
-        self.date_sum = 0
-        self.date_n = 0
-        self.kvk_counts: Dict[str, int] = defaultdict(int)
-        self.rechtsvorm_counts: Counter[str] = Counter()
-        self.province_counts: Counter[str] = Counter()
-        self.sbi_counts: Counter[str] = Counter()
+        self.state = AnalysisState()
         self.warnings: List[str] = []
 
+        cols = schema.for_header(self.header)
         self.indices: Dict[str, Optional[int]] = {
-            key: _find_index(self.header, cands)
-            for key, cands in self.COLUMN_CANDIDATES.items()
+            key: cols.resolve(f"analysis.{key}") for key in self.COLUMN_CANDIDATES
         }
+        self._values = {key: cols.getter(f"analysis.{key}") for key in _NUMBER_FIELDS}
         self.province_locator = ProvinceLocator(self.header, self.warnings)
 
     # ------------------------------------------------------------------
@@ -375,7 +479,72 @@ class StreamingAnalyzer:
     # ------------------------------------------------------------------
 
     def consume(self, row: Sequence[str]) -> None:
-        self.total_rows += 1
+        self._consume_text(row)
+        self._consume_numbers(row)
+
+    def consume_snapshot(self, snap, row_ids: np.ndarray) -> None:
+        """consume() for snapshot rows ``row_ids``; numeric and date columns
+        are summed from the snapshot's typed arrays instead of parsed per row."""
+        for row in snap.iter_rows(row_ids):
+            self._consume_text(row)
+        st = self.state
+
+        def column(key: str):
+            idx = self.indices.get(key)
+            if idx is None or idx >= snap.column_count:
+                return None
+            values, valid = snap.typed(idx, schema.CONVERTERS[f"analysis.{key}"])
+            ok = valid[row_ids]
+            return values[row_ids][ok], ok
+
+        area = column("oppervlakte")
+        if area is not None:
+            positive = area[0][area[0] > 0]
+            # Summed left to right like consume(), so float totals match exactly.
+            st.surface_sum += sum(positive.tolist())
+            st.surface_n += int(positive.shape[0])
+        wmin = column("working_min")
+        if wmin is not None:
+            st.wmin_sum += _int_sum(wmin[0])
+            st.wmin_n += int(wmin[1].sum())
+        wmax = column("working_max")
+        if wmax is not None:
+            values = np.where(wmax[0] == 999_999_999, 0, wmax[0])
+            st.wmax_sum += _int_sum(values)
+            st.wmax_n += int(wmax[1].sum())
+        dates = column("oprichtingsdatum")
+        if dates is not None:
+            st.date_sum += _int_sum(dates[0])
+            st.date_n += int(dates[1].sum())
+
+    def _consume_numbers(self, row: Sequence[str]) -> None:
+        st = self.state
+        get = self._values
+        area = get["oppervlakte"](row) if get["oppervlakte"] else None
+        if area is not None and area > 0:
+            st.surface_sum += area
+            st.surface_n += 1
+
+        v = get["working_min"](row) if get["working_min"] else None
+        if v is not None:
+            st.wmin_sum += v
+            st.wmin_n += 1
+
+        v = get["working_max"](row) if get["working_max"] else None
+        if v is not None:
+            if v == 999_999_999:
+                v = 0
+            st.wmax_sum += v
+            st.wmax_n += 1
+
+        ordinal = get["oprichtingsdatum"](row) if get["oprichtingsdatum"] else None
+        if ordinal is not None:
+            st.date_sum += ordinal
+            st.date_n += 1
+
+    def _consume_text(self, row: Sequence[str]) -> None:
+        st = self.state
+        st.total_rows += 1
 
         rv_idx = self.indices.get("rechtsvorm")
         rv = (
@@ -383,128 +552,107 @@ class StreamingAnalyzer:
         )
         if not rv:
             rv = "UNKNOWN"
-        self.rechtsvorm_counts[rv] += 1
+        st.rechtsvorm_counts[rv] += 1
 
         contact_idx = self.indices.get("contactpersoon")
         if contact_idx is not None and contact_idx < len(row) and _has_value(row[contact_idx]):
             val = str(row[contact_idx]).strip()
             if val not in {"[]", "{}"}:
-                self.contact_count += 1
+                st.contact_count += 1
 
         econ_idx = self.indices.get("economischactief")
         if econ_idx is not None and econ_idx < len(row) and _truthy(row[econ_idx]):
-            self.econ_true += 1
+            st.econ_true += 1
 
-        for field in MEDIA_FIELDS:
-            idx = self.indices.get(field)
+        for media_field in MEDIA_FIELDS:
+            idx = self.indices.get(media_field)
             if idx is not None and idx < len(row) and _has_value(row[idx]):
-                self.media_counts[field] += 1
+                st.media_counts[media_field] += 1
 
         phone_idx = self.indices.get("phone")
         if phone_idx is not None and phone_idx < len(row) and _has_value(row[phone_idx]):
-            self.phone_count += 1
+            st.phone_count += 1
 
         fax_idx = self.indices.get("fax")
         if fax_idx is not None and fax_idx < len(row) and _has_value(row[fax_idx]):
-            self.fax_count += 1
+            st.fax_count += 1
 
         gd_idx = self.indices.get("gebruiksdoel")
         if gd_idx is not None and gd_idx < len(row):
             gd_raw = str(row[gd_idx]).strip().lower()
             bucket = gd_raw if gd_raw in GEBRUIKSDOEL_BUCKETS else ("unknown" if gd_raw else "unknown")
-            self.gebruiks_counts[bucket] += 1
-
-        opp_idx = self.indices.get("oppervlakte")
-        if opp_idx is not None and opp_idx < len(row):
-            area = _to_float(row[opp_idx])
-            if area is not None and area > 0:
-                self.surface_sum += area
-                self.surface_n += 1
-
-        wmin_idx = self.indices.get("working_min")
-        if wmin_idx is not None and wmin_idx < len(row):
-            v = _to_int(row[wmin_idx])
-            if v is not None:
-                self.wmin_sum += v
-                self.wmin_n += 1
-
-        wmax_idx = self.indices.get("working_max")
-        if wmax_idx is not None and wmax_idx < len(row):
-            v = _to_int(row[wmax_idx])
-            if v is not None:
-                if v == 999_999_999:
-                    v = 0
-                self.wmax_sum += v
-                self.wmax_n += 1
-
-        date_idx = self.indices.get("oprichtingsdatum")
-        if date_idx is not None and date_idx < len(row):
-            dt = _parse_date_any(row[date_idx])
-            if dt:
-                self.date_sum += dt.toordinal()
-                self.date_n += 1
+            st.gebruiks_counts[bucket] += 1
 
         kvk_idx = self.indices.get("kvk")
         if kvk_idx is not None and kvk_idx < len(row):
             kvk = row[kvk_idx].strip()
             if kvk:
-                self.kvk_counts[kvk] += 1
+                st.kvk_counts[kvk] += 1
 
         province = self.province_locator.resolve(row)
         if province:
-            self.province_counts[province] += 1
+            st.province_counts[province] += 1
 
         sbi_idx = self.indices.get("allsbi")
         if sbi_idx is not None and sbi_idx < len(row):
             codes = _parse_sbi_cell(row[sbi_idx])
             for code in codes:
                 if code:
-                    self.sbi_counts[code] += 1
+                    st.sbi_counts[code] += 1
 
     # ------------------------------------------------------------------
     # Final result
     # ------------------------------------------------------------------
 
+    def take_state(self) -> AnalysisState:
+        """Return the rows consumed so far as a state and start a fresh one."""
+        state, self.state = self.state, AnalysisState()
+        return state
+
+    def merge(self, state: AnalysisState) -> None:
+        self.state.merge(state)
+
     def finalize(self) -> Dict[str, object]:
-        total = self.total_rows
+        st = self.state
+        total = st.total_rows
         pct = (lambda count: round(100.0 * count / total, 6) if total else 0.0)
 
         metrics: Dict[str, Dict[str, float]] = {}
 
-        metrics["contactpersoon"] = {"abs": self.contact_count, "pct": pct(self.contact_count)}
-        metrics["economischactief_true"] = {"abs": self.econ_true, "pct": pct(self.econ_true)}
+        metrics["contactpersoon"] = {"abs": st.contact_count, "pct": pct(st.contact_count)}
+        metrics["economischactief_true"] = {"abs": st.econ_true, "pct": pct(st.econ_true)}
 
-        for field in MEDIA_FIELDS:
-            count = self.media_counts[field]
-            metrics[field] = {"abs": count, "pct": pct(count)}
+        for media_field in MEDIA_FIELDS:
+            count = st.media_counts[media_field]
+            metrics[media_field] = {"abs": count, "pct": pct(count)}
 
-        metrics["phone"] = {"abs": self.phone_count, "pct": pct(self.phone_count)}
-        metrics["fax"] = {"abs": self.fax_count, "pct": pct(self.fax_count)}
+        metrics["phone"] = {"abs": st.phone_count, "pct": pct(st.phone_count)}
+        metrics["fax"] = {"abs": st.fax_count, "pct": pct(st.fax_count)}
 
         for bucket in GEBRUIKSDOEL_BUCKETS:
             safe = bucket.replace(" ", "_")
-            count = self.gebruiks_counts.get(bucket, 0)
+            count = st.gebruiks_counts.get(bucket, 0)
             metrics[f"gebruiksdoel_{safe}"] = {"abs": count, "pct": pct(count)}
 
-        unique_kvk = len(self.kvk_counts)
-        multi_kvk = sum(1 for val in self.kvk_counts.values() if val > 1)
+        unique_kvk = len(st.kvk_counts)
+        multi_kvk = sum(1 for val in st.kvk_counts.values() if val > 1)
         multi_pct = round(100.0 * multi_kvk / unique_kvk, 6) if unique_kvk else 0.0
 
         averages: Dict[str, Optional[float]] = {}
         averages["oppervlakte_avg_m2"] = (
-            round(self.surface_sum / self.surface_n, 6) if self.surface_n else None
+            round(st.surface_sum / st.surface_n, 6) if st.surface_n else None
         )
         averages["working_min_avg"] = (
-            round(self.wmin_sum / self.wmin_n, 6) if self.wmin_n else None
+            round(st.wmin_sum / st.wmin_n, 6) if st.wmin_n else None
         )
         averages["working_max_avg"] = (
-            round(self.wmax_sum / self.wmax_n, 6) if self.wmax_n else None
+            round(st.wmax_sum / st.wmax_n, 6) if st.wmax_n else None
         )
 
         avg_date_value = None
         avg_date_ordinal: Optional[int] = None
-        if self.date_n:
-            avg_date_ordinal = int(round(self.date_sum / self.date_n))
+        if st.date_n:
+            avg_date_ordinal = int(round(st.date_sum / st.date_n))
             try:
                 avg_date_value = date.fromordinal(avg_date_ordinal).isoformat()
             except ValueError:
@@ -517,7 +665,7 @@ class StreamingAnalyzer:
             "avg_oprichtingsdatum": {
                 "value": avg_date_value,
                 "ordinal": avg_date_ordinal,
-                "count": self.date_n,
+                "count": st.date_n,
             },
             "multi_kvk": {
                 "unique": unique_kvk,
@@ -526,20 +674,26 @@ class StreamingAnalyzer:
             },
             "rechtsvorm": {
                 key: {"abs": count, "pct": pct(count)}
-                for key, count in self.rechtsvorm_counts.items()
+                for key, count in st.rechtsvorm_counts.items()
             },
             "province": {
                 key: {"abs": count, "pct": pct(count)}
-                for key, count in self.province_counts.items()
+                for key, count in st.province_counts.items()
             },
             "sbi": {
                 key: {"abs": count, "pct": pct(count)}
-                for key, count in self.sbi_counts.items()
+                for key, count in st.sbi_counts.items()
             },
             "warnings": self.warnings,
         }
 
 
+for _key, _cands in StreamingAnalyzer.COLUMN_CANDIDATES.items():
+    schema.field(f"analysis.{_key}", _cands, last=True)
+for _key, _parse in _NUMBER_FIELDS.items():
+    snapshot.typed_field(f"analysis.{_key}", _parse)
+
+
 # Baseline data --------------------------------------------------------------
 
 
@@ -652,8 +806,8 @@ SUMMARY_LABELS: Dict[str, str] = {
     "fax": "Faxnummer aanwezig",
 }
 
-for field in MEDIA_FIELDS:
-    SUMMARY_LABELS[field] = f"{field.capitalize()} aanwezig"
+for media_field in MEDIA_FIELDS:
+    SUMMARY_LABELS[media_field] = f"{media_field.capitalize()} aanwezig"
 
 for bucket in GEBRUIKSDOEL_BUCKETS:
     safe = bucket.replace(" ", "_")
@@ -879,6 +1033,32 @@ def compare_with_baseline(
 # Entry point ----------------------------------------------------------------
 
 
+def collect_state(header: Sequence[str], rows: Iterable[Sequence[str]]) -> AnalysisState:
+    """Aggregate ``rows`` into a mergeable partial state."""
+    analyzer = StreamingAnalyzer(header)
+    for row in rows:
+        analyzer.consume(row)
+    return analyzer.state
+
+
+def analysis_from_state(
+    header: Sequence[str],
+    state: AnalysisState,
+    dimensions: Sequence[str],
+    warnings: Sequence[str] = (),
+) -> Dict[str, object]:
+    """Same result as perform_analysis() for rows already aggregated into ``state``."""
+    analyzer = StreamingAnalyzer(header)
+    analyzer.state = state
+    for msg in warnings:
+        if msg not in analyzer.warnings:
+            analyzer.warnings.append(msg)
+    filtered = analyzer.finalize()
+    baseline = _load_baseline()
+    comparison = compare_with_baseline(filtered, baseline, dimensions)
+    return comparison
+
+
 def perform_analysis(header: Sequence[str], rows: Iterable[Sequence[str]], dimensions: Sequence[str]) -> Dict[str, object]:
     analyzer = StreamingAnalyzer(header)
     for row in rows:
@@ -1,17 +1,19 @@
 import csv
 import json
+import os
 import re
 from datetime import datetime
 from pathlib import Path
 
 from flask import Flask, send_from_directory, jsonify, request, Response
 from backend.filterscripts import combinator
-from backend import tracking
+from backend import jobs, tracking, warmup, watcher
 
 app = Flask(__name__, static_folder="../frontend", static_url_path="")
 
 REPO_ROOT = Path(__file__).resolve().parents[1]
 PREFERENCES_DIR = REPO_ROOT / "bigdata" / "preferences"
+_EVENT_INTERVAL = 0.5  # seconds between job progress events
 
 
 def ensure_preferences_dir() -> Path:
@@ -61,14 +63,12 @@ def script():
 @app.route("/api/filters", methods=["GET"])
 def api_filters():
     print("/api/filters served — using registry in combinator.py")
-    try:
-        loc_opts = combinator.distinct_values('location') if hasattr(combinator,'distinct_values') else []
-    except Exception:
-        loc_opts = []
-    print('   location opts:', len(loc_opts))
+    options = combinator.get_filter_options()
+    print('   location opts:', len(options.get('location', [])))
     return jsonify({
         "filters": combinator.list_filters(),
-        "options": combinator.get_filter_options(),
+        "options": options,
+        "counts": combinator.get_filter_counts(),
     })
 
 @app.route("/api/preview", methods=["POST"])
@@ -76,6 +76,47 @@ def api_preview():
     payload = request.get_json(silent=True) or {}
     sel = payload.get("selected", {})
     advanced = payload.get("advanced", {})
+    client = str(payload.get("clientId") or "").strip()
+    stream = bool(payload.get("stream"))
+    if stream or client or payload.get("estimate"):
+        # Answer known counts directly; otherwise count in a job. A newer
+        # preview from the same client cancels this one mid-scan.
+        try:
+            count = combinator.cached_preview_count(sel, advanced)
+        except ValueError as exc:
+            return jsonify({"ok": False, "error": str(exc)}), 400
+        if count is not None:
+            return jsonify({"ok": True, "count": int(count)})
+
+        extra = {}
+        if payload.get("estimate"):
+            # Sample-based estimate now; with "stream" the exact count follows
+            # as a job, otherwise the estimate is the whole answer.
+            try:
+                estimate = combinator.estimate_count(sel, advanced)
+            except ValueError as exc:
+                return jsonify({"ok": False, "error": str(exc)}), 400
+            except OSError as exc:
+                return jsonify({"ok": False, "error": f"Filesystem error: {exc}"}), 500
+            if estimate is not None:
+                if estimate["exact"]:
+                    return jsonify({"ok": True, "count": estimate["estimate"]})
+                if not stream:
+                    return jsonify({"ok": True, "estimate": estimate})
+                extra["estimate"] = estimate
+
+        def run(progress):
+            return {"ok": True, "count": int(combinator.preview_count(sel, advanced, progress=progress))}
+
+        group = f"preview:{client}" if client else None
+        if stream:
+            return _enqueue("preview", run, group, extra)
+        job = jobs.manager.submit("preview", run, group, inline=True)
+        if job.status == "done":
+            return jsonify(job.result)
+        if job.status == "cancelled":
+            return jsonify({"ok": False, "cancelled": True, "error": "Superseded by a newer preview"}), 409
+        return jsonify({"ok": False, "error": job.error}), job.error_status or 500
     try:
         count = combinator.preview_count(sel, advanced)
     except ValueError as exc:
@@ -95,17 +136,70 @@ def api_analysis():
         dims = [str(item) for item in dims_raw if isinstance(item, str)]
     else:
         dims = []
-    try:
-        result = combinator.statistical_analysis(sel, advanced, dims)
-    except FileNotFoundError as exc:
-        return jsonify({"ok": False, "error": str(exc)}), 404
-    except ValueError as exc:
-        return jsonify({"ok": False, "error": str(exc)}), 400
-    except OSError as exc:
-        return jsonify({"ok": False, "error": f"Filesystem error: {exc}"}), 500
-    response = {"ok": True}
-    response.update(result)
-    return jsonify(response)
+
+    def run(progress):
+        response = {"ok": True}
+        response.update(combinator.statistical_analysis(sel, advanced, dims, progress=progress))
+        return response
+
+    return _enqueue("analysis", run)
+
+
+def _enqueue(kind, fn, group=None, extra=None):
+    """Run ``fn(progress)`` as a background job; the client polls /api/jobs/<id>."""
+    job = jobs.manager.submit(kind, fn, group)
+    response = {
+        "ok": True,
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/api/jobs/{job.id}",
+    }
+    response.update(extra or {})
+    return jsonify(response), 202
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def api_job_status(job_id):
+    job = jobs.manager.get(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "Unknown job"}), 404
+    return jsonify({"ok": True, "job": job.to_dict()})
+
+
+@app.route("/api/jobs/<job_id>/events", methods=["GET"])
+def api_job_events(job_id):
+    """Server-Sent Events: a ``progress`` event every _EVENT_INTERVAL seconds, then
+    one ``done``/``failed``/``cancelled`` event carrying the final job state."""
+    job = jobs.manager.get(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "Unknown job"}), 404
+
+    def gen():
+        while not job.done:
+            yield f"event: progress\ndata: {json.dumps(job.to_dict())}\n\n"
+            job.wait(_EVENT_INTERVAL)
+        yield f"event: {job.status}\ndata: {json.dumps(job.to_dict())}\n\n"
+
+    headers = {
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-store",
+        "X-Accel-Buffering": "no",
+    }
+    return Response(gen(), headers=headers)
+
+
+@app.route("/api/jobs/<job_id>/cancel", methods=["POST"])
+def api_job_cancel(job_id):
+    job = jobs.manager.cancel(job_id)
+    if job is None:
+        return jsonify({"ok": False, "error": "Unknown job"}), 404
+    return jsonify({"ok": True, "job": job.to_dict()})
+
+@app.route("/api/health/ready", methods=["GET"])
+def api_health_ready():
+    state = warmup.status()
+    state["source"] = watcher.status()
+    return jsonify({"ok": True, **state}), (200 if state["ready"] else 503)
 
 @app.route("/api/download", methods=["POST"])
 def api_download():
@@ -130,38 +224,36 @@ def api_download():
     return Response(gen(), headers=headers)
 
 
-@app.route("/api/save", methods=["POST"])
-def api_save():
-    payload = request.get_json(silent=True) or {}
-    sel = payload.get("selected", {})
-    advanced = payload.get("advanced", {})
-    if not isinstance(sel, dict):
-        sel = {}
-    if not isinstance(advanced, dict):
-        advanced = {}
+def _save_response(files, total_rows, details, fallback_directory=None, fallback_max_rows=None):
+    response = {
+        "ok": True,
+        "files": [str(p) for p in files],
+        "created_files": len(files),
+        "total_rows": total_rows,
+    }
+    if details:
+        response["destinations"] = details
+        response["directory"] = details[0]["directory"]
+        response["max_rows_per_file"] = details[0]["max_rows_per_file"]
+    else:
+        if fallback_directory:
+            response["directory"] = str(Path(fallback_directory).expanduser().resolve())
+        if fallback_max_rows is not None:
+            response["max_rows_per_file"] = fallback_max_rows
+    return response
+
+
+def _parse_save_destinations(payload):
+    """Destinations of a save payload, plus the legacy single-destination fallbacks.
+
+    Returns ``(destinations, fallback_directory, fallback_max_rows)``; raises
+    ValueError with a user-facing message for invalid input.
+    """
     directory_raw = str(payload.get("directory") or "").strip()
     base_name = str(payload.get("baseName") or payload.get("basename") or "").strip()
     max_rows_raw = payload.get("maxRowsPerFile") or payload.get("max_rows_per_file")
     destinations_payload = payload.get("destinations")
 
-    def build_response(files, total_rows, details, fallback_directory=None, fallback_max_rows=None):
-        response = {
-            "ok": True,
-            "files": [str(p) for p in files],
-            "created_files": len(files),
-            "total_rows": total_rows,
-        }
-        if details:
-            response["destinations"] = details
-            response["directory"] = details[0]["directory"]
-            response["max_rows_per_file"] = details[0]["max_rows_per_file"]
-        else:
-            if fallback_directory:
-                response["directory"] = str(Path(fallback_directory).expanduser().resolve())
-            if fallback_max_rows is not None:
-                response["max_rows_per_file"] = fallback_max_rows
-        return response
-
     if isinstance(destinations_payload, list) and len(destinations_payload) > 0:
         parsed_dests = []
         rest_seen = False
@@ -183,18 +275,18 @@ def api_save():
 
             directory_val = str(directory_val or "").strip()
             if not directory_val:
-                return jsonify({"ok": False, "error": f"Destination {idx + 1}: directory is required"}), 400
+                raise ValueError(f"Destination {idx + 1}: directory is required")
 
             base_val = str(base_val or "").strip()
 
             if max_rows_val is None:
-                return jsonify({"ok": False, "error": f"Destination {idx + 1}: max rows per file is required"}), 400
+                raise ValueError(f"Destination {idx + 1}: max rows per file is required")
             try:
                 max_rows = int(max_rows_val)
             except (TypeError, ValueError):
-                return jsonify({"ok": False, "error": f"Destination {idx + 1}: max rows per file must be an integer"}), 400
+                raise ValueError(f"Destination {idx + 1}: max rows per file must be an integer")
             if max_rows <= 0:
-                return jsonify({"ok": False, "error": f"Destination {idx + 1}: max rows per file must be greater than zero"}), 400
+                raise ValueError(f"Destination {idx + 1}: max rows per file must be greater than zero")
 
             if isinstance(rows_val, str) and rows_val.strip().upper() == "R":
                 rows_val = None
@@ -210,16 +302,16 @@ def api_save():
 
             if is_rest:
                 if rest_seen:
-                    return jsonify({"ok": False, "error": "Only one destination can use R (rest)."}), 400
+                    raise ValueError("Only one destination can use R (rest).")
                 rest_seen = True
                 requested_rows = None
             else:
                 try:
                     requested_rows = int(rows_val)
                 except (TypeError, ValueError):
-                    return jsonify({"ok": False, "error": f"Destination {idx + 1}: amount saved must be a positive integer or R"}), 400
+                    raise ValueError(f"Destination {idx + 1}: amount saved must be a positive integer or R")
                 if requested_rows <= 0:
-                    return jsonify({"ok": False, "error": f"Destination {idx + 1}: amount saved must be greater than zero"}), 400
+                    raise ValueError(f"Destination {idx + 1}: amount saved must be greater than zero")
 
             parsed_dests.append({
                 "directory": directory_val,
@@ -227,28 +319,17 @@ def api_save():
                 "max_rows_per_file": max_rows,
                 "rows_requested": requested_rows,
             })
-
-        try:
-            files, total_rows, details = combinator.save_filtered_csv_multi(sel, parsed_dests, advanced)
-        except ValueError as exc:
-            return jsonify({"ok": False, "error": str(exc)}), 400
-        except PermissionError as exc:
-            return jsonify({"ok": False, "error": f"Permission denied: {exc}"}), 403
-        except OSError as exc:
-            return jsonify({"ok": False, "error": f"Filesystem error: {exc}"}), 500
-
-        tracking.record_campaign_run(sel, advanced, details)
-        return jsonify(build_response(files, total_rows, details))
+        return parsed_dests, None, None
 
     # Fallback to legacy single-destination payload
     if not directory_raw:
-        return jsonify({"ok": False, "error": "Target directory is required"}), 400
+        raise ValueError("Target directory is required")
     if not base_name:
-        return jsonify({"ok": False, "error": "Base filename is required"}), 400
+        raise ValueError("Base filename is required")
     try:
         max_rows = int(max_rows_raw)
     except (TypeError, ValueError):
-        return jsonify({"ok": False, "error": "Max rows per file must be an integer"}), 400
+        raise ValueError("Max rows per file must be an integer")
 
     single_dest = [{
         "directory": directory_raw,
@@ -256,9 +337,25 @@ def api_save():
         "max_rows_per_file": max_rows,
         "rows_requested": None,
     }]
+    return single_dest, directory_raw, max_rows
+
+
+@app.route("/api/save", methods=["POST"])
+def api_save():
+    payload = request.get_json(silent=True) or {}
+    sel = payload.get("selected", {})
+    advanced = payload.get("advanced", {})
+    if not isinstance(sel, dict):
+        sel = {}
+    if not isinstance(advanced, dict):
+        advanced = {}
+    try:
+        destinations, fallback_directory, fallback_max_rows = _parse_save_destinations(payload)
+    except ValueError as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 400
 
     try:
-        files, total_rows, details = combinator.save_filtered_csv_multi(sel, single_dest, advanced)
+        sink = combinator.SaveSink(destinations)
     except ValueError as exc:
         return jsonify({"ok": False, "error": str(exc)}), 400
     except PermissionError as exc:
@@ -266,8 +363,96 @@ def api_save():
     except OSError as exc:
         return jsonify({"ok": False, "error": f"Filesystem error: {exc}"}), 500
 
-    tracking.record_campaign_run(sel, advanced, details)
-    return jsonify(build_response(files, total_rows, details, fallback_directory=directory_raw, fallback_max_rows=max_rows))
+    def run(progress):
+        files, total_rows, details = combinator.run_job(sel, {"save": sink}, advanced, progress=progress)["save"]
+        tracking.record_campaign_run(sel, advanced, details)
+        return _save_response(
+            files,
+            total_rows,
+            details,
+            fallback_directory=fallback_directory,
+            fallback_max_rows=fallback_max_rows,
+        )
+
+    return _enqueue("save", run)
+
+
+@app.route("/api/job", methods=["POST"])
+def api_job():
+    """Fused export: one filter pass feeding count, analysis, save and tracking together.
+
+    Each of ``count``, ``analysis``, ``save`` and ``tracking`` is optional.
+    ``save`` takes the /api/save payload fields, ``tracking`` the
+    /api/tracking/run fields (campaign and base name default to the first save
+    destination), ``analysis`` may carry ``dimensions``.
+    """
+    payload = request.get_json(silent=True) or {}
+    sel = payload.get("selected", {})
+    advanced = payload.get("advanced", {})
+    if not isinstance(sel, dict):
+        sel = {}
+    if not isinstance(advanced, dict):
+        advanced = {}
+
+    sinks = {}
+    save_fallbacks = (None, None)
+    try:
+        if payload.get("count"):
+            sinks["count"] = combinator.CountSink()
+        analysis_opts = payload.get("analysis")
+        if analysis_opts:
+            dims_raw = analysis_opts.get("dimensions") if isinstance(analysis_opts, dict) else None
+            dims = [str(item) for item in dims_raw if isinstance(item, str)] if isinstance(dims_raw, list) else []
+            sinks["analysis"] = combinator.AnalysisSink(dims)
+        save_opts = payload.get("save")
+        destinations = []
+        if isinstance(save_opts, dict):
+            destinations, fallback_directory, fallback_max_rows = _parse_save_destinations(save_opts)
+            save_fallbacks = (fallback_directory, fallback_max_rows)
+            sinks["save"] = combinator.SaveSink(destinations)
+        tracking_opts = payload.get("tracking")
+        if isinstance(tracking_opts, dict):
+            options = _tracking_options(tracking_opts)
+            if options["mode"] == "revert":
+                raise ValueError("Revert is not available in a job; use /api/tracking/run.")
+            if destinations and not options["campaign_directory"]:
+                options["campaign_directory"] = str(Path(destinations[0]["directory"]).expanduser().resolve())
+            if destinations and not options["subcampaign_base"]:
+                options["subcampaign_base"] = combinator._sanitize_basename(str(destinations[0]["base_name"]))
+            sinks["tracking"] = tracking.TrackingSink(selected=sel, advanced=advanced, **options)
+        if not sinks:
+            raise ValueError("A job needs at least one output")
+    except FileNotFoundError as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 404
+    except ValueError as exc:
+        return jsonify({"ok": False, "error": str(exc)}), 400
+    except PermissionError as exc:
+        return jsonify({"ok": False, "error": f"Permission denied: {exc}"}), 403
+    except OSError as exc:
+        return jsonify({"ok": False, "error": f"Filesystem error: {exc}"}), 500
+
+    def run(progress):
+        results = combinator.run_job(sel, sinks, advanced, progress=progress)
+        response = {"ok": True}
+        if "count" in results:
+            response["count"] = int(results["count"])
+        if "analysis" in results:
+            response["analysis"] = results["analysis"]
+        if "save" in results:
+            files, total_rows, details = results["save"]
+            tracking.record_campaign_run(sel, advanced, details)
+            response["save"] = _save_response(
+                files,
+                total_rows,
+                details,
+                fallback_directory=save_fallbacks[0],
+                fallback_max_rows=save_fallbacks[1],
+            )
+        if "tracking" in results:
+            response["tracking"] = results["tracking"]
+        return response
+
+    return _enqueue("job", run)
 
 
 @app.route("/api/preferences", methods=["GET"])
@@ -439,17 +624,9 @@ def api_tracking_latest():
     return jsonify(response)
 
 
-@app.route("/api/tracking/run", methods=["POST"])
-def api_tracking_run():
-    payload = request.get_json(silent=True) or {}
+def _tracking_options(payload):
+    """Keyword arguments for tracking.create_or_update_tracking_csv from a request payload."""
     mode_raw = str(payload.get("mode") or "create")
-    mode = mode_raw.strip().lower()
-    selected = payload.get("selected") or {}
-    advanced = payload.get("advanced") or {}
-    if not isinstance(selected, dict):
-        selected = {}
-    if not isinstance(advanced, dict):
-        advanced = {}
     directory = (
         payload.get("campaignDirectory")
         or payload.get("campaign_directory")
@@ -474,6 +651,29 @@ def api_tracking_run():
         or payload.get("duplicatesSourcePath")
         or payload.get("duplicatesSource")
     )
+    return {
+        "campaign_directory": directory,
+        "subcampaign_base": base_name,
+        "mode": mode_raw.strip().lower(),
+        "target_path": target_path,
+        "duplicates_source": duplicates_source,
+    }
+
+
+@app.route("/api/tracking/run", methods=["POST"])
+def api_tracking_run():
+    payload = request.get_json(silent=True) or {}
+    selected = payload.get("selected") or {}
+    advanced = payload.get("advanced") or {}
+    if not isinstance(selected, dict):
+        selected = {}
+    if not isinstance(advanced, dict):
+        advanced = {}
+    options = _tracking_options(payload)
+    mode = options["mode"]
+    directory = options["campaign_directory"]
+    base_name = options["subcampaign_base"]
+    target_path = options["target_path"]
 
     if mode == "revert":
         try:
@@ -492,23 +692,18 @@ def api_tracking_run():
         return jsonify(response)
 
     try:
-        result = tracking.create_or_update_tracking_csv(
-            selected=selected,
-            advanced=advanced,
-            campaign_directory=directory,
-            subcampaign_base=base_name,
-            mode=mode,
-            target_path=target_path,
-            duplicates_source=duplicates_source,
-        )
+        sink = tracking.TrackingSink(selected=selected, advanced=advanced, **options)
     except ValueError as exc:
         return jsonify({"ok": False, "error": str(exc)}), 400
     except OSError as exc:
         return jsonify({"ok": False, "error": f"Filesystem error: {exc}"}), 500
 
-    response = {"ok": True}
-    response.update(result)
-    return jsonify(response)
+    def run(progress):
+        response = {"ok": True}
+        response.update(combinator.run_job(selected, {"tracking": sink}, advanced, progress=progress)["tracking"])
+        return response
+
+    return _enqueue("tracking", run)
 
 
 @app.route("/api/location/upload", methods=["POST"])
@@ -548,7 +743,14 @@ def api_location_upload():
         location_filter.invalidate_cache()
     except Exception as _e:
         print('[UPLOAD] invalidate_cache warning:', _e)
-    return jsonify({'ok': True, 'stored_as': out.name})
+
+    # Evaluate the new AOI now so the first filter run is a cached lookup
+    evaluation_seconds = None
+    try:
+        evaluation_seconds = combinator.warm_location(f"custom:{stem}")
+    except Exception as _e:
+        print('[UPLOAD] AOI warm-up warning:', _e)
+    return jsonify({'ok': True, 'stored_as': out.name, 'evaluation_seconds': evaluation_seconds})
 
 
 @app.route("/api/location/delete", methods=["POST"])
@@ -628,8 +830,24 @@ def api_sbi_upload():
 
     return jsonify({'ok': True, 'stored_as': stored, 'bucket': bucket})
 
+def _start_background() -> None:
+    """Start the warm-up and source watcher threads of this process (no-ops once started)."""
+    warmup.start()
+    watcher.start()
+
+
+@app.before_request
+def _ensure_background() -> None:
+    # Importing the app (tools, ``flask routes``, a preloading WSGI master)
+    # starts nothing; the first request a process serves starts its threads.
+    _start_background()
+
+
 if __name__ == "__main__":
     print("▶ Starting Compfilter on http://127.0.0.1:3004")
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        # The debug reloader serves requests from this child process.
+        _start_background()
     app.run(host="127.0.0.1", port=3004, debug=True)
 
 
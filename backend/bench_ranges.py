@@ -0,0 +1,97 @@
+"""Benchmark range selections on the snapshot: full typed-column scan vs range index.
+
+    python -m backend.bench_ranges [path/to/file.csv] [--repeat N]
+
+Builds (or reuses) the snapshot of the CSV (default CSV_PATH), then times each
+range selection of the working number, vestiging (oppervlakte) and overige
+(oprichtingsdatum) filters twice: comparing every row of the typed arrays, as
+the masks did before range indexes, and through Snapshot.value_range(). Both
+must select the same rows.
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from .config import CSV_PATH
+from .filterscripts import bitmap, overige_filter, schema, snapshot, vestiging_filter, workingnumber_filter
+
+
+def _best(fn: Callable[[], object], repeat: int) -> Tuple[float, object]:
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def _count(result) -> int:
+    return len(result) if isinstance(result, bitmap.RowBitmap) else int(np.count_nonzero(result))
+
+
+def _linear(snap, idx: int, parse, lo: Optional[int], hi: Optional[int]) -> np.ndarray:
+    vals, valid = snap.typed(idx, parse)
+    m = np.array(valid)
+    if lo is not None:
+        m &= vals >= lo
+    if hi is not None:
+        m &= vals <= hi
+    return m
+
+
+def _quantiles(snap, idx: int, parse) -> List[int]:
+    vals, valid = snap.typed(idx, parse)
+    present = np.asarray(vals)[np.asarray(valid)]
+    if not present.shape[0]:
+        return []
+    return [int(q) for q in np.quantile(present, [0.001, 0.01, 0.1, 0.5, 0.9])]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("csv", nargs="?", default=str(CSV_PATH))
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    snap = snapshot.open_snapshot(snapshot.build_snapshot(Path(args.csv)))
+    cols = schema.for_header(snap.header)
+    print(f"{snap.row_count} rows, zones of {snapshot.ZONE_ROWS} rows")
+
+    fields = [
+        ("oppervlakte", vestiging_filter._to_int_or_none_safe),
+        ("oprichtingsdatum", overige_filter._date_ordinal),
+        ("working_min", workingnumber_filter._to_int_or_none),
+        ("working_max", workingnumber_filter._to_int_or_none),
+    ]
+    print(f"{'field':<18}{'range':>26}{'rows':>10}{'scan ms':>10}{'index ms':>10}{'speedup':>9}")
+    for name, parse in fields:
+        idx = cols.resolve(name)
+        if idx is None:
+            print(f"{name:<18}{'(not in header)':>26}")
+            continue
+        start = time.perf_counter()
+        snap.range_index(idx, parse)
+        print(f"{name:<18}{'index load/build':>26}{'':>10}{'':>10}{(time.perf_counter() - start) * 1e3:>10.1f}")
+        q = _quantiles(snap, idx, parse)
+        if not q:
+            continue
+        ranges = [(q[3], q[3]), (q[0], q[1]), (q[2], q[3]), (q[4], None), (None, q[2]), (q[1], q[4])]
+        for lo, hi in ranges:
+            t_scan, ref = _best(lambda: _linear(snap, idx, parse, lo, hi), args.repeat)
+            t_index, got = _best(lambda: snap.value_range(idx, parse, lo, hi), args.repeat)
+            if _count(got) != int(ref.sum()):
+                raise SystemExit(f"{name} [{lo}, {hi}]: index selected {_count(got)} rows, scan {int(ref.sum())}")
+            label = f"[{'-' if lo is None else lo}, {'-' if hi is None else hi}]"
+            print(
+                f"{name:<18}{label:>26}{int(ref.sum()):>10}{t_scan * 1e3:>10.2f}{t_index * 1e3:>10.2f}"
+                f"{t_scan / max(t_index, 1e-9):>8.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
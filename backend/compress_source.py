@@ -0,0 +1,62 @@
+"""Compress a source CSV in a seekable block format, then time reading it back.
+
+    python -m backend.compress_source file.csv [--codec zstd|gzip] [--level N] [--block-mb N]
+
+Writes ``file.csv.zst`` (zstd seekable format) or ``file.csv.gz`` (BGZF), so
+parallel range scans can decompress blocks independently. Afterwards the
+output is read back once: decompression throughput is reported separately
+from CSV parse throughput.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import time
+from pathlib import Path
+
+from .config import CSV_DELIMITER, CSV_PATH
+from .filterscripts import source
+
+_SUFFIXES = {"zstd": ".zst", "gzip": ".gz"}
+
+
+def _read_back(path: Path) -> None:
+    stats = source.ReadStats()
+    start = time.perf_counter()
+    rows = 0
+    with source.open_text(path, stats) as fh:
+        for _row in csv.reader(fh, delimiter=CSV_DELIMITER):
+            rows += 1
+    parse = max(time.perf_counter() - start - stats.seconds, 1e-9)
+    print(f"read back: {stats.describe()}")
+    print(f"parsed {rows} records in {parse:.2f}s ({rows / parse:.0f} rows/s, {stats.raw_bytes / 1e6 / parse:.0f} MB/s)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("csv", nargs="?", default=str(CSV_PATH))
+    parser.add_argument("--codec", choices=sorted(_SUFFIXES), default="zstd")
+    parser.add_argument("--level", type=int, default=None)
+    parser.add_argument("--block-mb", type=float, default=4.0, help="zstd frame size (BGZF blocks are 64 KiB)")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    src = Path(args.csv)
+    out = Path(args.out) if args.out else src.with_name(src.name + _SUFFIXES[args.codec])
+    tmp = out.with_name(out.name + ".tmp")
+    start = time.perf_counter()
+    with source.open_binary(src) as fh, tmp.open("wb") as dst:
+        blocks = source.write_blocks(fh, dst, args.codec, args.level, int(args.block_mb * 1024 * 1024))
+    tmp.replace(out)
+    elapsed = time.perf_counter() - start
+    raw = sum(b.raw_size for b in blocks)
+    size = out.stat().st_size
+    print(
+        f"wrote {out}: {len(blocks)} blocks, {raw / 1e6:.1f} MB -> {size / 1e6:.1f} MB "
+        f"({size / max(raw, 1):.1%}) in {elapsed:.2f}s"
+    )
+    _read_back(out)
+
+
+if __name__ == "__main__":
+    main()
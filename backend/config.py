@@ -6,3 +6,43 @@ CSV_ENCODING = 'utf-8'
 HOST = "127.0.0.1"
 PORT = int(os.environ.get("PORT", "3004"))
 DEBUG = True
+
+# Columnar snapshot of CSV_PATH (see filterscripts/snapshot.py)
+SNAPSHOT_DIR = Path(__file__).resolve().parents[1] / "bigdata" / "snapshots"
+SNAPSHOT_ENABLED = os.environ.get("SNAPSHOT_ENABLED", "1") != "0"
+SNAPSHOT_DICT_MAX = 65536  # max distinct values for a dictionary-encoded column
+SNAPSHOT_BITMAP_MAX = 1024  # dictionary columns up to this many values get per-value row bitmaps
+# Ingest a changed CSV as a delta segment on top of the served snapshot (see filterscripts/delta.py)
+DELTA_ENABLED = os.environ.get("SNAPSHOT_DELTA", "1") != "0"
+DELTA_MAX_FRACTION = 0.1  # rebuild in full once added plus removed rows exceed this share of the base
+DELTA_MAX_SEGMENTS = 8  # ... or once this many delta segments are stacked on one base
+# Distinct-value catalog served by /api/filters (see filterscripts/catalog.py)
+CATALOG_MAX_VALUES = 4096  # columns with more distinct values are not catalogued
+
+# Preview counts remembered per normalized selection (LRU entries)
+PREVIEW_CACHE_SIZE = 256
+# Estimated previews evaluate a persisted stratified sample (see filterscripts/sample.py)
+PREVIEW_SAMPLE_RATE = 0.01
+PREVIEW_SAMPLE_MIN_ROWS = 20000  # smaller files are "sampled" completely
+# Per-filter match bitmaps kept for incremental re-filtering (bytes)
+FILTER_CACHE_BYTES = 256 * 1024 * 1024
+# Row-level filter ordering (see filterscripts/planner.py)
+PLAN_SAMPLE_ROWS = 2000  # rows each filter is timed on
+PLAN_STATS_CACHE = 512  # measured (selectivity, cost) entries kept
+# Partial analysis states kept per snapshot block (entries; each holds the block's KVK counts)
+ANALYSIS_CACHE_CHUNKS = 64
+
+# Parallel CSV scan when no snapshot is available (see filterscripts/scan.py)
+SCAN_WORKERS = int(os.environ.get("SCAN_WORKERS", str(os.cpu_count() or 1)))
+SCAN_MIN_BYTES = 64 * 1024 * 1024  # smaller files are scanned in-process
+
+# Build geometry, baseline, snapshot and indexes in the background at startup (see warmup.py)
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "1") != "0"
+
+# Poll CSV_PATH for a new version and rebuild derived data in the background (see watcher.py)
+WATCH_ENABLED = os.environ.get("WATCH_ENABLED", "1") != "0"
+WATCH_INTERVAL = 30  # seconds between polls; a change must also hold for one poll
+
+# Background jobs for save/analysis/tracking requests (see jobs.py)
+JOB_WORKERS = 2
+JOB_HISTORY = 50  # finished jobs kept for /api/jobs/<id>
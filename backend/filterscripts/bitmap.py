@@ -0,0 +1,315 @@
+"""Compressed row-id bitmaps (a small Roaring-style implementation).
+
+Row ids are split on their high 16 bits into chunks of 65536 rows. Each
+non-empty chunk is stored as either
+
+- a sorted ``uint16`` array of the low bits (sparse chunks, <= 4096 rows), or
+- a 1024-word ``uint64`` bitset (dense chunks),
+
+so a bitmap never takes more than ~8 KiB per 65536 rows and unions and
+intersections work chunk by chunk without expanding to a full row mask.
+
+Filter ``mask()`` functions may return a :class:`RowBitmap` instead of a
+boolean array; :func:`intersect_all` combines a mix of both.
+"""
+from __future__ import annotations
+
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+
+CHUNK_BITS = 16
+CHUNK_SIZE = 1 << CHUNK_BITS
+WORDS = CHUNK_SIZE // 64
+# Above this cardinality a bitset is smaller than a uint16 array.
+ARRAY_MAX = 4096
+
+_ONE = np.uint64(1)
+
+
+def _popcount(words: np.ndarray) -> int:
+    if hasattr(np, "bitwise_count"):
+        return int(np.bitwise_count(words).sum())
+    return int(np.unpackbits(words.view(np.uint8)).sum())
+
+
+def _to_bits(low: np.ndarray) -> np.ndarray:
+    mask = np.zeros(CHUNK_SIZE, dtype=bool)
+    mask[low] = True
+    return np.packbits(mask, bitorder="little").view(np.uint64)
+
+
+def _from_bits(words: np.ndarray) -> np.ndarray:
+    mask = np.unpackbits(words.view(np.uint8), bitorder="little").view(bool)
+    return np.flatnonzero(mask).astype(np.uint16)
+
+
+def _contains(words: np.ndarray, low: np.ndarray) -> np.ndarray:
+    low = low.astype(np.uint64)
+    return (words[low >> np.uint64(6)] >> (low & np.uint64(63))) & _ONE != 0
+
+
+def _compact(words: np.ndarray) -> Optional[np.ndarray]:
+    """Pick the smaller container for ``words`` (None when empty)."""
+    n = _popcount(words)
+    if n == 0:
+        return None
+    if n <= ARRAY_MAX:
+        return _from_bits(words)
+    return words
+
+
+def _is_bits(container: np.ndarray) -> bool:
+    return container.dtype == np.uint64
+
+
+class RowBitmap:
+    """Set of row ids in ``range(size)``."""
+
+    __array_ufunc__ = None  # make ``ndarray & RowBitmap`` defer to __rand__
+
+    def __init__(self, size: int, chunks: Optional[Dict[int, np.ndarray]] = None):
+        self.size = int(size)
+        self.chunks: Dict[int, np.ndarray] = chunks or {}
+
+    # Construction -----------------------------------------------------------
+
+    @classmethod
+    def from_ids(cls, ids: np.ndarray, size: int) -> "RowBitmap":
+        """Build from sorted, unique row ids."""
+        ids = np.asarray(ids, dtype=np.int64)
+        chunks: Dict[int, np.ndarray] = {}
+        if ids.shape[0]:
+            keys = ids >> CHUNK_BITS
+            cuts = np.flatnonzero(np.diff(keys)) + 1
+            for part in np.split(ids, cuts):
+                low = (part & (CHUNK_SIZE - 1)).astype(np.uint16)
+                chunks[int(part[0]) >> CHUNK_BITS] = _to_bits(low) if low.shape[0] > ARRAY_MAX else low
+        return cls(size, chunks)
+
+    @classmethod
+    def from_mask(cls, mask: np.ndarray) -> "RowBitmap":
+        return cls.from_ids(np.flatnonzero(mask), int(mask.shape[0]))
+
+    @classmethod
+    def full(cls, size: int) -> "RowBitmap":
+        return cls.from_mask(np.ones(size, dtype=bool))
+
+    # Conversion -------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return sum(_popcount(c) if _is_bits(c) else int(c.shape[0]) for c in self.chunks.values())
+
+    @property
+    def nbytes(self) -> int:
+        return sum(c.nbytes for c in self.chunks.values())
+
+    def to_ids(self) -> np.ndarray:
+        parts: List[np.ndarray] = []
+        for key in sorted(self.chunks):
+            c = self.chunks[key]
+            low = _from_bits(c) if _is_bits(c) else c
+            parts.append(low.astype(np.int64) + (key << CHUNK_BITS))
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(parts)
+
+    def to_mask(self) -> np.ndarray:
+        out = np.zeros(self.size, dtype=bool)
+        out[self.to_ids()] = True
+        return out
+
+    # Set algebra ------------------------------------------------------------
+
+    def __and__(self, other):
+        if isinstance(other, np.ndarray):
+            return self.to_mask() & other
+        chunks: Dict[int, np.ndarray] = {}
+        for key in self.chunks.keys() & other.chunks.keys():
+            a, b = self.chunks[key], other.chunks[key]
+            if _is_bits(a) and _is_bits(b):
+                c = _compact(a & b)
+            elif _is_bits(a):
+                c = b[_contains(a, b)]
+            elif _is_bits(b):
+                c = a[_contains(b, a)]
+            else:
+                c = np.intersect1d(a, b, assume_unique=True)
+            if c is not None and c.shape[0]:
+                chunks[key] = c
+        return RowBitmap(self.size, chunks)
+
+    __rand__ = __and__
+
+    def __or__(self, other):
+        if isinstance(other, np.ndarray):
+            return self.to_mask() | other
+        chunks = dict(self.chunks)
+        for key, b in other.chunks.items():
+            a = chunks.get(key)
+            if a is None:
+                chunks[key] = b
+                continue
+            if not _is_bits(a) and not _is_bits(b):
+                c = np.union1d(a, b).astype(np.uint16)
+                chunks[key] = _to_bits(c) if c.shape[0] > ARRAY_MAX else c
+                continue
+            wa = a if _is_bits(a) else _to_bits(a)
+            wb = b if _is_bits(b) else _to_bits(b)
+            chunks[key] = wa | wb
+        return RowBitmap(self.size, chunks)
+
+    __ror__ = __or__
+
+    def __invert__(self) -> "RowBitmap":
+        chunks: Dict[int, np.ndarray] = {}
+        for key in range((self.size + CHUNK_SIZE - 1) // CHUNK_SIZE):
+            c = self.chunks.get(key)
+            words = np.full(WORDS, np.iinfo(np.uint64).max, dtype=np.uint64)
+            if c is not None:
+                words &= ~(c if _is_bits(c) else _to_bits(c))
+            tail = self.size - key * CHUNK_SIZE
+            if tail < CHUNK_SIZE:
+                keep = np.zeros(CHUNK_SIZE, dtype=bool)
+                keep[:tail] = True
+                words &= np.packbits(keep, bitorder="little").view(np.uint64)
+            c = _compact(words)
+            if c is not None:
+                chunks[key] = c
+        return RowBitmap(self.size, chunks)
+
+
+def save(path: Path, bitmaps: Sequence[RowBitmap], size: int) -> None:
+    """Store ``bitmaps`` (all over ``range(size)``) in one ``.npz`` file.
+
+    Containers of all bitmaps are concatenated into a single ``uint16``
+    payload; ``counts``/``keys``/``bits``/``lens`` describe how to cut it.
+    """
+    counts: List[int] = []
+    keys: List[int] = []
+    bits: List[bool] = []
+    lens: List[int] = []
+    data: List[np.ndarray] = []
+    for bm in bitmaps:
+        counts.append(len(bm.chunks))
+        for key in sorted(bm.chunks):
+            c = bm.chunks[key]
+            keys.append(key)
+            bits.append(_is_bits(c))
+            data.append(c.view(np.uint16))
+            lens.append(data[-1].shape[0])
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as fh:
+        np.savez(
+            fh,
+            size=np.asarray([size], dtype=np.int64),
+            counts=np.asarray(counts, dtype=np.int64),
+            keys=np.asarray(keys, dtype=np.int64),
+            bits=np.asarray(bits, dtype=bool),
+            lens=np.asarray(lens, dtype=np.int64),
+            data=np.concatenate(data) if data else np.zeros(0, dtype=np.uint16),
+        )
+    tmp.replace(path)
+
+
+def load(path: Path) -> List[RowBitmap]:
+    with np.load(path) as arrays:
+        size = int(arrays["size"][0])
+        counts = arrays["counts"].tolist()
+        keys = arrays["keys"].tolist()
+        bits = arrays["bits"].tolist()
+        lens = arrays["lens"]
+        data = arrays["data"]
+    ends = np.cumsum(lens).tolist()
+    out: List[RowBitmap] = []
+    i = 0
+    for count in counts:
+        chunks: Dict[int, np.ndarray] = {}
+        for j in range(i, i + count):
+            part = data[ends[j] - int(lens[j]):ends[j]]
+            chunks[keys[j]] = np.array(part).view(np.uint64) if bits[j] else part
+        out.append(RowBitmap(size, chunks))
+        i += count
+    return out
+
+
+def union_all(bitmaps: Iterable[RowBitmap], size: int) -> RowBitmap:
+    """Union of many bitmaps, merged chunk by chunk in one pass."""
+    grouped: Dict[int, List[np.ndarray]] = {}
+    for bm in bitmaps:
+        for key, c in bm.chunks.items():
+            grouped.setdefault(key, []).append(c)
+    chunks: Dict[int, np.ndarray] = {}
+    for key, parts in grouped.items():
+        if len(parts) == 1:
+            chunks[key] = parts[0]
+            continue
+        if not any(_is_bits(c) for c in parts) and sum(c.shape[0] for c in parts) <= ARRAY_MAX:
+            chunks[key] = np.unique(np.concatenate(parts))
+            continue
+        words = np.zeros(WORDS, dtype=np.uint64)
+        for c in parts:
+            words |= c if _is_bits(c) else _to_bits(c)
+        chunks[key] = _compact(words)
+    return RowBitmap(size, chunks)
+
+
+def concat(parts: Sequence[RowBitmap]) -> RowBitmap:
+    """Join bitmaps over consecutive row ranges into one over all of them.
+
+    The first bitmap's containers are reused as they are; only the rows of
+    the later parts are shifted and re-chunked.
+    """
+    size = sum(p.size for p in parts)
+    first = RowBitmap(size, dict(parts[0].chunks))
+    shifted: List[np.ndarray] = []
+    offset = parts[0].size
+    for p in parts[1:]:
+        shifted.append(p.to_ids() + offset)
+        offset += p.size
+    if not shifted:
+        return first
+    return first | RowBitmap.from_ids(np.concatenate(shifted), size)
+
+
+class TokenIndex:
+    """Inverted index of a multi-valued column: sorted tokens plus one bitmap each.
+
+    Keeping the tokens sorted makes prefix selections (``70*``) a binary
+    search for the first and last matching token.
+    """
+
+    def __init__(self, tokens: List[str], bitmaps: List[RowBitmap], size: int):
+        self.tokens = tokens
+        self.bitmaps = bitmaps
+        self.size = size
+        self._pos = {t: i for i, t in enumerate(tokens)}
+
+    def match(self, exact: Iterable[str] = (), prefixes: Iterable[str] = ()) -> RowBitmap:
+        """Rows holding any token in ``exact`` or starting with any of ``prefixes``."""
+        picked = {self._pos[t] for t in exact if t in self._pos}
+        for prefix in prefixes:
+            lo = bisect_left(self.tokens, prefix)
+            hi = bisect_left(self.tokens, prefix + "\U0010ffff")
+            picked.update(range(lo, hi))
+        return union_all((self.bitmaps[i] for i in sorted(picked)), self.size)
+
+
+def intersect_all(parts: Sequence[Union[RowBitmap, np.ndarray]], size: int) -> Union[RowBitmap, np.ndarray]:
+    """AND a mix of bitmaps and boolean masks.
+
+    Bitmaps are intersected smallest first without expanding them; the
+    result only becomes a full boolean mask if a mask is involved.
+    """
+    bitmaps = sorted((p for p in parts if isinstance(p, RowBitmap)), key=len)
+    masks = [p for p in parts if not isinstance(p, RowBitmap)]
+    result: Union[RowBitmap, np.ndarray, None] = None
+    for bm in bitmaps:
+        result = bm if result is None else result & bm
+    for m in masks:
+        result = m if result is None else result & m
+    if result is None:
+        return np.ones(size, dtype=bool)
+    return result
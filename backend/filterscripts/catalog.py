@@ -0,0 +1,127 @@
+"""Distinct values and row counts of the source's categorical columns.
+
+Columns with at most CATALOG_MAX_VALUES distinct values are catalogued in a
+single pass: with a snapshot the counts are taken while the dictionary columns
+are ingested (``catalog.json`` next to the manifest); without one the CSV is
+read once and the result stored as ``SNAPSHOT_DIR/catalogs/<version>.json``.
+Either way it is keyed by the source file's signature, so loading the filter
+options never rescans an unchanged CSV.
+"""
+from __future__ import annotations
+
+import csv
+import json
+import threading
+from collections import Counter
+from itertools import zip_longest
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from ..config import CATALOG_MAX_VALUES, CSV_DELIMITER, SNAPSHOT_DIR
+from . import schema, snapshot, source
+
+_CATALOGS: Dict[Tuple[str, int, int], Dict[int, Dict[str, int]]] = {}
+_LOCK = threading.Lock()
+
+
+def _log(msg: str) -> None:
+    print(f"[CATALOG] {msg}")
+
+
+def columns(path: Path) -> Dict[int, Dict[str, int]]:
+    """Column index -> {raw cell value: row count} for the catalogued columns of ``path``."""
+    signature = snapshot.served_signature(path)
+    cached = _CATALOGS.get(signature)
+    if cached is not None:
+        return cached
+    with _LOCK:
+        snap = snapshot.get_snapshot(path)
+        if snap is not None:
+            signature = snap.signature
+        cached = _CATALOGS.get(signature)
+        if cached is not None:
+            return cached
+        cached = snap.catalog() if snap is not None else _csv_catalog(path, signature)
+        _CATALOGS.clear()
+        _CATALOGS[signature] = cached
+    return cached
+
+
+def field_counts(path: Path, candidates: Sequence[str]) -> Optional[Dict[str, int]]:
+    """value_counts() of the first of ``candidates`` in the header of ``path``, or None."""
+    snap = snapshot.get_snapshot(path)
+    if snap is not None:
+        header = snap.header
+    else:
+        with source.open_text(path) as fh:
+            header = next(csv.reader(fh, delimiter=CSV_DELIMITER), [])
+    idx = schema.for_header(header).find(candidates)
+    return None if idx is None else value_counts(path, idx)
+
+
+def value_counts(path: Path, idx: int) -> Dict[str, int]:
+    """Row count per raw value of column ``idx``.
+
+    Columns too diverse for the catalog are counted with a pass over the
+    CSV; callers only ask for columns they expect to be categorical.
+    """
+    catalogued = columns(path).get(idx)
+    if catalogued is not None:
+        return catalogued
+    _log(f"column {idx} is not catalogued; counting it from {path.name}")
+    counts: Counter = Counter()
+    with source.open_text(path) as fh:
+        reader = csv.reader(fh, delimiter=CSV_DELIMITER)
+        next(reader, None)
+        counts.update(row[idx] if idx < len(row) else "" for row in reader)
+    return dict(counts)
+
+
+def _csv_catalog(path: Path, signature: Tuple[str, int, int]) -> Dict[int, Dict[str, int]]:
+    target = SNAPSHOT_DIR / "catalogs" / f"{snapshot.version_for(signature)}.json"
+    if target.exists():
+        return {int(idx): values for idx, values in json.loads(target.read_text(encoding="utf-8")).items()}
+
+    rows = 0
+    with source.open_text(path) as fh:
+        reader = csv.reader(fh, delimiter=CSV_DELIMITER)
+        header = next(reader, [])
+        counts: List[Optional[Counter]] = [Counter() for _ in header]
+        block: List[List[str]] = []
+        for row in reader:
+            block.append(row)
+            if len(block) >= snapshot.BLOCK_ROWS:
+                _count_block(block, counts, rows)
+                rows += len(block)
+                block = []
+        if block:
+            _count_block(block, counts, rows)
+            rows += len(block)
+
+    catalog = {idx: dict(c) for idx, c in enumerate(counts) if c is not None}
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + ".tmp")
+    tmp.write_text(json.dumps({str(idx): values for idx, values in catalog.items()}, ensure_ascii=False), encoding="utf-8")
+    tmp.replace(target)
+    _log(f"catalogued {len(catalog)} of {len(counts)} columns over {rows} rows of {path.name}")
+    return catalog
+
+
+def _count_block(block: List[List[str]], counts: List[Optional[Counter]], rows_before: int) -> None:
+    """Add one block of rows to ``counts``; columns that outgrow the catalog become None.
+
+    Short rows count as empty cells, and cells beyond the header start new
+    columns whose earlier rows were empty (as in the snapshot).
+    """
+    cells = list(zip_longest(*block, fillvalue=""))
+    while len(counts) < len(cells):
+        counts.append(Counter({"": rows_before}) if rows_before else Counter())
+    for idx, counter in enumerate(counts):
+        if counter is None:
+            continue
+        if idx < len(cells):
+            counter.update(cells[idx])
+        else:
+            counter[""] += len(block)
+        if len(counter) > CATALOG_MAX_VALUES:
+            counts[idx] = None
@@ -1,11 +1,24 @@
 """Combinator: orchestrates filters and streaming read/write (CSV-safe)."""
 import csv
+import hashlib
+import json
 import re
+import threading
+from collections import OrderedDict
 from pathlib import Path
-from typing import Dict, List, Generator, Iterable, Tuple, Optional, Set, Any
+from typing import Dict, List, Generator, Iterable, Iterator, Tuple, Optional, Set, Any, Union
 
-from ..config import CSV_PATH, CSV_DELIMITER, CSV_ENCODING
-from ..analysis import perform_analysis
+import numpy as np
+
+from ..config import (
+    ANALYSIS_CACHE_CHUNKS,
+    CSV_PATH,
+    CSV_DELIMITER,
+    CSV_ENCODING,
+    FILTER_CACHE_BYTES,
+    PREVIEW_CACHE_SIZE,
+)
+from ..analysis import AnalysisState, StreamingAnalyzer, analysis_from_state
 
 # Import every filter module here
 from . import (
@@ -20,6 +33,7 @@ from . import (
     overige_filter,
     sbi_filter,
 )
+from . import bitmap, planner, sample, scan, schema, snapshot, source
 
 # Register filters in the order you want them shown
 FILTERS: Dict[str, object] = {
@@ -71,23 +85,12 @@ def get_filter_options() -> Dict[str, List[str]]:
             opts[k] = []
     return opts
 
-
-_DUPLICATE_CACHE: Dict[str, Tuple[Tuple[Tuple[str, int, int], ...], Set[str]]] = {}
-_KVK_CANDIDATES = {"kvk", "kvknummer", "kvknr", "kvknumber"}
-
-
-def _normalize_column_name(name: str) -> str:
-    if name is None:
-        return ""
-    return re.sub(r"[^a-z0-9]", "", str(name).lstrip("\ufeff").lower())
+def get_filter_counts() -> Dict[str, Dict[str, int]]:
+    """Row count per option for filters backed by the value catalog."""
+    return {k: mod.value_counts(CSV_PATH) for k, mod in FILTERS.items() if hasattr(mod, "value_counts")}
 
 
-def _find_kvk_index(header: List[str]) -> Optional[int]:
-    for idx, col in enumerate(header):
-        normalized = _normalize_column_name(col)
-        if normalized in _KVK_CANDIDATES or normalized.startswith("kvk"):
-            return idx
-    return None
+_DUPLICATE_CACHE: Dict[str, Tuple[Tuple[Tuple[str, int, int], ...], Set[str]]] = {}
 
 
 def _file_signature(path: Path, relative_to: Optional[Path] = None) -> Tuple[str, int, int]:
@@ -114,14 +117,14 @@ def _folder_signature(files: List[Path], base: Path) -> Tuple[Tuple[str, int, in
     return tuple(sig)
 
 
-def _load_existing_kvk_numbers(folder: Path) -> Set[str]:
+def _duplicate_sources(folder: Path) -> Tuple[Path, List[Path], Tuple[Tuple[str, int, int], ...]]:
+    """Resolve a duplicates path to its CSV files and their combined signature."""
     resolved = folder.expanduser().resolve()
     if not resolved.exists():
         raise ValueError(f"Duplicates path does not exist: {resolved}")
 
     files: List[Path]
     signature: Tuple[Tuple[str, int, int], ...]
-    cache_key = str(resolved)
 
     if resolved.is_file():
         if resolved.suffix.lower() != ".csv":
@@ -136,6 +139,12 @@ def _load_existing_kvk_numbers(folder: Path) -> Set[str]:
         signature = _folder_signature(files, resolved)
     else:
         raise ValueError(f"Duplicates path must be a file or directory: {resolved}")
+    return resolved, files, signature
+
+
+def _load_existing_kvk_numbers(folder: Path) -> Set[str]:
+    resolved, files, signature = _duplicate_sources(folder)
+    cache_key = str(resolved)
 
     cached = _DUPLICATE_CACHE.get(cache_key)
     if cached and cached[0] == signature:
@@ -152,7 +161,7 @@ def _load_existing_kvk_numbers(folder: Path) -> Set[str]:
                     continue
                 if header and header[0]:
                     header[0] = header[0].lstrip("\ufeff")
-                idx = _find_kvk_index(header)
+                idx = schema.for_header(header).kvk
                 if idx is None:
                     skipped.append(csv_path.name)
                     continue
@@ -188,7 +197,7 @@ def _apply_duplicate_filter(
     if not folder_str:
         raise ValueError("Provide a folder path to filter duplicates.")
     folder_path = Path(folder_str)
-    kvk_idx = _find_kvk_index(header)
+    kvk_idx = schema.for_header(header).kvk
     if kvk_idx is None:
         raise ValueError("Could not find a KVK column in the source CSV.")
     existing = _load_existing_kvk_numbers(folder_path)
@@ -205,10 +214,100 @@ def _apply_duplicate_filter(
 
     return _iter()
 
+def _use_parallel_scan() -> bool:
+    """Scan CSV_PATH in worker processes when there is no snapshot to query."""
+    return snapshot.get_snapshot(CSV_PATH) is None and scan.enabled_for(CSV_PATH)
+
+
+def _source_rows(
+    selected_filters: Dict[str, List[str]],
+    advanced: Optional[Dict[str, object]] = None,
+    progress=None,
+) -> Tuple[List[str], Optional[Iterable[List[str]]], Iterable[List[str]]]:
+    """Header, unfiltered rows (None for a parallel scan) and filtered rows.
+
+    ``progress`` (a jobs.JobProgress) gets the total row count and, for CSV
+    sources, the number of rows read so far; snapshot progress is reported
+    by the consumer from row ids.
+    """
+    if _use_parallel_scan():
+        on_range = _range_progress(progress)
+        header, filtered = scan.iter_rows(CSV_PATH, selected_filters, advanced, on_range=on_range)
+        return header, None, filtered
+    header, rows = _stream_rows(CSV_PATH)
+    if progress is not None:
+        if isinstance(rows, snapshot.RowStream):
+            progress.update(total=len(rows))
+        else:
+            progress.update(total=_estimate_row_count(CSV_PATH))
+            rows = _counting_rows(rows, progress)
+    return header, rows, _apply_filters(rows, header, selected_filters, advanced, progress)
+
+
+_PROGRESS_EVERY = 10000
+_MATCH_PROGRESS_EVERY = 1000
+
+
+def _estimate_row_count(csv_path: Path, sample_bytes: int = 1 << 20) -> Optional[int]:
+    """Rough row count of a CSV from the line density of its first megabyte."""
+    try:
+        sample, size = source.head(csv_path, sample_bytes)
+    except (OSError, ValueError):
+        return None
+    lines = sample.count(b"\n")
+    if not lines:
+        return None
+    return max(int(size * lines / len(sample)) - 1, 0)
+
+
+def _counting_rows(rows: Iterable[List[str]], progress) -> Iterator[List[str]]:
+    """Pass ``rows`` through, reporting how many were read to ``progress``.
+
+    Snapshot rows report their position (row id) instead, since a narrowed
+    stream skips the rows earlier filters already excluded.
+    """
+    n = 0
+    by_id = isinstance(rows, snapshot.RowStream)
+    for row in rows:
+        yield row
+        n += 1
+        if n % _PROGRESS_EVERY == 0:
+            progress.update(scanned=row.row_id + 1 if by_id else n)
+    if not by_id:
+        progress.update(scanned=n)
+
+
+def _finish_progress(progress, rows: Optional[Iterable[List[str]]], matched: int) -> None:
+    """Final counts: CSV row counts are exact by now, estimated totals are not."""
+    if rows is not None and not isinstance(rows, snapshot.RowStream):
+        progress.update(total=progress.rows_scanned, matched=matched)
+    else:
+        progress.update(scanned=progress.rows_total, matched=matched)
+
+
+def _range_progress(progress):
+    """``on_range`` callback for scan.iter_rows/analyze that reports to ``progress``."""
+    if progress is None:
+        return None
+    total = _estimate_row_count(CSV_PATH)
+    progress.update(total=total)
+
+    def on_range(done_bytes: int, total_bytes: int, matched: Optional[int]) -> None:
+        scanned = int(total * done_bytes / max(total_bytes, 1)) if total else None
+        progress.update(scanned=scanned, matched=matched)
+
+    return on_range
+
+
 def _stream_rows(csv_path: Path):
-    f = csv_path.open("r", encoding=CSV_ENCODING, newline="")
+    snap = snapshot.get_snapshot(csv_path)
+    if snap is not None:
+        schema.for_source(snap.header)
+        return list(snap.header), snap.rows()
+    f = source.open_text(csv_path)
     rdr = csv.reader(f, delimiter=CSV_DELIMITER)
     header = next(rdr)
+    schema.for_source(header)
     def _iter():
         try:
             for row in rdr:
@@ -217,37 +316,332 @@ def _stream_rows(csv_path: Path):
             f.close()
     return header, _iter()
 
+_PREVIEW_CACHE: "OrderedDict[str, int]" = OrderedDict()
+_PREVIEW_LOCK = threading.Lock()
+
+
+def _canonical_json(value: object) -> str:
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _selection_key(
+    selected_filters: Dict[str, List[str]],
+    advanced: Optional[Dict[str, object]] = None,
+) -> Optional[str]:
+    """Hash of everything a filtered result depends on, or None if it can't be pinned down.
+
+    Covers the served source version, each known filter's selection plus its
+    ``cache_token()`` (SBI list files, AOI geometries) and the duplicates
+    folder contents when duplicate filtering is on.
+    """
+    try:
+        parts: List[object] = [list(snapshot.served_signature(CSV_PATH))]
+        for k in sorted(selected_filters or {}):
+            mod = FILTERS.get(k)
+            if not mod:
+                continue
+            selected = selected_filters[k]
+            token = mod.cache_token(selected) if hasattr(mod, "cache_token") else None
+            parts.append([k, selected, token])
+        folder = _duplicates_folder(advanced)
+        if folder is not None:
+            if not str(folder).strip():
+                return None
+            parts.append(["duplicates", list(_duplicate_sources(Path(str(folder).strip()))[2])])
+    except (OSError, ValueError):
+        return None
+    return hashlib.sha1(_canonical_json(parts).encode("utf-8")).hexdigest()
+
+
+def cached_preview_count(
+    selected_filters: Dict[str, List[str]],
+    advanced: Optional[Dict[str, object]] = None,
+) -> Optional[int]:
+    """preview_count() when it is already known, without scanning; else None."""
+    key = _selection_key(selected_filters, advanced)
+    if key is None:
+        return None
+    with _PREVIEW_LOCK:
+        if key in _PREVIEW_CACHE:
+            _PREVIEW_CACHE.move_to_end(key)
+            return _PREVIEW_CACHE[key]
+    return None
+
+
+def estimate_count(
+    selected_filters: Dict[str, List[str]],
+    advanced: Optional[Dict[str, object]] = None,
+) -> Optional[Dict[str, object]]:
+    """Approximate preview_count() from the persisted row sample (see sample.py).
+
+    Runs the regular filter chain on the sampled rows only; the result holds
+    the estimate, a 95% interval (``low``/``high``) and the sample size.
+    Returns None with duplicate filtering on: repeated KVK numbers are mostly
+    not both in the sample, so the sample cannot tell how many rows it drops.
+    """
+    if _duplicates_folder(advanced) is not None:
+        return None
+    snap = snapshot.get_snapshot(CSV_PATH)
+    if snap is not None:
+        header = list(snap.header)
+        ids = np.asarray(sample.snapshot_sample(snap), dtype=np.int64)
+        filtered = _apply_filters(snapshot.RowStream(snap, ids), header, selected_filters, advanced)
+        if isinstance(filtered, snapshot.RowStream):
+            matched = filtered.row_ids
+        else:
+            matched = np.asarray([row.row_id for row in filtered], dtype=np.int64)
+        removed = None if snap.tombstones is None else snap.tombstones.to_ids()
+        return sample.estimate(ids, matched, snap.row_count, removed)
+
+    header, ids, rows, n_rows = sample.csv_sample(CSV_PATH)
+    position = {id(row): pos for row, pos in zip(rows, ids.tolist())}
+    filtered = _apply_filters(iter(rows), header, selected_filters, advanced)
+    matched = np.asarray([position[id(row)] for row in filtered], dtype=np.int64)
+    return sample.estimate(ids, matched, n_rows)
+
+
 def preview_count(
     selected_filters: Dict[str, List[str]],
     advanced: Optional[Dict[str, object]] = None,
+    progress=None,
 ) -> int:
-    header, rows = _stream_rows(CSV_PATH)
-    filtered = _apply_filters(rows, header, selected_filters, advanced)
-    return sum(1 for _ in filtered)
+    key = _selection_key(selected_filters, advanced)
+    if key is not None:
+        with _PREVIEW_LOCK:
+            if key in _PREVIEW_CACHE:
+                _PREVIEW_CACHE.move_to_end(key)
+                return _PREVIEW_CACHE[key]
+
+    if _use_parallel_scan():
+        count = scan.count(CSV_PATH, selected_filters, advanced, on_range=_range_progress(progress))
+        if progress is not None:
+            _finish_progress(progress, None, count)
+    else:
+        header, rows, filtered = _source_rows(selected_filters, advanced, progress)
+        if isinstance(filtered, snapshot.RowStream):
+            count = len(filtered)
+        else:
+            count = 0
+            for _row in filtered:
+                count += 1
+                if progress is not None and count % _MATCH_PROGRESS_EVERY == 0:
+                    progress.update(matched=count)
+        if progress is not None:
+            _finish_progress(progress, rows, count)
+
+    if key is not None:
+        _remember_count(key, count)
+    return count
+
+
+def _remember_count(key: str, count: int) -> None:
+    with _PREVIEW_LOCK:
+        _PREVIEW_CACHE[key] = count
+        _PREVIEW_CACHE.move_to_end(key)
+        while len(_PREVIEW_CACHE) > PREVIEW_CACHE_SIZE:
+            _PREVIEW_CACHE.popitem(last=False)
+
+
+def warm_location(selected_value: str) -> Optional[float]:
+    """Evaluate a province/custom AOI against the snapshot before its first use.
+
+    Returns the evaluation time in seconds, or None without a snapshot or match.
+    """
+    snap = snapshot.get_snapshot(CSV_PATH)
+    if snap is None:
+        return None
+    return location_filter.warm(snap, list(snap.header), selected_value)
 
 
 def statistical_analysis(
     selected_filters: Dict[str, List[str]],
     advanced: Optional[Dict[str, object]] = None,
     dimensions: Optional[List[str]] = None,
+    progress=None,
 ) -> Dict[str, object]:
-    header, rows = _stream_rows(CSV_PATH)
-    filtered = _apply_filters(rows, header, selected_filters, advanced)
     dims = dimensions or []
-    return perform_analysis(header, filtered, dims)
+    if _use_parallel_scan():
+        header, state, warnings = scan.analyze(
+            CSV_PATH, selected_filters, advanced, on_range=_range_progress(progress)
+        )
+        if progress is not None:
+            _finish_progress(progress, None, state.total_rows)
+        return analysis_from_state(header, state, dims, warnings)
+    header, rows, filtered = _source_rows(selected_filters, advanced, progress)
+    if isinstance(filtered, snapshot.RowStream):
+        state, warnings = _snapshot_analysis_state(header, filtered, progress)
+        return analysis_from_state(header, state, dims, warnings)
+    analyzer = StreamingAnalyzer(header)
+    for row in filtered:
+        analyzer.consume(row)
+        if progress is not None and analyzer.state.total_rows % _PROGRESS_EVERY == 0:
+            progress.update(matched=analyzer.state.total_rows)
+    if progress is not None:
+        _finish_progress(progress, rows, analyzer.state.total_rows)
+    return analysis_from_state(header, analyzer.state, dims, analyzer.warnings)
+
+
+_ANALYSIS_CACHE: "OrderedDict[Tuple[str, int, str], Tuple[AnalysisState, Tuple[str, ...]]]" = OrderedDict()
+_ANALYSIS_LOCK = threading.Lock()
+
+
+def _snapshot_analysis_state(
+    header: List[str],
+    stream: "snapshot.RowStream",
+    progress=None,
+) -> Tuple[AnalysisState, List[str]]:
+    """Analysis state of ``stream``, reusing cached states of unchanged snapshot blocks.
+
+    The selected row ids are cut at snapshot block boundaries; a block's
+    partial state is keyed by the snapshot version, the block number and a
+    hash of the ids selected in it, so changing one filter only re-reads the
+    blocks whose selection actually changed.
+    """
+    snap = stream.snapshot
+    n = snap.row_count
+    ids = np.asarray(stream.ids(), dtype=np.int64)
+    cuts = np.searchsorted(ids, np.arange(0, n + snapshot.BLOCK_ROWS, snapshot.BLOCK_ROWS))
+    total = AnalysisState()
+    warnings: List[str] = []
+    analyzer: Optional[StreamingAnalyzer] = None
+    hits = 0
+    for block_no in range(cuts.shape[0] - 1):
+        part = ids[cuts[block_no]:cuts[block_no + 1]]
+        if not part.shape[0]:
+            continue
+        key = (snap.version, block_no, hashlib.sha1(part.tobytes()).hexdigest())
+        with _ANALYSIS_LOCK:
+            entry = _ANALYSIS_CACHE.get(key)
+            if entry is not None:
+                _ANALYSIS_CACHE.move_to_end(key)
+        if entry is None:
+            if analyzer is None:
+                analyzer = StreamingAnalyzer(header)
+            seen = len(analyzer.warnings)
+            analyzer.consume_snapshot(snap, part)
+            entry = (analyzer.take_state(), tuple(analyzer.warnings[seen:]))
+            with _ANALYSIS_LOCK:
+                _ANALYSIS_CACHE[key] = entry
+                while len(_ANALYSIS_CACHE) > ANALYSIS_CACHE_CHUNKS:
+                    _ANALYSIS_CACHE.popitem(last=False)
+        else:
+            hits += 1
+        # Cached states are shared; only ever merge them into ``total``.
+        total.merge(entry[0])
+        warnings.extend(msg for msg in entry[1] if msg not in warnings)
+        if progress is not None:
+            progress.update(scanned=min((block_no + 1) * snapshot.BLOCK_ROWS, n), matched=total.total_rows)
+    if hits:
+        print(f"[ANALYSIS] reused {hits} cached block state(s)")
+    return total, warnings
+
+
+_FILTER_CACHE: "OrderedDict[Tuple[str, str, str], Optional[bitmap.RowBitmap]]" = OrderedDict()
+_FILTER_CACHE_LOCK = threading.Lock()
+_FILTER_CACHE_USED = 0
+_NOT_VECTORIZED = object()
+
+
+def _filter_bitmap(snap: snapshot.Snapshot, key: str, mod, header: List[str], selected):
+    """``mod.mask`` as a RowBitmap (None = no restriction), cached per filter and selection.
+
+    Returns _NOT_VECTORIZED when the module has no mask for this selection.
+    """
+    global _FILTER_CACHE_USED
+    if not hasattr(mod, "mask"):
+        return _NOT_VECTORIZED
+    token = mod.cache_token(selected) if hasattr(mod, "cache_token") else None
+    cache_key = (snap.version, key, _canonical_json([selected, token]))
+    with _FILTER_CACHE_LOCK:
+        if cache_key in _FILTER_CACHE:
+            _FILTER_CACHE.move_to_end(cache_key)
+            return _FILTER_CACHE[cache_key]
+
+    m = mod.mask(snap, header, selected)
+    if m is None:
+        return _NOT_VECTORIZED
+    if isinstance(m, np.ndarray):
+        m = None if m.all() else bitmap.RowBitmap.from_mask(m)
+
+    size = m.nbytes if m is not None else 0
+    with _FILTER_CACHE_LOCK:
+        if cache_key not in _FILTER_CACHE and size <= FILTER_CACHE_BYTES:
+            _FILTER_CACHE[cache_key] = m
+            _FILTER_CACHE_USED += size
+            while _FILTER_CACHE_USED > FILTER_CACHE_BYTES:
+                _old_key, old = _FILTER_CACHE.popitem(last=False)
+                _FILTER_CACHE_USED -= old.nbytes if old is not None else 0
+    return m
+
 
 def _apply_filters(
     rows: Iterable[List[str]],
     header: List[str],
     selected_filters: Dict[str, List[str]],
     advanced: Optional[Dict[str, object]] = None,
+    progress=None,
+    order: Optional[List[str]] = None,
 ) -> Iterable[List[str]]:
+    """Filter ``rows``: bitmap filters first on snapshots, then the remaining
+    filters row by row in the order chosen by planner.build_plan (or the given
+    ``order`` of filter keys)."""
     filtered: Iterable[List[str]] = rows
-    for k, selected in selected_filters.items():
-        mod = FILTERS.get(k)
-        if mod:
-            filtered = mod.apply(filtered, header, selected)
+    pending: List[planner.FilterStep] = []
+    if isinstance(rows, snapshot.RowStream):
+        # Vectorized path: AND the per-filter bitmaps (cached, so changing
+        # one filter only recomputes that one), then narrow the stream so
+        # only surviving rows are ever materialized.
+        parts: List[Any] = []
+        for k, selected in selected_filters.items():
+            mod = FILTERS.get(k)
+            if not mod:
+                continue
+            m = _filter_bitmap(rows.snapshot, k, mod, header, selected)
+            if m is _NOT_VECTORIZED:
+                pending.append(planner.FilterStep(k, mod, selected))
+            elif m is not None:
+                parts.append(m)
+        if parts:
+            filtered = rows.select(bitmap.intersect_all(parts, rows.snapshot.row_count))
+    else:
+        for k, selected in selected_filters.items():
+            mod = FILTERS.get(k)
+            if mod:
+                pending.append(planner.FilterStep(k, mod, selected))
+
+    if pending and progress is not None and isinstance(filtered, snapshot.RowStream):
+        filtered = _counting_rows(filtered, progress)
+    if pending:
+        filtered = _filter_plan(rows, header, pending, order).apply(filtered, header)
+
+    folder = _duplicates_folder(advanced)
+    if folder is not None:
+        filtered = _apply_duplicate_filter(filtered, header, folder)
+    return filtered
+
+
+def _filter_plan(
+    rows: Iterable[List[str]],
+    header: List[str],
+    steps: List[planner.FilterStep],
+    order: Optional[List[str]] = None,
+) -> planner.FilterPlan:
+    """Plan ``steps``, measuring them on a sample of the source ``rows`` come from."""
+    if isinstance(rows, snapshot.RowStream):
+        snap = rows.snapshot
+        return planner.build_plan(header, steps, ("snapshot", snap.version), lambda: planner.snapshot_sample_rows(snap), order)
+    source = ("csv", snapshot.source_signature(CSV_PATH))
+    return planner.build_plan(header, steps, source, lambda: planner.csv_sample_rows(CSV_PATH), order)
 
+
+def filter_order(header: List[str], selected_filters: Dict[str, List[str]]) -> List[str]:
+    """Row-level evaluation order of the CSV filter chain (shared with scan workers)."""
+    steps = [planner.FilterStep(k, FILTERS[k], selected) for k, selected in selected_filters.items() if k in FILTERS]
+    return _filter_plan(iter(()), header, steps).order
+
+
+def _duplicates_folder(advanced: Optional[Dict[str, object]]) -> Optional[object]:
+    """The duplicates path from ``advanced`` when duplicate filtering is on, else None."""
     adv = advanced or {}
     filter_duplicates = (
         adv.get("filterDuplicates")
@@ -256,16 +650,16 @@ def _apply_filters(
     )
     if filter_duplicates is None:
         filter_duplicates = adv.get("filterDubs")
-    if _coerce_bool(filter_duplicates):
-        folder = (
-            adv.get("duplicatesPath")
-            or adv.get("duplicates_path")
-            or adv.get("folderPath")
-            or adv.get("folder_path")
-            or adv.get("folder")
-        )
-        filtered = _apply_duplicate_filter(filtered, header, folder)
-    return filtered
+    if not _coerce_bool(filter_duplicates):
+        return None
+    folder = (
+        adv.get("duplicatesPath")
+        or adv.get("duplicates_path")
+        or adv.get("folderPath")
+        or adv.get("folder_path")
+        or adv.get("folder")
+    )
+    return folder if folder is not None else ""
 
 
 def iter_filtered_rows(
@@ -273,18 +667,53 @@ def iter_filtered_rows(
     advanced: Optional[Dict[str, object]] = None,
 ) -> Tuple[List[str], Iterable[List[str]]]:
     """Expose header and streaming rows after applying filters."""
-    header, rows = _stream_rows(CSV_PATH)
-    filtered = _apply_filters(rows, header, selected_filters, advanced)
+    header, _rows, filtered = _source_rows(selected_filters, advanced)
     return header, filtered
 
 
+def _open_raw_rows(rows: Iterable[List[str]]) -> Optional[snapshot.RawRows]:
+    """Raw byte access to the source when ``rows`` come from a current snapshot."""
+    if isinstance(rows, snapshot.RowStream):
+        return rows.snapshot.raw_rows()
+    return None
+
+
+def _row_id_batches(rows: Iterable[List[str]], batch_size: int = 65536) -> Iterator[np.ndarray]:
+    """Group the ids of snapshot rows into arrays, preserving order."""
+    if isinstance(rows, snapshot.RowStream):
+        ids = rows.ids()
+        for start in range(0, ids.shape[0], batch_size):
+            yield ids[start:start + batch_size]
+        return
+    batch: List[int] = []
+    for row in rows:
+        batch.append(row.row_id)
+        if len(batch) >= batch_size:
+            yield np.asarray(batch, dtype=np.int64)
+            batch = []
+    if batch:
+        yield np.asarray(batch, dtype=np.int64)
+
+
 def stream_filtered_csv(
     selected_filters: Dict[str, List[str]],
     advanced: Optional[Dict[str, object]] = None,
-) -> Generator[str, None, None]:
-    """Yield properly quoted CSV lines with CRLF line endings and a UTF-8 BOM."""
+) -> Generator[Union[str, bytes], None, None]:
+    """Yield properly quoted CSV lines with CRLF line endings and a UTF-8 BOM.
+
+    When the source bytes are available through the snapshot row index, the
+    matching rows are copied verbatim in large byte chunks instead.
+    """
     import io
-    header, rows = _stream_rows(CSV_PATH)
+    header, rows, filtered = _source_rows(selected_filters, advanced)
+
+    raw = _open_raw_rows(rows)
+    if raw is not None:
+        with raw:
+            yield "\ufeff".encode(CSV_ENCODING) + raw.header_bytes()
+            for ids in _row_id_batches(filtered):
+                yield from raw.iter_chunks(ids)
+        return
 
     def writer_line(row: List[str]) -> str:
         buf = io.StringIO()
@@ -305,9 +734,6 @@ def stream_filtered_csv(
     # Header
     yield writer_line(header)
 
-    # Apply filters (AND)
-    filtered = _apply_filters(rows, header, selected_filters, advanced)
-
     # Rows
     for row in filtered:
         yield writer_line(row)
@@ -319,26 +745,11 @@ def _sanitize_basename(base_name: str) -> str:
     return stem or "results"
 
 
-def save_filtered_csv_multi(
-    selected_filters: Dict[str, List[str]],
-    destinations: List[Dict[str, Any]],
-    advanced: Optional[Dict[str, object]] = None,
-) -> Tuple[List[Path], int, List[Dict[str, Any]]]:
-    """Save filtered results into multiple destinations.
-
-    Each destination dict must contain:
-        directory: str or Path
-        base_name: str
-        max_rows_per_file: int
-        rows_requested: Optional[int] (None => rest)
-    """
-
+def _prepare_destinations(destinations: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """Validate save destinations; returns the writer state per destination and the rest index."""
     if not destinations:
         raise ValueError("At least one save destination is required")
 
-    header, rows = _stream_rows(CSV_PATH)
-    filtered = _apply_filters(rows, header, selected_filters, advanced)
-
     prepared: List[Dict[str, Any]] = []
     rest_index: Optional[int] = None
 
@@ -400,35 +811,136 @@ def save_filtered_csv_multi(
         if is_rest:
             rest_index = len(prepared)
         prepared.append(entry)
+    return prepared, rest_index
+
+
+# Fused jobs -------------------------------------------------------------------
+#
+# A job runs the filter chain once and feeds each batch of matching rows to
+# several sinks. Every sink implements
+#
+#   start(header, source)  -- source: snapshot.RawRows or None
+#   feed(ids, rows)        -- ids: row ids (None without a snapshot),
+#                             rows: the rows (None when no sink needs them)
+#   finish() -> result
+#   close()                -- always called, also after errors
+#
+# and sets ``needs_rows`` when it reads cell values. With a snapshot and only
+# id-based sinks (count, raw byte save) no row is ever materialized.
+
+_JOB_ROW_BATCH = 8192
+
+
+class CountSink:
+    """Number of matching rows."""
+
+    needs_rows = False
+
+    def __init__(self):
+        self.total = 0
+
+    def start(self, header: List[str], source: Optional[snapshot.RawRows]) -> None:
+        pass
+
+    def feed(self, ids: Optional[np.ndarray], rows: Optional[List[List[str]]]) -> None:
+        self.total += len(ids) if ids is not None else len(rows)
+
+    def finish(self) -> int:
+        return self.total
+
+    def close(self) -> None:
+        pass
+
+
+class AnalysisSink:
+    """statistical_analysis() result for the matching rows."""
 
-    def ensure_writer(entry: Dict[str, Any]):
+    needs_rows = True
+
+    def __init__(self, dimensions: Optional[List[str]] = None):
+        self.dimensions = dimensions or []
+        self.header: List[str] = []
+        self.analyzer: Optional[StreamingAnalyzer] = None
+
+    def start(self, header: List[str], source: Optional[snapshot.RawRows]) -> None:
+        self.header = header
+        self.analyzer = StreamingAnalyzer(header)
+
+    def feed(self, ids: Optional[np.ndarray], rows: Optional[List[List[str]]]) -> None:
+        for row in rows:
+            self.analyzer.consume(row)
+
+    def finish(self) -> Dict[str, object]:
+        return analysis_from_state(self.header, self.analyzer.state, self.dimensions, self.analyzer.warnings)
+
+    def close(self) -> None:
+        pass
+
+
+class SaveSink:
+    """Write the matching rows over save destinations (see save_filtered_csv_multi).
+
+    Destinations are validated on construction, before anything is scanned.
+    """
+
+    needs_rows = False
+
+    def __init__(self, destinations: List[Dict[str, Any]]):
+        self.prepared, self.rest_index = _prepare_destinations(destinations)
+        self.header: List[str] = []
+        self.source: Optional[snapshot.RawRows] = None
+        self.total_rows = 0
+        self._closed_bytes = 0
+
+    @property
+    def bytes_written(self) -> int:
+        current = sum(entry["handle"].tell() for entry in self.prepared if entry["handle"])
+        return self._closed_bytes + current
+
+    def start(self, header: List[str], source: Optional[snapshot.RawRows]) -> None:
+        self.header = header
+        self.source = source
+
+    def _ensure_writer(self, entry: Dict[str, Any]) -> None:
         if entry["writer"] is None or entry["current_count"] >= entry["max_rows"]:
             if entry["handle"]:
+                self._closed_bytes += entry["handle"].tell()
                 entry["handle"].close()
             entry["file_index"] += 1
             fname = f"{entry['safe_base']}{entry['file_index']}.csv"
             path = entry["directory"] / fname
-            handle = path.open("w", encoding=CSV_ENCODING, newline="")
-            handle.write("\ufeff")
-            writer = csv.writer(
-                handle,
-                delimiter=CSV_DELIMITER,
-                quotechar='"',
-                lineterminator="\r\n",
-                quoting=csv.QUOTE_MINIMAL,
-                doublequote=True,
-                escapechar=None,
-            )
-            writer.writerow(header)
+            source = self.source
+            if source is not None:
+                handle = path.open("wb")
+                handle.write("\ufeff".encode(CSV_ENCODING) + source.header_bytes())
+
+                def writer(ids, _handle=handle):
+                    for chunk in source.iter_chunks(ids):
+                        _handle.write(chunk)
+            else:
+                handle = path.open("w", encoding=CSV_ENCODING, newline="")
+                handle.write("\ufeff")
+                csv_writer = csv.writer(
+                    handle,
+                    delimiter=CSV_DELIMITER,
+                    quotechar='"',
+                    lineterminator="\r\n",
+                    quoting=csv.QUOTE_MINIMAL,
+                    doublequote=True,
+                    escapechar=None,
+                )
+                csv_writer.writerow(self.header)
+                writer = csv_writer.writerows
             entry["files"].append(path)
             entry["handle"] = handle
             entry["writer"] = writer
             entry["current_count"] = 0
 
-    total_rows_written = 0
-
-    try:
-        for row in filtered:
+    def feed(self, ids: Optional[np.ndarray], rows: Optional[List[List[str]]]) -> None:
+        batch = ids if self.source is not None else rows
+        prepared = self.prepared
+        pos = 0
+        while pos < len(batch):
             destination_index: Optional[int] = None
             for idx, entry in enumerate(prepared):
                 remaining = entry.get("remaining")
@@ -436,49 +948,147 @@ def save_filtered_csv_multi(
                     destination_index = idx
                     break
             if destination_index is None:
-                destination_index = rest_index
+                destination_index = self.rest_index
             if destination_index is None:
                 raise ValueError(
                     "More rows produced than allocated. Increase the fixed amounts or add an R destination."
                 )
 
             entry = prepared[destination_index]
-            ensure_writer(entry)
-            entry["writer"].writerow(row)
-            entry["current_count"] += 1
-            entry["total_rows"] += 1
-            total_rows_written += 1
+            self._ensure_writer(entry)
+            take = min(len(batch) - pos, entry["max_rows"] - entry["current_count"])
             if entry["remaining"] is not None:
-                entry["remaining"] -= 1
+                take = min(take, entry["remaining"])
+            entry["writer"](batch[pos:pos + take])
+            entry["current_count"] += take
+            entry["total_rows"] += take
+            self.total_rows += take
+            if entry["remaining"] is not None:
+                entry["remaining"] -= take
+            pos += take
 
-        if total_rows_written == 0 and prepared:
-            first = prepared[0]
+    def finish(self) -> Tuple[List[Path], int, List[Dict[str, Any]]]:
+        if self.total_rows == 0 and self.prepared:
+            first = self.prepared[0]
             if not first["files"]:
-                ensure_writer(first)
-
-    finally:
-        for entry in prepared:
+                self._ensure_writer(first)
+        self.close()
+
+        all_files: List[Path] = []
+        details: List[Dict[str, Any]] = []
+        for entry in self.prepared:
+            all_files.extend(entry["files"])
+            details.append({
+                "directory": str(entry["directory"]),
+                "base_name": entry["safe_base"],
+                "max_rows_per_file": entry["max_rows"],
+                "requested_rows": entry["requested"],
+                "mode": "rest" if entry["requested"] is None else "fixed",
+                "rows_written": entry["total_rows"],
+                "files": [str(p) for p in entry["files"]],
+            })
+        return all_files, self.total_rows, details
+
+    def close(self) -> None:
+        for entry in self.prepared:
             if entry["handle"]:
+                self._closed_bytes += entry["handle"].tell()
                 entry["handle"].close()
                 entry["handle"] = None
                 entry["writer"] = None
                 entry["current_count"] = 0
 
-    all_files: List[Path] = []
-    details: List[Dict[str, Any]] = []
-    for entry in prepared:
-        all_files.extend(entry["files"])
-        details.append({
-            "directory": str(entry["directory"]),
-            "base_name": entry["safe_base"],
-            "max_rows_per_file": entry["max_rows"],
-            "requested_rows": entry["requested"],
-            "mode": "rest" if entry["requested"] is None else "fixed",
-            "rows_written": entry["total_rows"],
-            "files": [str(p) for p in entry["files"]],
-        })
-
-    return all_files, total_rows_written, details
+
+def _job_batches(
+    filtered: Iterable[List[str]],
+    with_ids: bool,
+    with_rows: bool,
+) -> Iterator[Tuple[Optional[np.ndarray], Optional[List[List[str]]]]]:
+    """``(ids, rows)`` batches of the filtered rows, in source order."""
+    if isinstance(filtered, snapshot.RowStream):
+        size = _JOB_ROW_BATCH if with_rows else 65536
+        for ids in _row_id_batches(filtered, size):
+            yield ids, (list(filtered.snapshot.iter_rows(ids)) if with_rows else None)
+        return
+    batch: List[List[str]] = []
+    for row in filtered:
+        batch.append(row)
+        if len(batch) >= _JOB_ROW_BATCH:
+            yield (np.asarray([r.row_id for r in batch], dtype=np.int64) if with_ids else None), batch
+            batch = []
+    if batch:
+        yield (np.asarray([r.row_id for r in batch], dtype=np.int64) if with_ids else None), batch
+
+
+def run_job(
+    selected_filters: Dict[str, List[str]],
+    sinks: Dict[str, Any],
+    advanced: Optional[Dict[str, object]] = None,
+    progress=None,
+) -> Dict[str, Any]:
+    """Filter the source once and feed the matching rows to every sink.
+
+    Returns ``{name: sink.finish()}``. Counts are also remembered for
+    preview_count(). ``progress`` (a jobs.JobProgress) is updated after
+    every batch and may abort the job by raising from update().
+    """
+    if not sinks:
+        raise ValueError("A job needs at least one output")
+    key = _selection_key(selected_filters, advanced) if any(
+        isinstance(sink, CountSink) for sink in sinks.values()
+    ) else None
+
+    header, rows, filtered = _source_rows(selected_filters, advanced, progress)
+    source = _open_raw_rows(rows)
+    with_rows = source is None or any(sink.needs_rows for sink in sinks.values())
+    matched = 0
+    try:
+        for sink in sinks.values():
+            sink.start(header, source)
+        for ids, batch in _job_batches(filtered, source is not None, with_rows):
+            for sink in sinks.values():
+                sink.feed(ids, batch)
+            if progress is not None:
+                matched += len(ids) if ids is not None else len(batch)
+                progress.update(
+                    scanned=int(ids[-1]) + 1 if ids is not None and len(ids) else None,
+                    matched=matched,
+                    written=sum(getattr(sink, "bytes_written", 0) for sink in sinks.values()),
+                )
+        results = {name: sink.finish() for name, sink in sinks.items()}
+    finally:
+        for sink in sinks.values():
+            sink.close()
+        if source is not None:
+            source.close()
+        if hasattr(filtered, "close"):
+            filtered.close()
+    if progress is not None:
+        _finish_progress(progress, rows, matched)
+        progress.update(written=sum(getattr(sink, "bytes_written", 0) for sink in sinks.values()))
+
+    if key is not None:
+        for name, sink in sinks.items():
+            if isinstance(sink, CountSink):
+                _remember_count(key, results[name])
+                break
+    return results
+
+
+def save_filtered_csv_multi(
+    selected_filters: Dict[str, List[str]],
+    destinations: List[Dict[str, Any]],
+    advanced: Optional[Dict[str, object]] = None,
+) -> Tuple[List[Path], int, List[Dict[str, Any]]]:
+    """Save filtered results into multiple destinations.
+
+    Each destination dict must contain:
+        directory: str or Path
+        base_name: str
+        max_rows_per_file: int
+        rows_requested: Optional[int] (None => rest)
+    """
+    return run_job(selected_filters, {"save": SaveSink(destinations)}, advanced)["save"]
 
 
 def save_filtered_csv(
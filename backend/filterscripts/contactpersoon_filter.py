@@ -2,6 +2,10 @@
 import ast
 from typing import Iterable, List, Generator, Optional
 
+import numpy as np
+
+from . import schema
+
 FILTER_KEY = "contactpersoon"
 
 def name() -> str:
@@ -11,14 +15,6 @@ def distinct_values(*_a, **_k) -> List[str]:
     # fixed options for boolean-like filter
     return ["TRUE", "FALSE"]
 
-def _find_col(header: List[str], candidates: List[str]) -> Optional[int]:
-    norm = [h.strip().lower() for h in header]
-    for c in candidates:
-        c2 = c.strip().lower()
-        if c2 in norm:
-            return norm.index(c2)
-    return None
-
 def _has_contact(cell: Optional[str]) -> bool:
     if cell is None:
         return False
@@ -39,6 +35,8 @@ def _has_contact(cell: Optional[str]) -> bool:
         # fall back: any non-empty string counts as present
         return True
 
+CONTACT_COL_CANDS = schema.field("contactpersoon", ["contactpersoon", "contact_persoon", "contact_person", "contactpersonen"])
+
 def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: List[str]) -> Generator[List[str], None, None]:
     """
     TRUE  => keep rows where contactpersoon is present
@@ -51,7 +49,8 @@ def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Li
         yield from rows_iter
         return
 
-    idx = _find_col(header, ["contactpersoon", "contact_persoon", "contact_person", "contactpersonen"])
+    cols = schema.for_header(header)
+    idx = cols.find(CONTACT_COL_CANDS)
     if idx is None:
         # column missing => if user wants TRUE, nothing matches. For FALSE, everything matches.
         want_true = "TRUE" in sel and "FALSE" not in sel
@@ -70,3 +69,23 @@ def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Li
             yield row
         elif want_false and (not present):
             yield row
+
+def mask(snap, header: List[str], selected_values: List[str]) -> Optional[np.ndarray]:
+    """Vectorized variant of apply()."""
+    sel = {v.strip().upper() for v in (selected_values or []) if isinstance(v, str)}
+    if not sel or sel == {"TRUE", "FALSE"}:
+        return np.ones(snap.row_count, dtype=bool)
+
+    want_true = "TRUE" in sel and "FALSE" not in sel
+    want_false = "FALSE" in sel and "TRUE" not in sel
+    cols = schema.for_header(header)
+    idx = cols.find(CONTACT_COL_CANDS)
+    if idx is None:
+        return np.full(snap.row_count, not want_true, dtype=bool)
+
+    present = snap.presence(idx, _has_contact)
+    if want_true:
+        return present
+    if want_false:
+        return ~present
+    return np.zeros(snap.row_count, dtype=bool)
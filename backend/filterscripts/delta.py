@@ -0,0 +1,393 @@
+"""Delta ingestion: store a changed CSV as a segment on top of the served snapshot.
+
+When a new version of the source is picked up while a snapshot is active,
+:func:`ingest` compares the rows of the new file with the active version by
+their row hash (``snapshot.row_hashes``, which covers the KVK number and every
+other cell):
+
+- rows of the new file without an identical row in the active version are
+  ingested as a small regular snapshot, the delta segment;
+- rows of the active version without an identical row in the new file get a
+  tombstone (a changed KVK record is one of each).
+
+The new version's directory holds only that segment, the tombstone bitmap,
+the merged value catalog and a manifest naming the base snapshot and the
+earlier segments. :class:`SegmentedSnapshot` serves base + segments as one
+snapshot: a segment's row ids follow those of the parts before it, and
+indexes are looked up per part and joined, so the base's value bitmaps, typed
+arrays, range indexes and location bitmaps are reused as they are. Rows
+added by a segment come after the base rows in exports.
+
+Once added plus removed rows exceed DELTA_MAX_FRACTION of the base rows, or
+DELTA_MAX_SEGMENTS segments are stacked, the next version is ingested in full
+again (compaction), which also restores the source's row order.
+"""
+from __future__ import annotations
+
+import csv
+import json
+import shutil
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..config import CATALOG_MAX_VALUES, CSV_DELIMITER, DELTA_MAX_FRACTION, DELTA_MAX_SEGMENTS
+from . import bitmap, schema, snapshot, source
+from .bitmap import RowBitmap
+
+SEGMENT_NAME = "segment"
+TOMBSTONES_NAME = "tombstones.npz"
+
+# Mixed into the hash of the n-th repeat of an identical row, so duplicate
+# rows are matched one to one.
+_REPEAT = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _log(msg: str) -> None:
+    print(f"[DELTA] {msg}")
+
+
+def _join(parts: Sequence[object]):
+    """Per-part results (RowBitmaps or boolean masks) as one over all rows."""
+    if all(isinstance(p, RowBitmap) for p in parts):
+        return bitmap.concat(parts)
+    return np.concatenate([p.to_mask() if isinstance(p, RowBitmap) else np.asarray(p, dtype=bool) for p in parts])
+
+
+def _occurrences(hashes: np.ndarray) -> np.ndarray:
+    """``hashes`` with the n-th repeat of a value made distinct (the first one unchanged)."""
+    n = hashes.shape[0]
+    order = np.argsort(hashes, kind="stable")
+    ordered = hashes[order]
+    first = np.ones(n, dtype=bool)
+    first[1:] = ordered[1:] != ordered[:-1]
+    positions = np.arange(n)
+    repeat = positions - np.maximum.accumulate(np.where(first, positions, 0))
+    keys = np.empty_like(hashes)
+    keys[order] = ordered ^ (repeat.astype(np.uint64) * _REPEAT)
+    return keys
+
+
+def _contains(ordered: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Membership of ``values`` in the sorted array ``ordered``."""
+    if not ordered.shape[0]:
+        return np.zeros(values.shape[0], dtype=bool)
+    pos = np.minimum(np.searchsorted(ordered, values), ordered.shape[0] - 1)
+    return ordered[pos] == values
+
+
+class SegmentedColumn:
+    """A column spread over the parts of a segmented snapshot."""
+
+    kind = "segmented"
+
+    def __init__(self, parts: List[object], offsets: List[int]):
+        self.parts = parts
+        self.offsets = offsets  # first row id of every part, plus the total
+
+    def __len__(self) -> int:
+        return self.offsets[-1]
+
+    def chunk(self, start: int, stop: int) -> List[str]:
+        out: List[str] = []
+        for part, first, end in zip(self.parts, self.offsets, self.offsets[1:]):
+            if start < end and stop > first:
+                out.extend(part.chunk(max(start, first) - first, min(stop, end) - first))
+        return out
+
+    def take(self, row_ids: np.ndarray) -> List[str]:
+        ids = np.asarray(row_ids, dtype=np.int64)
+        owner = np.searchsorted(self.offsets, ids, side="right") - 1
+        out: List[str] = [""] * ids.shape[0]
+        for k, part in enumerate(self.parts):
+            pos = np.flatnonzero(owner == k)
+            if pos.shape[0]:
+                for i, cell in zip(pos.tolist(), part.take(ids[pos] - self.offsets[k])):
+                    out[i] = cell
+        return out
+
+    def lookup(self, fn: Callable[[str], object], dtype=bool) -> np.ndarray:
+        return np.concatenate([part.lookup(fn, dtype) for part in self.parts])
+
+    def convert(self, fn: Callable[[str], Optional[float]]) -> Tuple[np.ndarray, np.ndarray]:
+        converted = [part.convert(fn) for part in self.parts]
+        dtype = np.result_type(*(vals.dtype for vals, _valid in converted))
+        return (
+            np.concatenate([vals.astype(dtype, copy=False) for vals, _valid in converted]),
+            np.concatenate([valid for _vals, valid in converted]),
+        )
+
+    def present(self, fn: Callable[[str], bool]) -> np.ndarray:
+        return np.concatenate([part.present(fn) for part in self.parts])
+
+
+class SegmentedTokenIndex:
+    """TokenIndex.match() over every part of a segmented snapshot."""
+
+    def __init__(self, parts: List[bitmap.TokenIndex]):
+        self.parts = parts
+
+    def match(self, exact: Iterable[str] = (), prefixes: Iterable[str] = ()) -> RowBitmap:
+        exact, prefixes = list(exact), list(prefixes)
+        return bitmap.concat([part.match(exact, prefixes) for part in self.parts])
+
+
+class SegmentedSnapshot(snapshot.Snapshot):
+    """A base snapshot plus delta segments, minus tombstoned rows.
+
+    Row ids cover every part, removed rows included; ``rows()``,
+    ``iter_rows()`` and ``RowStream.select()`` skip the tombstoned ones.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        manifest = json.loads((path / snapshot.MANIFEST_NAME).read_text(encoding="utf-8"))
+        self.manifest = manifest
+        self.version: str = manifest["version"]
+        self.signature: Tuple[str, int, int] = tuple(manifest["signature"])  # type: ignore[assignment]
+        self.header: List[str] = list(manifest["header"])
+        root = path.parent
+        self.base = snapshot.Snapshot(root / manifest["base"])
+        self.segments = [snapshot.Snapshot(root / seg) for seg in manifest["segments"]]
+        self.parts: List[snapshot.Snapshot] = [self.base] + self.segments
+        self.offsets = np.cumsum([0] + [p.row_count for p in self.parts]).tolist()
+        self.row_count: int = self.offsets[-1]
+        self.widths = np.concatenate([np.asarray(p.widths) for p in self.parts])
+        self.tombstones = bitmap.load(path / TOMBSTONES_NAME)[0]
+        self._columns: Dict[int, object] = {}
+        self._row_index = None
+        self._bitmaps: Dict[object, object] = {}
+        self._bitmaps_lock = threading.RLock()
+        self._live_mask = ~self.tombstones.to_mask()
+        self._live_bitmap: Optional[RowBitmap] = None
+        self._live_ids: Optional[np.ndarray] = None
+        snapshot.track(self)
+
+    @property
+    def column_count(self) -> int:
+        return self.base.column_count
+
+    def column(self, idx: int):
+        col = self._columns.get(idx)
+        if col is None:
+            col = SegmentedColumn([p.column(idx) for p in self.parts], self.offsets)
+            self._columns[idx] = col
+        return col
+
+    # Live rows -------------------------------------------------------------
+
+    @property
+    def live_count(self) -> int:
+        return self.row_count - len(self.tombstones)
+
+    def live_ids(self) -> np.ndarray:
+        if self._live_ids is None:
+            self._live_ids = np.flatnonzero(self._live_mask)
+        return self._live_ids
+
+    def only_live(self, selection):
+        if isinstance(selection, RowBitmap):
+            if self._live_bitmap is None:
+                self._live_bitmap = ~self.tombstones
+            return selection & self._live_bitmap
+        return np.asarray(selection, dtype=bool) & self._live_mask
+
+    def iter_rows(self, row_ids: Optional[Sequence[int]] = None) -> Iterator[snapshot.SnapshotRow]:
+        return super().iter_rows(self.live_ids() if row_ids is None else row_ids)
+
+    def row_hashes(self) -> np.ndarray:
+        return np.concatenate([np.asarray(p.row_hashes()) for p in self.parts])
+
+    # Indexes, joined per part ---------------------------------------------
+
+    def _cached(self, key, build: Callable[[], object]):
+        cached = self._bitmaps.get(key)
+        if cached is None:
+            with self._bitmaps_lock:
+                cached = self._bitmaps.get(key)
+                if cached is None:
+                    cached = build()
+                    self._bitmaps[key] = cached
+        return cached
+
+    def value_bitmaps(self, idx: int) -> None:
+        return None
+
+    def where(self, idx: int, fn: Callable[[str], bool]):
+        return _join([p.where(idx, fn) for p in self.parts])
+
+    def presence(self, idx: int, fn: Callable[[str], bool]) -> RowBitmap:
+        return _join([p.presence(idx, fn) for p in self.parts])
+
+    def token_index(self, idx: int, tokenize: Callable[[str], Iterable[str]]) -> SegmentedTokenIndex:
+        return SegmentedTokenIndex([p.token_index(idx, tokenize) for p in self.parts])
+
+    def typed(self, idx: int, parse: Callable[[str], object]) -> Tuple[np.ndarray, np.ndarray]:
+        def build() -> Tuple[np.ndarray, np.ndarray]:
+            parts = [p.typed(idx, parse) for p in self.parts]
+            dtype = np.result_type(*(vals.dtype for vals, _valid in parts))
+            return (
+                np.concatenate([np.asarray(vals).astype(dtype, copy=False) for vals, _valid in parts]),
+                np.concatenate([np.asarray(valid) for _vals, valid in parts]),
+            )
+        return self._cached(("typed", idx, snapshot._function_digest(parse)), build)  # type: ignore[return-value]
+
+    def value_range(self, idx: int, parse: Callable[[str], object], lo=None, hi=None):
+        return _join([p.value_range(idx, parse, lo, hi) for p in self.parts])
+
+    def rowwise(self, name: str, build: Callable[[snapshot.Snapshot], object]):
+        def join() -> object:
+            parts = [p.rowwise(name, build) for p in self.parts]
+            if isinstance(parts[0], RowBitmap):
+                return bitmap.concat(parts)
+            return np.concatenate([np.asarray(p) for p in parts], axis=-1)
+        return self._cached(("rowwise", name), join)
+
+    def row_index(self) -> None:
+        return None  # row ids no longer follow the source file's order
+
+    def raw_rows(self) -> None:
+        return None
+
+
+def _layers(current: snapshot.Snapshot) -> Tuple[snapshot.Snapshot, List[str]]:
+    """Base snapshot and segment paths (relative to the snapshot root) of ``current``."""
+    if isinstance(current, SegmentedSnapshot):
+        return current.base, list(current.manifest["segments"])
+    return current, []
+
+
+def _blocks(reader: Iterable[List[str]]) -> Iterator[List[List[str]]]:
+    block: List[List[str]] = []
+    for row in reader:
+        block.append(row)
+        if len(block) >= snapshot.BLOCK_ROWS:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def ingest(csv_path: Path, current: snapshot.Snapshot) -> Optional[Path]:
+    """Store the current version of ``csv_path`` as a delta on top of ``current``.
+
+    Returns the new version's directory, or None when it has to be ingested
+    in full: a different header, rows wider than the snapshot, too many
+    changes or too many segments.
+    """
+    started = time.perf_counter()
+    signature = snapshot.source_signature(csv_path)
+    version = snapshot.version_for(signature)
+    root = current.path.parent
+    target = root / version
+    if (target / snapshot.MANIFEST_NAME).exists():
+        return target
+    base, segments = _layers(current)
+    changed_before = (current.row_count - base.row_count) + (
+        len(current.tombstones) if current.tombstones is not None else 0
+    )
+    budget = int(DELTA_MAX_FRACTION * base.row_count) - changed_before
+    if len(segments) >= DELTA_MAX_SEGMENTS or budget <= 0:
+        _log(f"compacting: {len(segments)} segments with {changed_before} changed rows on {base.version}")
+        return None
+
+    live_ids = current.live_ids()
+    live_hashes = np.asarray(current.row_hashes())[live_ids]
+    known = np.unique(live_hashes)
+    hash_parts: List[np.ndarray] = []
+    fresh: Dict[int, List[str]] = {}
+    stats = source.ReadStats()
+    with source.open_text(csv_path, stats) as handle:
+        reader = csv.reader(handle, delimiter=CSV_DELIMITER)
+        header = next(reader, [])
+        if header != current.header:
+            _log("header changed; ingesting in full")
+            return None
+        pos = 0
+        for block in _blocks(reader):
+            hashes = snapshot.row_hashes(block)
+            hash_parts.append(hashes)
+            for i in np.flatnonzero(~_contains(known, hashes)).tolist():
+                fresh[pos + i] = block[i]
+            pos += len(block)
+            if len(fresh) > budget:
+                _log(f"more than {budget} changed rows; ingesting in full")
+                return None
+    new_hashes = np.concatenate(hash_parts) if hash_parts else np.zeros(0, dtype=np.uint64)
+
+    new_keys, old_keys = _occurrences(new_hashes), _occurrences(live_hashes)
+    added = np.flatnonzero(~np.isin(new_keys, old_keys))
+    removed = live_ids[~np.isin(old_keys, new_keys)]
+    if added.shape[0] + removed.shape[0] > budget:
+        _log(f"{added.shape[0]} added and {removed.shape[0]} removed rows exceed {budget}; ingesting in full")
+        return None
+    if any(len(row) > current.column_count for row in fresh.values()):
+        _log("rows wider than the snapshot; ingesting in full")
+        return None
+
+    # Extra repeats of a row that already exists are copied from that row.
+    repeats = [p for p in added.tolist() if p not in fresh]
+    if repeats:
+        order = np.argsort(live_hashes, kind="stable")
+        found = order[np.searchsorted(live_hashes[order], new_hashes[repeats])]
+        for p, row in zip(repeats, current.iter_rows(live_ids[found])):
+            fresh[p] = list(row)
+    rows = [fresh[p] for p in added.tolist()]
+
+    total = current.row_count + len(rows)
+    dead = removed if current.tombstones is None else np.union1d(current.tombstones.to_ids(), removed)
+    tmp = snapshot._tmp_dir(root, version)
+    try:
+        if rows:
+            (tmp / SEGMENT_NAME).mkdir()
+            snapshot.ingest_rows(
+                rows, header, tmp / SEGMENT_NAME, f"{version}-{SEGMENT_NAME}", signature, current.column_count
+            )
+            segments.append(f"{version}/{SEGMENT_NAME}")
+        bitmap.save(tmp / TOMBSTONES_NAME, [RowBitmap.from_ids(np.sort(dead), total)], total)
+        snapshot._write_catalog(tmp, _merged_catalog(current, removed, rows))
+        kvk = schema.for_header(header).kvk
+        changed = 0
+        if kvk is not None and rows and removed.shape[0]:
+            changed = len(set(current.column(kvk).take(removed)) & {r[kvk] for r in rows if kvk < len(r)})
+        manifest = {
+            "format": snapshot.FORMAT_VERSION,
+            "kind": "delta",
+            "version": version,
+            "source": signature[0],
+            "signature": list(signature),
+            "header": header,
+            "rows": total,
+            "base": base.path.name,
+            "segments": segments,
+            "changes": {"added": len(rows), "removed": int(removed.shape[0]), "changed_kvk": changed},
+        }
+        (tmp / snapshot.MANIFEST_NAME).write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(target)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    _log(
+        f"built {version} on {base.version}: {len(rows)} rows added, {removed.shape[0]} removed "
+        f"({changed} KVK numbers changed), {len(segments)} segments, "
+        f"in {time.perf_counter() - started:.2f}s ({stats.describe()})"
+    )
+    return target
+
+
+def _merged_catalog(current: snapshot.Snapshot, removed: np.ndarray, rows: List[List[str]]) -> Dict[int, Dict[str, int]]:
+    """The catalog of ``current`` without the ``removed`` rows and with ``rows`` added."""
+    merged: Dict[int, Dict[str, int]] = {}
+    for idx, values in current.catalog().items():
+        counts = Counter(values)
+        if removed.shape[0]:
+            counts.subtract(current.column(idx).take(removed))
+        counts.update(row[idx] if idx < len(row) else "" for row in rows)
+        kept = {value: n for value, n in counts.items() if n > 0}
+        if len(kept) <= CATALOG_MAX_VALUES:
+            merged[idx] = kept
+    return merged
@@ -1,31 +1,28 @@
 """Filter logic for 'economischactief' (TRUE/FALSE etc.)."""
-import csv
 from pathlib import Path
-from typing import Iterable, List, Generator, Set
+from typing import Dict, Iterable, List, Generator, Optional
 
-from ..config import CSV_DELIMITER, CSV_ENCODING
+import numpy as np
+
+from . import catalog, schema
 
 FILTER_KEY = "economischactief"
+ECONOMISCHACTIEF_COLS = schema.field("economischactief", ["economischactief"])
 
 def name() -> str:
     return FILTER_KEY
 
+def value_counts(csv_path: Path) -> Dict[str, int]:
+    """Rows per normalized economischactief value, from the source's value catalog."""
+    counts: Dict[str, int] = {}
+    for raw, n in (catalog.field_counts(csv_path, ECONOMISCHACTIEF_COLS) or {}).items():
+        v = (raw or "").strip() or "UNKNOWN"
+        counts[v] = counts.get(v, 0) + n
+    return counts
+
 def distinct_values(csv_path: Path) -> List[str]:
-    """Stream the CSV to collect unique economischactief values (normalized)."""
-    uniq: Set[str] = set()
-    with csv_path.open("r", encoding=CSV_ENCODING, newline="") as f:
-        rdr = csv.reader(f, delimiter=CSV_DELIMITER)
-        header = next(rdr)
-        header_norm = [h.strip().lower() for h in header]
-        try:
-            idx = header_norm.index("economischactief")
-        except ValueError:
-            return []
-        for row in rdr:
-            if idx < len(row):
-                raw = (row[idx] or "").strip()
-                v = raw if raw != "" else "UNKNOWN"
-                uniq.add(v)
+    """Unique economischactief values (normalized)."""
+    uniq = value_counts(csv_path)
     # Keep common booleans first if present
     order_hint = {"TRUE": 0, "FALSE": 1, "Ja": 0, "Nee": 1, "1": 0, "0": 1}
     return sorted(uniq, key=lambda s: (100 if s not in order_hint else order_hint[s], s.lower()))
@@ -35,9 +32,8 @@ def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Li
     if not selected_values:
         yield from rows_iter
         return
-    try:
-        idx = [h.strip().lower() for h in header].index("economischactief")
-    except ValueError:
+    idx = schema.for_header(header).find(ECONOMISCHACTIEF_COLS)
+    if idx is None:
         return
 
     selected = set(v.strip() for v in selected_values)
@@ -48,3 +44,14 @@ def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Li
             val = "UNKNOWN"
         if val in selected:
             yield row
+
+def mask(snap, header: List[str], selected_values: List[str]) -> Optional[np.ndarray]:
+    """Vectorized variant of apply(): union of the selected values' row bitmaps."""
+    if not selected_values:
+        return np.ones(snap.row_count, dtype=bool)
+    idx = schema.for_header(header).find(ECONOMISCHACTIEF_COLS)
+    if idx is None:
+        return np.zeros(snap.row_count, dtype=bool)
+
+    selected = set(v.strip() for v in selected_values)
+    return snap.where(idx, lambda v: ((v or "").strip() or "UNKNOWN") in selected)
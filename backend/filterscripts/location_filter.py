@@ -8,24 +8,39 @@ Design notes:
 - We log what we load so /api/filters logs become meaningful.
 - We tolerate empty properties on custom AOIs (common from QGIS scratch-layer exports).
 - Shapely 2.x STRtree.query returns indices; we dereference before intersects().
+- With a snapshot, polygon membership is evaluated once per source version and
+  geometry (keyed by a hash of its WKB) and cached as a row bitmap, so repeat
+  selections never touch the geometry again.
+- That evaluation is bulk: a bounding-box prefilter over the lon/lat arrays,
+  then shapely.intersects_xy against the prepared polygon in chunks.
 """
 
 from __future__ import annotations
+import hashlib
 import json
+import threading
+import time
 from pathlib import Path
 from typing import Iterable, List, Generator, Optional, Dict, Tuple
 
+import numpy as np
+import shapely
 from shapely.geometry import shape, Point
 from shapely.strtree import STRtree
 
+from . import bitmap, schema
+
 FILTER_KEY = "location"
 DATA_DIR   = Path(__file__).with_name("data")
 PROV_FILE  = DATA_DIR / "provincies_wgs84.geojson"
 CUSTOM_DIR = DATA_DIR / "custom_aoi"
 
 # Column candidates (case-insensitive)
-LON_CANDS = ["longitude", "lon", "lng", "x"]
-LAT_CANDS = ["latitude", "lat", "y"]
+LON_CANDS = schema.field("lon", ["longitude", "lon", "lng", "x"])
+LAT_CANDS = schema.field("lat", ["latitude", "lat", "y"])
+
+# Rows per shapely.intersects_xy call when evaluating a polygon in bulk
+AOI_CHUNK_ROWS = 262144
 
 # In-memory cache
 _CACHE_READY = False
@@ -33,6 +48,8 @@ _PROV_GEOMS: List = []
 _PROV_NAMES: List[str] = []
 _CUST_GEOMS: List = []
 _CUST_NAMES: List[str] = []
+_GEOM_KEYS: Dict[int, str] = {}  # id(geometry) -> WKB hash, reset with the geometries
+_LOAD_LOCK = threading.Lock()  # the startup warm-up and requests may load concurrently
 
 def name() -> str:
     return FILTER_KEY
@@ -43,17 +60,23 @@ def _log(msg: str) -> None:
 def invalidate_cache() -> None:
     """Force reload of province/custom geometries on next access."""
     global _CACHE_READY, _PROV_GEOMS, _PROV_NAMES, _CUST_GEOMS, _CUST_NAMES
-    _CACHE_READY = False
-    _PROV_GEOMS, _PROV_NAMES = [], []
-    _CUST_GEOMS, _CUST_NAMES = [], []
+    with _LOAD_LOCK:
+        _CACHE_READY = False
+        _PROV_GEOMS, _PROV_NAMES = [], []
+        _CUST_GEOMS, _CUST_NAMES = [], []
+        _GEOM_KEYS.clear()
     _log("cache invalidated")
 
 def _load_all() -> None:
     """Load provinces and custom AOIs once (with logging)."""
-    global _CACHE_READY, _PROV_GEOMS, _PROV_NAMES, _CUST_GEOMS, _CUST_NAMES
     if _CACHE_READY:
         return
+    with _LOAD_LOCK:
+        if not _CACHE_READY:
+            _load_geometries()
 
+def _load_geometries() -> None:
+    global _CACHE_READY, _PROV_GEOMS, _PROV_NAMES, _CUST_GEOMS, _CUST_NAMES
     _PROV_GEOMS, _PROV_NAMES = [], []
     _CUST_GEOMS, _CUST_NAMES = [], []
 
@@ -141,20 +164,16 @@ def distinct_values(*_args, **_kw) -> List[str]:
         _log(f"distinct_values error: {e}")
         return []
 
-def _find_idx(header: List[str], cands: List[str]) -> Optional[int]:
-    norm = [h.strip().lower() for h in header]
-    for c in cands:
-        if c in norm:
-            return norm.index(c)
-    return None
-
-def _collect_targets(selected: List[str]) -> List:
+def _named_targets(selected: List[str]) -> List[Tuple[str, object]]:
     name_to_geom: Dict[str, object] = {}
     for n, g in zip(_PROV_NAMES, _PROV_GEOMS):
         name_to_geom[n] = g
     for n, g in zip(_CUST_NAMES, _CUST_GEOMS):
         name_to_geom[n] = g
-    return [name_to_geom[s] for s in selected if s in name_to_geom]
+    return [(s, name_to_geom[s]) for s in selected if s in name_to_geom]
+
+def _collect_targets(selected: List[str]) -> List:
+    return [g for _n, g in _named_targets(selected)]
 
 def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: List[str]) -> Generator[List[str], None, None]:
     """Stream rows; yield only if point-in-selected-polygons."""
@@ -168,8 +187,9 @@ def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Li
         _log(f"apply load error: {e}")
         return
 
-    lon_i = _find_idx(header, LON_CANDS)
-    lat_i = _find_idx(header, LAT_CANDS)
+    cols = schema.for_header(header)
+    lon_i = cols.find(LON_CANDS)
+    lat_i = cols.find(LAT_CANDS)
     if lon_i is None or lat_i is None:
         _log("missing latitude/longitude columns; skipping filter")
         return
@@ -205,3 +225,115 @@ def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Li
                         break
                 except Exception:
                     continue
+
+
+# Snapshot (cached) evaluation -------------------------------------------------
+
+def _geom_key(geom) -> str:
+    key = _GEOM_KEYS.get(id(geom))
+    if key is None:
+        key = hashlib.sha1(shapely.to_wkb(geom)).hexdigest()[:16]
+        _GEOM_KEYS[id(geom)] = key
+    return key
+
+def cache_token(selected_values: List[str]) -> List[str]:
+    """Geometry hashes behind a selection, so cached results follow AOI edits."""
+    if not selected_values:
+        return []
+    _load_all()
+    return [_geom_key(g) for g in _collect_targets(selected_values)]
+
+def _float_or_none(cell: str) -> Optional[float]:
+    try:
+        return float(cell)
+    except (TypeError, ValueError):
+        return None
+
+def coordinates(snap, lon_i: int, lat_i: int) -> np.ndarray:
+    """(2, rows) float64 lon/lat per snapshot row; NaN where unparsable."""
+    def build(part) -> np.ndarray:
+        out = np.full((2, part.row_count), np.nan)
+        for k, idx in enumerate((lon_i, lat_i)):
+            vals, valid = part.column(idx).convert(_float_or_none)
+            out[k][valid] = vals[valid]
+        return out
+    return snap.rowwise(f"coords-{lon_i}-{lat_i}", build)
+
+def _evaluate(geom, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+    """Bulk ``geom.intersects(Point(lon, lat))`` over coordinate arrays."""
+    shapely.prepare(geom)
+    minx, miny, maxx, maxy = geom.bounds
+    out = np.zeros(lon.shape[0], dtype=bool)
+    for start in range(0, lon.shape[0], AOI_CHUNK_ROWS):
+        x = np.asarray(lon[start:start + AOI_CHUNK_ROWS])
+        y = np.asarray(lat[start:start + AOI_CHUNK_ROWS])
+        near = np.flatnonzero((x >= minx) & (x <= maxx) & (y >= miny) & (y <= maxy))
+        if near.shape[0]:
+            out[start + near] = shapely.intersects_xy(geom, x[near], y[near])
+    return out
+
+def membership(snap, lon_i: int, lat_i: int, geom, label: Optional[str] = None) -> bitmap.RowBitmap:
+    """Rows whose point intersects ``geom``; cached per snapshot version and geometry."""
+    def build(part) -> bitmap.RowBitmap:
+        coords = coordinates(part, lon_i, lat_i)
+        started = time.perf_counter()
+        hits = _evaluate(geom, coords[0], coords[1])
+        _log(f"evaluated {label or 'polygon'} over {part.row_count} rows in "
+             f"{time.perf_counter() - started:.2f}s ({int(hits.sum())} inside)")
+        return bitmap.RowBitmap.from_mask(hits)
+    return snap.rowwise(f"aoi-{lon_i}-{lat_i}-{_geom_key(geom)}", build)
+
+def warm(snap, header: List[str], selected_value: str) -> Optional[float]:
+    """Evaluate one province/AOI ahead of its first use; returns seconds taken (None if unknown)."""
+    _load_all()
+    cols = schema.for_header(header)
+    lon_i = cols.find(LON_CANDS)
+    lat_i = cols.find(LAT_CANDS)
+    targets = _named_targets([selected_value])
+    if lon_i is None or lat_i is None or not targets:
+        return None
+    started = time.perf_counter()
+    for label, geom in targets:
+        membership(snap, lon_i, lat_i, geom, label)
+    return time.perf_counter() - started
+
+def province_column(snap, lon_i: int, lat_i: int) -> Optional[np.ndarray]:
+    """Per row, the index into _PROV_NAMES of the first province containing it (-1 = none)."""
+    _load_all()
+    geoms = list(_PROV_GEOMS)
+    names = list(_PROV_NAMES)
+    if not geoms:
+        return None
+    key = hashlib.sha1(b"".join(shapely.to_wkb(g) for g in geoms)).hexdigest()[:16]
+    def build(part) -> np.ndarray:
+        out = np.full(part.row_count, -1, dtype=np.int16)
+        # Reverse order so the lowest province index wins on shared borders.
+        for i in reversed(range(len(geoms))):
+            out[membership(part, lon_i, lat_i, geoms[i], names[i]).to_ids()] = i
+        return out
+    return snap.rowwise(f"province-{lon_i}-{lat_i}-{key}", build)
+
+def mask(snap, header: List[str], selected_values: List[str]):
+    """Vectorized variant of apply(): union of the cached per-polygon row bitmaps."""
+    if not selected_values:
+        return np.ones(snap.row_count, dtype=bool)
+
+    try:
+        _load_all()
+    except Exception as e:
+        _log(f"mask load error: {e}")
+        return np.zeros(snap.row_count, dtype=bool)
+
+    cols = schema.for_header(header)
+    lon_i = cols.find(LON_CANDS)
+    lat_i = cols.find(LAT_CANDS)
+    if lon_i is None or lat_i is None:
+        _log("missing latitude/longitude columns; skipping filter")
+        return np.zeros(snap.row_count, dtype=bool)
+
+    targets = _named_targets(selected_values)
+    if not targets:
+        _log(f"no geometries matched selected values: {selected_values}")
+        return np.zeros(snap.row_count, dtype=bool)
+
+    return bitmap.union_all((membership(snap, lon_i, lat_i, g, n) for n, g in targets), snap.row_count)
@@ -7,6 +7,10 @@ Channels: email, facebook, instagram, linkedin, pinterest, twitter, youtube, int
 import ast
 from typing import Iterable, List, Generator, Optional, Dict
 
+import numpy as np
+
+from . import schema
+
 FILTER_KEY = "media"
 
 CHANNELS = ["email", "facebook", "instagram", "linkedin", "pinterest", "twitter", "youtube", "internetaddress"]
@@ -22,6 +26,8 @@ COL_CANDIDATES: Dict[str, List[str]] = {
     "youtube":          ["youtube", "you_tube"],
     "internetaddress":  ["internetaddress", "website", "url", "site", "homepage", "web", "internet_adres"],
 }
+for _ch, _cands in COL_CANDIDATES.items():
+    schema.field(f"media.{_ch}", _cands)
 
 def name() -> str:
     return FILTER_KEY
@@ -30,14 +36,6 @@ def distinct_values(*_a, **_k) -> List[str]:
     # fixed list used to render checkboxes
     return CHANNELS
 
-def _find_col(header: List[str], candidates: List[str]) -> Optional[int]:
-    norm = [h.strip().lower() for h in header]
-    for c in candidates:
-        c2 = c.strip().lower()
-        if c2 in norm:
-            return norm.index(c2)
-    return None
-
 def _has_value(cell: Optional[str]) -> bool:
     if cell is None:
         return False
@@ -67,8 +65,9 @@ def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Li
 
     # Resolve column index per selected channel
     idx_map: Dict[str, Optional[int]] = {}
+    cols = schema.for_header(header)
     for ch in selected:
-        idx_map[ch] = _find_col(header, COL_CANDIDATES.get(ch, [ch]))
+        idx_map[ch] = cols.find(COL_CANDIDATES.get(ch, [ch]))
 
     # If any selected channel has no matching column, then no row can match
     if any(idx is None for idx in idx_map.values()):
@@ -83,3 +82,16 @@ def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Li
                 break
         if ok:
             yield row
+
+def mask(snap, header: List[str], selected_values: List[str]) -> Optional[np.ndarray]:
+    """Vectorized variant of apply(): AND of per-channel presence bitmaps."""
+    selected = [v.strip().lower() for v in (selected_values or []) if isinstance(v, str) and v.strip()]
+    out = None
+    cols = schema.for_header(header)
+    for ch in selected:
+        idx = cols.find(COL_CANDIDATES.get(ch, [ch]))
+        if idx is None:
+            return np.zeros(snap.row_count, dtype=bool)
+        present = snap.presence(idx, _has_value)
+        out = present if out is None else out & present
+    return np.ones(snap.row_count, dtype=bool) if out is None else out
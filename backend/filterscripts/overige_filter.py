@@ -12,11 +12,15 @@ from typing import Iterable, List, Generator, Optional, Dict
 import re
 from datetime import date
 
+import numpy as np
+
+from . import bitmap, schema, snapshot
+
 FILTER_KEY = "overige"
 
 # Column candidates
-DATE_COL_CANDS = ["oprichtingsdatum", "oprichtings_datum", "date_of_incorporation", "foundation_date"]
-TN_COL_CANDS   = ["tradenames", "trade_names", "handelsnamen", "handels_namen"]
+DATE_COL_CANDS = schema.field("oprichtingsdatum", ["oprichtingsdatum", "oprichtings_datum", "date_of_incorporation", "foundation_date"])
+TN_COL_CANDS   = schema.field("tradenames", ["tradenames", "trade_names", "handelsnamen", "handels_namen"])
 
 NL_MONTHS = {
     "januari":1, "februari":2, "maart":3, "april":4, "mei":5, "juni":6,
@@ -29,14 +33,6 @@ def name() -> str:
 def distinct_values(*_a, **_k) -> List[str]:
     return []  # group UI provides inputs
 
-def _find_col(header: List[str], candidates: List[str]) -> Optional[int]:
-    norm = [h.strip().lower() for h in header]
-    for c in candidates:
-        c2 = c.strip().lower()
-        if c2 in norm:
-            return norm.index(c2)
-    return None
-
 def _has_value(cell: Optional[str]) -> bool:
     if cell is None:
         return False
@@ -110,26 +106,27 @@ def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Li
         yield from rows_iter
         return
 
-    d_idx = _find_col(header, DATE_COL_CANDS) if (cons["date_min"] or cons["date_max"]) else None
-    t_idx = _find_col(header, TN_COL_CANDS)   if (cons["tn"] is not None) else None
+    cols = schema.for_header(header)
+    d_idx = cols.find(DATE_COL_CANDS) if (cons["date_min"] or cons["date_max"]) else None
+    t_idx = cols.find(TN_COL_CANDS)   if (cons["tn"] is not None) else None
 
     if (cons["date_min"] or cons["date_max"]) and d_idx is None:
         return
     if cons["tn"] is not None and t_idx is None:
         return
 
-    dmin = cons["date_min"] or date.min
-    dmax = cons["date_max"] or date.max
+    dmin = (cons["date_min"] or date.min).toordinal()
+    dmax = (cons["date_max"] or date.max).toordinal()
+    get_date = cols.getter("oprichtingsdatum")
 
     for row in rows_iter:
         ok = True
         if (cons["date_min"] or cons["date_max"]):
-            raw = row[d_idx] if d_idx is not None and d_idx < len(row) else ""
-            parsed = _parse_any_date(raw)
-            if not parsed:
+            ordinal = get_date(row) if get_date is not None else None
+            if ordinal is None:
                 ok = False
             else:
-                ok = (dmin <= parsed <= dmax)
+                ok = (dmin <= ordinal <= dmax)
 
         if ok and cons["tn"] is not None:
             present = _has_value(row[t_idx] if t_idx is not None and t_idx < len(row) else "")
@@ -137,3 +134,34 @@ def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Li
 
         if ok:
             yield row
+
+def _date_ordinal(s: Optional[str]) -> Optional[int]:
+    parsed = _parse_any_date(s)
+    return parsed.toordinal() if parsed else None
+
+snapshot.range_field("oprichtingsdatum", _date_ordinal)
+
+def mask(snap, header: List[str], selected_values: List[str]) -> Optional[np.ndarray]:
+    """Vectorized variant of apply(): date range on ordinals + presence mask."""
+    cons = _parse_tokens(selected_values)
+    out = np.ones(snap.row_count, dtype=bool)
+    if cons["date_min"] is None and cons["date_max"] is None and cons["tn"] is None:
+        return out
+
+    cols = schema.for_header(header)
+    d_idx = cols.find(DATE_COL_CANDS) if (cons["date_min"] or cons["date_max"]) else None
+    t_idx = cols.find(TN_COL_CANDS)   if (cons["tn"] is not None) else None
+    if (cons["date_min"] or cons["date_max"]) and d_idx is None:
+        return np.zeros(snap.row_count, dtype=bool)
+    if cons["tn"] is not None and t_idx is None:
+        return np.zeros(snap.row_count, dtype=bool)
+
+    parts = []
+    if cons["date_min"] or cons["date_max"]:
+        dmin = cons["date_min"].toordinal() if cons["date_min"] else None
+        dmax = cons["date_max"].toordinal() if cons["date_max"] else None
+        parts.append(snap.value_range(d_idx, _date_ordinal, dmin, dmax))
+    if cons["tn"] is not None:
+        present = snap.column(t_idx).present(_has_value)
+        parts.append(present if cons["tn"] else ~present)
+    return bitmap.intersect_all(parts, snap.row_count)
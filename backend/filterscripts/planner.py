@@ -0,0 +1,161 @@
+"""Evaluation order for row-level filters.
+
+Filters that cannot be answered from snapshot bitmaps run as a chain of
+generators, so a row rejected by one filter never reaches the next. The
+chain is cheapest when filters that are fast and reject many rows come
+first. :func:`build_plan` measures each filter's pass rate (selectivity) and
+time per row on a small sample of the source and orders the chain by
+``cost / (1 - selectivity)``; measurements are cached per source version and
+filter selection, so re-planning after changing one filter only measures
+that one.
+"""
+from __future__ import annotations
+
+import csv
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..config import CSV_DELIMITER, PLAN_SAMPLE_ROWS, PLAN_STATS_CACHE
+from . import sample, source
+from .snapshot import RowStream
+
+_STATS: "OrderedDict[Tuple[Hashable, str, str], Tuple[float, float]]" = OrderedDict()
+_STATS_LOCK = threading.Lock()
+
+
+def _log(msg: str) -> None:
+    print(f"[PLAN] {msg}")
+
+
+@dataclass
+class FilterStep:
+    key: str
+    mod: object
+    selected: object
+    selectivity: Optional[float] = None  # fraction of sample rows that pass
+    cost: Optional[float] = None  # seconds per input row
+
+    @property
+    def rank(self) -> float:
+        """Expected seconds spent per row this filter removes (lower runs first)."""
+        if self.cost is None or self.selectivity is None:
+            return float("inf")
+        return self.cost / max(1.0 - self.selectivity, 1e-3)
+
+
+class FilterPlan:
+    """Ordered row-level filter steps; ``apply`` chains them lazily."""
+
+    def __init__(self, steps: List[FilterStep]):
+        self.steps = steps
+
+    @property
+    def order(self) -> List[str]:
+        return [step.key for step in self.steps]
+
+    def apply(self, rows: Iterable[List[str]], header: List[str]) -> Iterable[List[str]]:
+        for step in self.steps:
+            rows = step.mod.apply(rows, header, step.selected)
+        return rows
+
+
+def _stats_key(source: Hashable, step: FilterStep) -> Tuple[Hashable, str, str]:
+    token = step.mod.cache_token(step.selected) if hasattr(step.mod, "cache_token") else None
+    return source, step.key, json.dumps([step.selected, token], sort_keys=True, ensure_ascii=False, default=str)
+
+
+def _measure(step: FilterStep, header: List[str], rows: List[List[str]]) -> Tuple[float, float]:
+    start = time.perf_counter()
+    passed = sum(1 for _row in step.mod.apply(iter(rows), header, step.selected))
+    elapsed = time.perf_counter() - start
+    return passed / len(rows), elapsed / len(rows)
+
+
+def build_plan(
+    header: List[str],
+    steps: List[FilterStep],
+    source: Hashable,
+    sample_rows: Callable[[], List[List[str]]],
+    order: Optional[Sequence[str]] = None,
+) -> FilterPlan:
+    """Order ``steps`` for evaluation.
+
+    ``order`` (filter keys, e.g. from a plan made in the parent of a
+    parallel scan) is used as given. Otherwise steps are measured on
+    ``sample_rows()`` (only called when a measurement is missing) and sorted
+    by rank; steps that cannot be measured keep their position at the end.
+    """
+    if order is not None:
+        position = {key: i for i, key in enumerate(order)}
+        return FilterPlan(sorted(steps, key=lambda step: position.get(step.key, len(position))))
+    if len(steps) < 2:
+        return FilterPlan(list(steps))
+
+    rows: Optional[List[List[str]]] = None
+    measured = False
+    for step in steps:
+        key = _stats_key(source, step)
+        with _STATS_LOCK:
+            stats = _STATS.get(key)
+            if stats is not None:
+                _STATS.move_to_end(key)
+        if stats is None:
+            if rows is None:
+                rows = sample_rows()
+            if not rows:
+                break
+            stats = _measure(step, header, rows)
+            measured = True
+            with _STATS_LOCK:
+                _STATS[key] = stats
+                while len(_STATS) > PLAN_STATS_CACHE:
+                    _STATS.popitem(last=False)
+        step.selectivity, step.cost = stats
+
+    plan = FilterPlan(sorted(steps, key=lambda step: step.rank))
+    if measured:
+        _log(
+            " -> ".join(
+                f"{step.key} ({step.selectivity:.1%} pass, {step.cost * 1e6:.2f} us/row)"
+                if step.cost is not None else step.key
+                for step in plan.steps
+            )
+        )
+    return plan
+
+
+def _thin(values: Sequence, limit: int) -> List:
+    if len(values) <= limit:
+        return list(values)
+    picks = np.unique(np.linspace(0, len(values) - 1, limit).astype(np.int64))
+    return [values[int(i)] for i in picks]
+
+
+def csv_sample_rows(path: Path, limit: int = PLAN_SAMPLE_ROWS) -> List[List[str]]:
+    """Planning rows from ``path``: the persisted preview sample when one exists,
+    else the first ``limit`` data rows."""
+    built = sample.cached_csv_sample(path)
+    if built is not None:
+        return _thin(built[2], limit)
+    rows: List[List[str]] = []
+    with source.open_text(path) as fh:
+        reader = csv.reader(fh, delimiter=CSV_DELIMITER)
+        next(reader, None)
+        for row in reader:
+            rows.append(row)
+            if len(rows) >= limit:
+                break
+    return rows
+
+
+def snapshot_sample_rows(snap, limit: int = PLAN_SAMPLE_ROWS) -> List[object]:
+    """Planning rows spread over the snapshot's persisted preview sample."""
+    ids = np.asarray(sample.snapshot_sample(snap), dtype=np.int64)
+    return list(RowStream(snap, np.asarray(_thin(ids, limit), dtype=np.int64)))
@@ -1,33 +1,35 @@
-import csv
 from pathlib import Path
-from typing import Iterable, List, Generator, Set
-from ..config import CSV_DELIMITER, CSV_ENCODING
+from typing import Dict, Iterable, List, Generator, Optional
+import numpy as np
+from . import catalog, schema
 FILTER_KEY = "rechtsvorm"
+RECHTSVORM_COLS = schema.field("rechtsvorm", ["rechtsvorm"])
 def name() -> str: return FILTER_KEY
+def value_counts(csv_path: Path) -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for raw, n in (catalog.field_counts(csv_path, RECHTSVORM_COLS) or {}).items():
+        v = (raw or "").strip() or "UNKNOWN"
+        counts[v] = counts.get(v, 0) + n
+    return counts
 def distinct_values(csv_path: Path) -> List[str]:
-    uniq: Set[str] = set()
-    with csv_path.open("r", encoding=CSV_ENCODING, newline="") as f:
-        rdr = csv.reader(f, delimiter=CSV_DELIMITER)
-        header = next(rdr)
-        try:
-            idx = [h.strip().lower() for h in header].index("rechtsvorm")
-        except ValueError:
-            return []
-        for row in rdr:
-            if idx < len(row):
-                v = (row[idx] or "").strip()
-                uniq.add(v if v else "UNKNOWN")
-    return sorted(uniq, key=lambda s: (s == "UNKNOWN", s.lower()))
+    return sorted(value_counts(csv_path), key=lambda s: (s == "UNKNOWN", s.lower()))
 def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: List[str]) -> Generator[List[str], None, None]:
     if not selected_values:
         yield from rows_iter
         return
-    try:
-        idx = [h.strip().lower() for h in header].index("rechtsvorm")
-    except ValueError:
+    idx = schema.for_header(header).find(RECHTSVORM_COLS)
+    if idx is None:
         return
     selected = set(v.strip() for v in selected_values)
     for row in rows_iter:
         val = (row[idx] or "").strip() or "UNKNOWN"
         if val in selected:
             yield row
+def mask(snap, header: List[str], selected_values: List[str]) -> Optional[np.ndarray]:
+    if not selected_values:
+        return np.ones(snap.row_count, dtype=bool)
+    idx = schema.for_header(header).find(RECHTSVORM_COLS)
+    if idx is None:
+        return np.zeros(snap.row_count, dtype=bool)
+    selected = set(v.strip() for v in selected_values)
+    return snap.where(idx, lambda v: ((v or "").strip() or "UNKNOWN") in selected)
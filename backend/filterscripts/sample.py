@@ -0,0 +1,198 @@
+"""Persisted stratified row samples for approximate preview counts.
+
+Rows are split by position into strata of STRATUM_ROWS rows and a fixed
+fraction of every stratum is drawn with a fixed seed, so the sample is the
+same on every run and spread evenly over the file. Evaluating the filter
+chain on the sample gives a stratified estimate of the full count with a
+normal-approximation confidence interval.
+
+With a snapshot the sample is a persisted array of row ids
+(``derived/sample-<rate>.npy``); without one the sampled rows themselves are
+pickled under ``SNAPSHOT_DIR/samples`` after a single pass over the CSV.
+"""
+from __future__ import annotations
+
+import csv
+import math
+import pickle
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import (
+    CSV_DELIMITER,
+    PREVIEW_SAMPLE_MIN_ROWS,
+    PREVIEW_SAMPLE_RATE,
+    SNAPSHOT_DIR,
+)
+from . import bitmap, snapshot, source
+
+STRATUM_ROWS = 65536
+_SEED = 0x5EED
+_Z = 1.96  # 95% confidence
+
+_CSV_SAMPLES: Dict[Tuple[Tuple[str, int, int], float], Tuple[List[str], np.ndarray, List[List[str]], int]] = {}
+_CSV_LOCK = threading.Lock()
+
+
+def _log(msg: str) -> None:
+    print(f"[SAMPLE] {msg}")
+
+
+def sample_rate(n_rows: int) -> float:
+    """PREVIEW_SAMPLE_RATE, raised so small files still get PREVIEW_SAMPLE_MIN_ROWS rows."""
+    if n_rows <= 0:
+        return 1.0
+    return min(1.0, max(PREVIEW_SAMPLE_RATE, PREVIEW_SAMPLE_MIN_ROWS / n_rows))
+
+
+def _picks(rng: np.random.Generator, rate: float, size: int) -> np.ndarray:
+    """Sorted sample positions inside one stratum of ``size`` rows.
+
+    Positions are drawn for a full stratum and then cut to ``size``, so a
+    streaming reader can draw before it knows where the last stratum ends.
+    """
+    k = min(STRATUM_ROWS, max(1, math.ceil(rate * STRATUM_ROWS)))
+    pos = np.sort(rng.choice(STRATUM_ROWS, k, replace=False))
+    pos = pos[pos < size]
+    if not pos.shape[0] and size > 0:
+        pos = np.asarray([rng.integers(size)])
+    return pos.astype(np.int64)
+
+
+def sample_positions(n_rows: int, rate: float) -> np.ndarray:
+    rng = np.random.default_rng(_SEED)
+    parts = [
+        start + _picks(rng, rate, min(STRATUM_ROWS, n_rows - start))
+        for start in range(0, n_rows, STRATUM_ROWS)
+    ]
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+
+
+def snapshot_sample(snap: "snapshot.Snapshot") -> np.ndarray:
+    """Sampled row ids of ``snap`` (persisted with the snapshot)."""
+    rate = sample_rate(snap.row_count)
+    ids = snap.derived(f"sample-{rate:.6g}", lambda: sample_positions(snap.row_count, rate))
+    if snap.tombstones is None:
+        return ids
+    return snap.only_live(bitmap.RowBitmap.from_ids(ids, snap.row_count)).to_ids()
+
+
+def _estimated_rows(path: Path) -> int:
+    head, size = source.head(path)
+    lines = head.count(b"\n")
+    return int(size * lines / len(head)) if head and lines else 0
+
+
+def _csv_sample_key(path: Path) -> Tuple[Tuple[Tuple[str, int, int], float], Path]:
+    signature = snapshot.source_signature(path)
+    rate = sample_rate(_estimated_rows(path))
+    target = SNAPSHOT_DIR / "samples" / f"{snapshot.version_for(signature)}-{rate:.6g}.pkl"
+    return (signature, rate), target
+
+
+def cached_csv_sample(path: Path) -> Optional[Tuple[List[str], np.ndarray, List[List[str]], int]]:
+    """csv_sample() when it has already been built for this version of ``path``, else None."""
+    key, target = _csv_sample_key(path)
+    cached = _CSV_SAMPLES.get(key)
+    if cached is None and target.exists():
+        cached = csv_sample(path)
+    return cached
+
+
+def csv_sample(path: Path) -> Tuple[List[str], np.ndarray, List[List[str]], int]:
+    """Header, sampled row positions, sampled rows and total row count of ``path``."""
+    key, target = _csv_sample_key(path)
+    rate = key[1]
+    cached = _CSV_SAMPLES.get(key)
+    if cached is not None:
+        return cached
+    with _CSV_LOCK:
+        cached = _CSV_SAMPLES.get(key)
+        if cached is not None:
+            return cached
+        if target.exists():
+            with target.open("rb") as fh:
+                cached = pickle.load(fh)
+        else:
+            cached = _build_csv_sample(path, rate)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_name(target.name + ".tmp")
+            with tmp.open("wb") as fh:
+                pickle.dump(cached, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            tmp.replace(target)
+        _CSV_SAMPLES.clear()
+        _CSV_SAMPLES[key] = cached
+    return cached
+
+
+def _build_csv_sample(path: Path, rate: float) -> Tuple[List[str], np.ndarray, List[List[str]], int]:
+    rng = np.random.default_rng(_SEED)
+    ids: List[int] = []
+    rows: List[List[str]] = []
+    n = 0
+    with source.open_text(path) as fh:
+        reader = csv.reader(fh, delimiter=CSV_DELIMITER)
+        header = next(reader)
+        picks: set = set()
+        for n, row in enumerate(reader, start=1):
+            pos = (n - 1) % STRATUM_ROWS
+            if pos == 0:
+                # Drawn for a full stratum; positions past the end of a short
+                # last stratum are simply never reached.
+                picks = set(_picks(rng, rate, STRATUM_ROWS).tolist())
+            if pos in picks:
+                ids.append(n - 1)
+                rows.append(row)
+    _log(f"sampled {len(ids)} of {n} rows from {path.name}")
+    return header, np.asarray(ids, dtype=np.int64), rows, n
+
+
+def estimate(
+    sample_ids: np.ndarray, matched_ids: np.ndarray, n_rows: int, removed: Optional[np.ndarray] = None
+) -> Dict[str, object]:
+    """Stratified estimate of the matching row count with a 95% interval.
+
+    ``removed`` lists tombstoned row ids below ``n_rows`` (segmented snapshots),
+    which do not count towards their stratum.
+    """
+    strata = (n_rows + STRATUM_ROWS - 1) // STRATUM_ROWS
+    sizes = np.full(strata, STRATUM_ROWS, dtype=np.float64)
+    if strata:
+        sizes[-1] = n_rows - (strata - 1) * STRATUM_ROWS
+    if removed is not None and removed.shape[0]:
+        sizes -= np.bincount(np.asarray(removed) // STRATUM_ROWS, minlength=strata)
+        n_rows -= int(removed.shape[0])
+    sampled = np.bincount(np.asarray(sample_ids) // STRATUM_ROWS, minlength=strata).astype(np.float64)
+    matched = np.bincount(np.asarray(matched_ids) // STRATUM_ROWS, minlength=strata).astype(np.float64)
+    overall = matched.sum() / sampled.sum() if sampled.sum() else 0.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # A short last stratum can end up unsampled; it takes the overall rate.
+        p = np.where(sampled > 0, matched / sampled, overall)
+        var = sizes ** 2 * (1 - sampled / sizes) * p * (1 - p) / np.maximum(sampled - 1, 1)
+    var = np.where(sizes > 0, var, 0.0)
+    value = float((sizes * p).sum())
+    half = _Z * math.sqrt(float(var.sum()))
+    low, high = value - half, value + half
+    n_sample = int(sampled.sum())
+    n_matched = int(matched.sum())
+    exact = n_sample >= n_rows
+    if not exact and n_sample:
+        # All-or-nothing samples have zero variance; widen with the rule of three.
+        slack = 3.0 * n_rows / n_sample
+        if n_matched == 0:
+            high = max(high, slack)
+        elif n_matched == n_sample:
+            low = min(low, n_rows - slack)
+    return {
+        "estimate": int(round(value)),
+        "low": int(max(0, math.floor(low))),
+        "high": int(min(n_rows, math.ceil(high))),
+        "confidence": 0.95,
+        "sample_rows": n_sample,
+        "sample_matches": n_matched,
+        "rows_total": int(n_rows),
+        "exact": exact,
+    }
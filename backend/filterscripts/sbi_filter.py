@@ -1,5 +1,6 @@
 """Streaming filter for SBI code selections (main/sub/all).
 Supports manual code entry and uploaded CSV lists (stored locally).
+A code ending in ``*`` selects every code with that prefix (``70*`` -> 70xxx).
 """
 from __future__ import annotations
 
@@ -9,16 +10,20 @@ import re
 from pathlib import Path
 from typing import Dict, Generator, Iterable, List, Optional, Set, Tuple, Union
 
+import numpy as np
+
+from . import schema
+
 FILTER_KEY = "sbi"
 
-MAIN_COL_CANDS = ["mainsbi", "main_sbi", "hoofd_sbi", "hoofdactiviteit"]
-SUB_COL_CANDS = ["subsbi", "sub_sbi", "nevenactiviteiten", "nevensbi"]
-ALL_COL_CANDS = ["allsbi", "all_sbi", "alle_sbi", "sbi_codes"]
+MAIN_COL_CANDS = schema.field("sbi.main", ["mainsbi", "main_sbi", "hoofd_sbi", "hoofdactiviteit"])
+SUB_COL_CANDS = schema.field("sbi.sub", ["subsbi", "sub_sbi", "nevenactiviteiten", "nevensbi"])
+ALL_COL_CANDS = schema.field("sbi.all", ["allsbi", "all_sbi", "alle_sbi", "sbi_codes"])
 
 BUCKETS = ("main", "sub", "all")
 
 _DATA_DIR = Path(__file__).with_name("data") / "sbi_lists"
-_CACHE: Dict[Tuple[str, str], Set[str]] = {}
+_CACHE: Dict[Tuple[str, str], Tuple[int, Set[str]]] = {}  # (bucket, stem) -> (mtime_ns, codes)
 
 
 def name() -> str:
@@ -117,25 +122,18 @@ def save_uploaded_csv(bucket: str, original_name: str, raw_content: Union[str, b
 
 def _load_codes_from_file(bucket: str, stem: str) -> Set[str]:
     key = (bucket, stem)
-    if key in _CACHE:
-        return _CACHE[key]
     path = _bucket_dir(bucket) / f"{stem}.txt"
     if not path.exists():
         return set()
+    mtime = path.stat().st_mtime_ns
+    cached = _CACHE.get(key)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
     codes = {_normalize_code(line) for line in path.read_text(encoding="utf-8").splitlines() if _normalize_code(line)}
-    _CACHE[key] = codes
+    _CACHE[key] = (mtime, codes)
     return codes
 
 
-def _find_col(header: List[str], candidates: List[str]) -> Optional[int]:
-    lowered = [h.strip().lower() for h in header]
-    for cand in candidates:
-        c = cand.strip().lower()
-        if c in lowered:
-            return lowered.index(c)
-    return None
-
-
 def _normalize_selection(selected: Union[Dict[str, object], List[str], None]) -> Dict[str, Dict[str, Union[List[str], Optional[str]]]]:
     result = {
         "main": {"codes": [], "file": None},
@@ -177,7 +175,7 @@ def _normalize_selection(selected: Union[Dict[str, object], List[str], None]) ->
     return result
 
 
-def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Union[Dict[str, object], List[str], None]) -> Generator[List[str], None, None]:
+def _active_codes(selected_values: Union[Dict[str, object], List[str], None]) -> Dict[str, Set[str]]:
     normalized = _normalize_selection(selected_values)
 
     active_buckets = {
@@ -194,24 +192,79 @@ def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Un
         if file_label:
             data["codes"].update(_load_codes_from_file(bucket, file_label))
 
-    if all(len(data["codes"]) == 0 for data in active_buckets.values()):
+    return {bucket: data["codes"] for bucket, data in active_buckets.items()}
+
+
+def cache_token(selected_values: Union[Dict[str, object], List[str], None]) -> List[object]:
+    """Size/mtime of the uploaded lists a selection refers to (cached results depend on them)."""
+    token: List[object] = []
+    normalized = _normalize_selection(selected_values)
+    for bucket in BUCKETS:
+        stem = normalized[bucket]["file"]
+        if not stem:
+            continue
+        path = _bucket_dir(bucket) / f"{stem}.txt"
+        try:
+            stat = path.stat()
+            token.append([bucket, stem, stat.st_size, stat.st_mtime_ns])
+        except OSError:
+            token.append([bucket, stem, None])
+    return token
+
+
+def _split_patterns(codes: Set[str]) -> Tuple[Set[str], Tuple[str, ...]]:
+    """Separate exact codes from prefix patterns such as ``70*``."""
+    exact = {c for c in codes if not c.endswith("*")}
+    prefixes = tuple(sorted({c.rstrip("*").strip() for c in codes if c.endswith("*")}))
+    return exact, prefixes
+
+
+def _matches(values: Set[str], exact: Set[str], prefixes: Tuple[str, ...]) -> bool:
+    if values & exact:
+        return True
+    return any(v.startswith(prefixes) for v in values) if prefixes else False
+
+
+def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Union[Dict[str, object], List[str], None]) -> Generator[List[str], None, None]:
+    codes = _active_codes(selected_values)
+
+    if all(len(c) == 0 for c in codes.values()):
         yield from rows_iter
         return
 
-    idx_main = _find_col(header, MAIN_COL_CANDS) if active_buckets["main"]["codes"] else None
-    idx_sub = _find_col(header, SUB_COL_CANDS) if active_buckets["sub"]["codes"] else None
-    idx_all = _find_col(header, ALL_COL_CANDS) if active_buckets["all"]["codes"] else None
+    cols = schema.for_header(header)
+    idx_main = cols.find(MAIN_COL_CANDS) if codes["main"] else None
+    idx_sub = cols.find(SUB_COL_CANDS) if codes["sub"] else None
+    idx_all = cols.find(ALL_COL_CANDS) if codes["all"] else None
+    patterns = {bucket: _split_patterns(codes[bucket]) for bucket in BUCKETS}
 
     for row in rows_iter:
         ok = True
         if idx_main is not None:
             values = _parse_row_codes(row[idx_main] if idx_main < len(row) else "")
-            ok = bool(values & active_buckets["main"]["codes"])
+            ok = _matches(values, *patterns["main"])
         if ok and idx_sub is not None:
             values = _parse_row_codes(row[idx_sub] if idx_sub < len(row) else "")
-            ok = bool(values & active_buckets["sub"]["codes"])
+            ok = _matches(values, *patterns["sub"])
         if ok and idx_all is not None:
             values = _parse_row_codes(row[idx_all] if idx_all < len(row) else "")
-            ok = bool(values & active_buckets["all"]["codes"])
+            ok = _matches(values, *patterns["all"])
         if ok:
             yield row
+
+
+def mask(snap, header: List[str], selected_values: Union[Dict[str, object], List[str], None]) -> Optional[np.ndarray]:
+    """Indexed variant of apply(): union of per-code row bitmaps per bucket."""
+    codes = _active_codes(selected_values)
+    out = None
+    cols = schema.for_header(header)
+    for bucket, cands in (("main", MAIN_COL_CANDS), ("sub", SUB_COL_CANDS), ("all", ALL_COL_CANDS)):
+        if not codes[bucket]:
+            continue
+        idx = cols.find(cands)
+        if idx is None:
+            # apply() skips a bucket whose column is missing
+            continue
+        matched = snap.token_index(idx, _parse_row_codes).match(*_split_patterns(codes[bucket]))
+        out = matched if out is None else out & matched
+    return np.ones(snap.row_count, dtype=bool) if out is None else out
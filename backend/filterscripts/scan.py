@@ -0,0 +1,466 @@
+"""Parallel scan of the source CSV by byte ranges.
+
+Used when no columnar snapshot is available (SNAPSHOT_ENABLED=0 or a failed
+build): the file is cut into record-aligned byte ranges, each range runs the
+regular filter chain in a worker process, and results are merged in source
+order.
+
+Record boundaries are found without parsing: a newline ends a record only
+when the number of quote characters before it is even. That holds for files
+written with standard CSV quoting (quotes only inside quoted fields).
+
+Compressed sources in a seekable block format (see ``source.py``) are split
+on decompressed offsets: a first pool pass decompresses groups of blocks to
+count their quotes and find the candidate record starts for either quote
+parity, and workers then decompress only the blocks of their range.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import mmap
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from ..config import CSV_DELIMITER, CSV_ENCODING, SCAN_MIN_BYTES, SCAN_WORKERS
+from . import schema, source
+
+# Ranges per worker; more ranges balance uneven filter cost across the file.
+RANGES_PER_WORKER = 4
+MIN_RANGE_BYTES = 4 * 1024 * 1024
+_COUNT_BLOCK = 64 * 1024 * 1024
+_BATCH_ROWS = 10000
+
+# Splits of compressed sources, keyed by file signature and range count.
+_SPLITS: Dict[Tuple[str, int, int, int], Tuple[List[str], List[Tuple[int, int]]]] = {}
+_SPLITS_LOCK = threading.Lock()
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+
+def _log(msg: str) -> None:
+    print(f"[SCAN] {msg}")
+
+
+def _context():
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        # Import the filter modules once in the server instead of in every worker.
+        context.set_forkserver_preload([f"{__package__}.combinator"])
+        return context
+    return multiprocessing.get_context("spawn")
+
+
+def _pool() -> ProcessPoolExecutor:
+    """The scan worker pool of this process, started on first use and reused.
+
+    Workers are not forked from the calling process: the server is
+    multi-threaded (requests, jobs, warm-up, watcher), and a child forked
+    while another thread holds a lock (schema, snapshot, logging) would
+    inherit it locked for good. They come from a forkserver (spawned where
+    that is unavailable) and get everything they need through their
+    picklable task dicts.
+    """
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=SCAN_WORKERS, mp_context=_context())
+        return _POOL
+
+
+def _submit(fn: Callable, tasks: List[Dict[str, object]]) -> List[Future]:
+    """Queue ``fn(task)`` for every task, replacing a pool whose workers died."""
+    global _POOL
+    pool = _pool()
+    try:
+        return [pool.submit(fn, task) for task in tasks]
+    except BrokenProcessPool:
+        with _POOL_LOCK:
+            if _POOL is pool:
+                _POOL = None
+        pool = _pool()
+        return [pool.submit(fn, task) for task in tasks]
+
+
+def _release(futures: List[Future]) -> None:
+    """Cancel what is left of a scan that stopped early and wait for running tasks."""
+    for future in futures:
+        future.cancel()
+    wait(futures)
+
+
+def _after_fork() -> None:
+    # The pool's processes and threads belong to the parent.
+    global _POOL, _POOL_LOCK
+    _POOL = None
+    _POOL_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def enabled_for(path: Path) -> bool:
+    """True when ``path`` is large enough to be worth a parallel scan.
+
+    Compressed sources also need a seekable block layout; others are read
+    sequentially.
+    """
+    if SCAN_WORKERS <= 1:
+        return False
+    try:
+        size = source.raw_size(path)
+    except (OSError, ValueError):
+        return False
+    return size is not None and size >= SCAN_MIN_BYTES
+
+
+# Splitting -------------------------------------------------------------------
+
+
+def _count_quotes(mm: mmap.mmap, start: int, stop: int) -> int:
+    total = 0
+    for pos in range(start, stop, _COUNT_BLOCK):
+        total += mm[pos:min(pos + _COUNT_BLOCK, stop)].count(b'"')
+    return total
+
+
+def _next_record_start(mm: mmap.mmap, pos: int, quotes_before: int) -> Tuple[int, int]:
+    """First record start at or after ``pos`` and the quote count before it."""
+    size = len(mm)
+    while pos < size:
+        nl = mm.find(b"\n", pos)
+        if nl < 0:
+            return size, quotes_before
+        quotes_before += mm[pos:nl].count(b'"')
+        pos = nl + 1
+        if quotes_before % 2 == 0:
+            return pos, quotes_before
+    return size, quotes_before
+
+
+def split_ranges(path: Path, parts: int) -> Tuple[List[str], List[Tuple[int, int]]]:
+    """Parse the header and cut the data rows into about ``parts`` record-aligned ranges.
+
+    Offsets are into the decompressed data for compressed sources.
+    """
+    if source.codec(path) is not None:
+        return _split_blocks(path, parts)
+    with path.open("rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        if size == 0:
+            raise ValueError(f"Source CSV is empty: {path}")
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            header_end, quotes = _next_record_start(mm, 0, 0)
+            header_text = mm[:header_end].decode(CSV_ENCODING)
+            bounds = [header_end]
+            pos = header_end
+            step = max((size - header_end) // max(parts, 1), MIN_RANGE_BYTES)
+            while bounds[-1] + step < size:
+                target = bounds[-1] + step
+                quotes += _count_quotes(mm, pos, target)
+                pos, quotes = _next_record_start(mm, target, quotes)
+                if pos >= size:
+                    break
+                bounds.append(pos)
+    bounds.append(size)
+    return _parse_header(header_text), [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def _parse_header(text: str) -> List[str]:
+    return next(csv.reader(io.StringIO(text, newline=""), delimiter=CSV_DELIMITER))
+
+
+def _probe_range(task: Dict[str, object]) -> Dict[str, object]:
+    """Quote count of a decompressed range and its first record start for either parity."""
+    stats = source.ReadStats()
+    data = source.read_range(Path(task["path"]), task["start"], task["stop"], stats)
+    starts = []
+    for parity in (0, 1):
+        pos, _quotes = _next_record_start(data, 0, parity)
+        starts.append(task["start"] + pos if pos < len(data) else None)
+    head = data[:starts[0] - task["start"]] if task["start"] == 0 and starts[0] is not None else None
+    return {"quotes": data.count(b'"'), "starts": starts, "head": head,
+            "bytes": stats.raw_bytes, "seconds": stats.seconds}
+
+
+def _split_blocks(path: Path, parts: int) -> Tuple[List[str], List[Tuple[int, int]]]:
+    blocks = source.blocks(path)
+    if blocks is None:
+        raise ValueError(f"{path.name} is compressed but not in a seekable block format")
+    total = blocks[-1].raw_offset + blocks[-1].raw_size if blocks else 0
+    if total == 0:
+        raise ValueError(f"Source CSV is empty: {path}")
+    stat = path.stat()
+    key = (str(path.resolve()), int(stat.st_size), int(stat.st_mtime_ns), parts)
+    with _SPLITS_LOCK:
+        cached = _SPLITS.get(key)
+    if cached is not None:
+        return cached
+    # Group whole blocks into about ``parts`` ranges of decompressed bytes.
+    step = max(total // max(parts, 1), MIN_RANGE_BYTES)
+    starts = [0]
+    for block in blocks[1:]:
+        if block.raw_offset - starts[-1] >= step:
+            starts.append(block.raw_offset)
+    tasks = [{"path": str(path), "start": a, "stop": b} for a, b in zip(starts, starts[1:] + [total])]
+    started = time.perf_counter()
+    futures = _submit(_probe_range, tasks)
+    try:
+        probes = [future.result() for future in futures]
+    finally:
+        _release(futures)
+    elapsed = time.perf_counter() - started
+    if probes[0]["starts"][0] is None:
+        raise ValueError(f"Source CSV has no data rows: {path}")
+    bounds = [probes[0]["starts"][0]]
+    quotes = 0
+    for task, probe in zip(tasks, probes):
+        bound = probe["starts"][quotes % 2]
+        if task["start"] and bound is not None and bound > bounds[-1]:
+            bounds.append(bound)
+        quotes += probe["quotes"]
+    bounds.append(total)
+    raw = sum(p["bytes"] for p in probes)
+    seconds = sum(p["seconds"] for p in probes)
+    _log(
+        f"split {path.name}: decompressed {raw / 1e6:.1f} MB in {elapsed:.2f}s across "
+        f"{len(tasks)} block groups ({raw / 1e6 / max(seconds, 1e-9):.0f} MB/s per worker)"
+    )
+    result = (
+        _parse_header(probes[0]["head"].decode(CSV_ENCODING)),
+        [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a],
+    )
+    with _SPLITS_LOCK:
+        _SPLITS.clear()
+        _SPLITS[key] = result
+    return result
+
+
+# Workers ---------------------------------------------------------------------
+
+
+def _read_range(path: str, start: int, stop: int) -> Iterator[List[str]]:
+    data = source.read_range(Path(path), start, stop)
+    return csv.reader(io.StringIO(data.decode(CSV_ENCODING), newline=""), delimiter=CSV_DELIMITER)
+
+
+def _filter_range(task: Dict[str, object]) -> Iterator[List[str]]:
+    """Run the filter chain (minus cross-range duplicate removal) over one range."""
+    from . import combinator
+
+    header = task["header"]
+    rows = _read_range(task["path"], task["start"], task["stop"])
+    filtered = combinator._apply_filters(rows, header, task["selected"], None, order=task["order"])
+    folder = task["duplicates"]
+    if folder is None:
+        return iter(filtered)
+    kvk_idx = schema.for_header(header).kvk
+    existing = combinator._load_existing_kvk_numbers(Path(folder))
+    return (
+        row for row in filtered
+        if not (kvk_idx < len(row) and row[kvk_idx].strip() in existing)
+    )
+
+
+def _count_range(task: Dict[str, object]) -> Tuple[int, Optional[Set[str]]]:
+    """Matching rows in a range; with duplicates on, rows without KVK plus the KVK set."""
+    rows = _filter_range(task)
+    if task["duplicates"] is None:
+        return sum(1 for _ in rows), None
+    kvk_idx = schema.for_header(task["header"]).kvk
+    blank = 0
+    kvks: Set[str] = set()
+    for row in rows:
+        kvk = row[kvk_idx].strip() if kvk_idx < len(row) else ""
+        if kvk:
+            kvks.add(kvk)
+        else:
+            blank += 1
+    return blank, kvks
+
+
+def _analyze_range(task: Dict[str, object]) -> Tuple[Dict[str, object], List[str]]:
+    """Analysis state (serialized) and warnings for the matching rows of a range."""
+    from ..analysis import StreamingAnalyzer
+
+    analyzer = StreamingAnalyzer(task["header"])
+    for row in _filter_range(task):
+        analyzer.consume(row)
+    return analyzer.state.to_dict(), analyzer.warnings
+
+
+def _rows_range(task: Dict[str, object]) -> int:
+    """Write matching rows of a range to ``task['out']`` as pickled batches."""
+    written = 0
+    with open(task["out"], "wb") as out:
+        batch: List[List[str]] = []
+        for row in _filter_range(task):
+            batch.append(list(row))
+            if len(batch) >= _BATCH_ROWS:
+                pickle.dump(batch, out, protocol=pickle.HIGHEST_PROTOCOL)
+                written += len(batch)
+                batch = []
+        if batch:
+            pickle.dump(batch, out, protocol=pickle.HIGHEST_PROTOCOL)
+            written += len(batch)
+    return written
+
+
+# Parent side -----------------------------------------------------------------
+
+
+def _prepare(path: Path, selected: Dict[str, object], advanced: Optional[Dict[str, object]]):
+    from . import combinator
+
+    header, ranges = split_ranges(path, SCAN_WORKERS * RANGES_PER_WORKER)
+    schema.for_source(header)
+    folder = combinator._duplicates_folder(advanced)
+    if folder is not None:
+        # Same validation (and error messages) as the in-process path.
+        folder = str(folder or "").strip()
+        if not folder:
+            raise ValueError("Provide a folder path to filter duplicates.")
+        if schema.for_header(header).kvk is None:
+            raise ValueError("Could not find a KVK column in the source CSV.")
+        combinator._load_existing_kvk_numbers(Path(folder))
+    # Plan once here so every worker runs the filters in the same order.
+    order = combinator.filter_order(header, selected)
+    tasks = [
+        {
+            "path": str(path),
+            "start": start,
+            "stop": stop,
+            "header": header,
+            "selected": selected,
+            "duplicates": folder,
+            "order": order,
+        }
+        for start, stop in ranges
+    ]
+    return header, tasks, folder
+
+
+def count(
+    path: Path,
+    selected: Dict[str, object],
+    advanced: Optional[Dict[str, object]] = None,
+    on_range: Optional[Callable[[int, int, Optional[int]], None]] = None,
+) -> int:
+    """Number of rows matching ``selected`` (and the duplicates option) in ``path``."""
+    header, tasks, folder = _prepare(path, selected, advanced)
+    _log(f"counting {path.name} over {len(tasks)} ranges with {SCAN_WORKERS} workers")
+    total = 0
+    seen: Set[str] = set()
+    size = tasks[-1]["stop"] if tasks else 0
+    futures = _submit(_count_range, tasks)
+    try:
+        for task, future in zip(tasks, futures):
+            n, kvks = future.result()
+            total += n
+            if kvks:
+                seen.update(kvks)
+            if on_range is not None:
+                on_range(task["stop"], size, total + len(seen))
+    finally:
+        _release(futures)
+    return total + len(seen)
+
+
+def analyze(
+    path: Path,
+    selected: Dict[str, object],
+    advanced: Optional[Dict[str, object]] = None,
+    on_range: Optional[Callable[[int, int, Optional[int]], None]] = None,
+):
+    """Header, merged AnalysisState and warnings for the rows matching ``selected``.
+
+    Each range is aggregated in its worker; only the partial states travel
+    back. With duplicate filtering on, KVK numbers must be deduplicated
+    across ranges first, so rows are streamed back and aggregated here.
+    ``on_range(done_bytes, total_bytes, matched)`` is called as ranges complete.
+    """
+    from ..analysis import AnalysisState, StreamingAnalyzer
+    from . import combinator
+
+    if combinator._duplicates_folder(advanced) is not None:
+        header, rows = iter_rows(path, selected, advanced, on_range=on_range)
+        analyzer = StreamingAnalyzer(header)
+        for row in rows:
+            analyzer.consume(row)
+        return header, analyzer.state, analyzer.warnings
+    header, tasks, _folder = _prepare(path, selected, advanced)
+    _log(f"analyzing {path.name} over {len(tasks)} ranges with {SCAN_WORKERS} workers")
+    total = AnalysisState()
+    warnings: List[str] = []
+    size = tasks[-1]["stop"] if tasks else 0
+    futures = _submit(_analyze_range, tasks)
+    try:
+        for task, future in zip(tasks, futures):
+            data, msgs = future.result()
+            total.merge(AnalysisState.from_dict(data))
+            warnings.extend(msg for msg in msgs if msg not in warnings)
+            if on_range is not None:
+                on_range(task["stop"], size, total.total_rows)
+    finally:
+        _release(futures)
+    return header, total, warnings
+
+
+def iter_rows(
+    path: Path,
+    selected: Dict[str, object],
+    advanced: Optional[Dict[str, object]] = None,
+    on_range: Optional[Callable[[int, int, Optional[int]], None]] = None,
+) -> Tuple[List[str], Iterator[List[str]]]:
+    """Header plus matching rows of ``path`` in source order, filtered in parallel.
+
+    ``on_range(done_bytes, total_bytes, None)`` is called after each range's
+    rows have been yielded.
+    """
+    header, tasks, folder = _prepare(path, selected, advanced)
+
+    def _iter() -> Iterator[List[str]]:
+        kvk_idx = schema.for_header(header).kvk if folder is not None else None
+        seen: Set[str] = set()
+        workdir = Path(tempfile.mkdtemp(prefix="cf-scan-"))
+        futures: List[Future] = []
+        try:
+            futures = _submit(
+                _rows_range, [dict(task, out=str(workdir / f"part{i}.pkl")) for i, task in enumerate(tasks)]
+            )
+            for i, future in enumerate(futures):
+                future.result()
+                part = workdir / f"part{i}.pkl"
+                with part.open("rb") as fh:
+                    while True:
+                        try:
+                            batch = pickle.load(fh)
+                        except EOFError:
+                            break
+                        for row in batch:
+                            if kvk_idx is not None:
+                                kvk = row[kvk_idx].strip() if kvk_idx < len(row) else ""
+                                if kvk:
+                                    if kvk in seen:
+                                        continue
+                                    seen.add(kvk)
+                            yield row
+                part.unlink()
+                if on_range is not None:
+                    on_range(tasks[i]["stop"], tasks[-1]["stop"], None)
+        finally:
+            _release(futures)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    _log(f"scanning {path.name} over {len(tasks)} ranges with {SCAN_WORKERS} workers")
+    return header, _iter()
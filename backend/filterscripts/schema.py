@@ -0,0 +1,175 @@
+"""Column lookup shared by the filters, the analyzer and tracking.
+
+Modules register the header names they accept for each logical field with
+:func:`field`, and the parser of its cells with :func:`converter`;
+:func:`for_header` returns one :class:`Schema` per distinct header that
+resolves those names to column indexes once and memoizes them (and the
+row getters built on them), so per-request setup is a dictionary lookup. :func:`for_source` is called
+whenever the source CSV is opened and reports registered fields that appear
+or disappear between versions of the file.
+"""
+from __future__ import annotations
+
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+# Logical field name -> accepted header names (lower case), in preference order.
+FIELDS: Dict[str, Tuple[str, ...]] = {}
+# Logical field name -> parser of its cells.
+CONVERTERS: Dict[str, Callable[[str], object]] = {}
+# Fields that take the last of repeated header names instead of the first.
+_LAST_WINS: Set[str] = set()
+
+_KVK_CANDIDATES = {"kvk", "kvknummer", "kvknr", "kvknumber"}
+_SCHEMA_CACHE = 16
+
+_SCHEMAS: "OrderedDict[Tuple[str, ...], Schema]" = OrderedDict()
+_LOCK = threading.Lock()
+_LAST: Tuple[Optional[Sequence[str]], Optional["Schema"]] = (None, None)
+_SOURCE: Optional["Schema"] = None
+
+
+def _log(msg: str) -> None:
+    print(f"[SCHEMA] {msg}")
+
+
+def field(name: str, candidates: Sequence[str], last: bool = False) -> Sequence[str]:
+    """Register ``candidates`` as the header names of ``name``; returns them unchanged.
+
+    With ``last``, a header that repeats a name resolves to its last column.
+    """
+    FIELDS[name] = tuple(c.strip().lower() for c in candidates)
+    if last:
+        _LAST_WINS.add(name)
+    else:
+        _LAST_WINS.discard(name)
+    return candidates
+
+
+def converter(name: str, parse: Callable[[str], object]) -> Callable[[str], object]:
+    """Register ``parse`` as the converter of field ``name``'s cells; returns it unchanged."""
+    CONVERTERS[name] = parse
+    return parse
+
+
+def _normalize_column_name(name: str) -> str:
+    if name is None:
+        return ""
+    return re.sub(r"[^a-z0-9]", "", str(name).lstrip("\ufeff").lower())
+
+
+class Schema:
+    """Column indexes of one header. Names match case-insensitively after
+    stripping whitespace; with repeated names the first column wins, or the
+    last one for fields registered with ``last=True``."""
+
+    def __init__(self, header: Sequence[str]):
+        self.header = list(header)
+        self._positions: Dict[str, int] = {}
+        self._last_positions: Dict[str, int] = {}
+        for idx, col in enumerate(self.header):
+            self._positions.setdefault(str(col).strip().lower(), idx)
+            self._last_positions[str(col).strip().lower()] = idx
+        self._found: Dict[Tuple[Tuple[str, ...], bool], Optional[int]] = {}
+        self._getters: Dict[str, Optional[Callable[[Sequence[str]], object]]] = {}
+        self.kvk = self._kvk_index()
+
+    def _kvk_index(self) -> Optional[int]:
+        for idx, col in enumerate(self.header):
+            normalized = _normalize_column_name(col)
+            if normalized in _KVK_CANDIDATES or normalized.startswith("kvk"):
+                return idx
+        return None
+
+    def find(self, candidates: Sequence[str], last: bool = False) -> Optional[int]:
+        """Index of the first of ``candidates`` present in the header, else None.
+
+        ``last`` picks the last column of a repeated name instead of the first.
+        """
+        key = (tuple(candidates), last)
+        try:
+            return self._found[key]
+        except KeyError:
+            pass
+        positions = self._last_positions if last else self._positions
+        idx = None
+        for cand in key[0]:
+            idx = positions.get(cand.strip().lower())
+            if idx is not None:
+                break
+        self._found[key] = idx
+        return idx
+
+    def resolve(self, name: str) -> Optional[int]:
+        """Index of the registered logical field ``name``."""
+        return self.find(FIELDS[name], name in _LAST_WINS)
+
+    def getter(self, name: str) -> Optional[Callable[[Sequence[str]], object]]:
+        """``row -> value`` of field ``name`` parsed by its converter (None for
+        a missing cell or an unparsable value); None when the header lacks it."""
+        try:
+            return self._getters[name]
+        except KeyError:
+            pass
+        idx = self.resolve(name)
+        if idx is None:
+            get = None
+        else:
+            parse = CONVERTERS[name]
+
+            def get(row: Sequence[str], _idx: int = idx, _parse=parse) -> object:
+                return _parse(row[_idx]) if _idx < len(row) else None
+
+        self._getters[name] = get
+        return get
+
+    def resolved(self) -> Dict[str, Optional[int]]:
+        fields = {name: self.resolve(name) for name in sorted(FIELDS)}
+        fields["kvk"] = self.kvk
+        return fields
+
+
+def for_header(header: Sequence[str]) -> Schema:
+    """The (cached) schema of ``header``."""
+    global _LAST
+    last_header, last = _LAST
+    if header is last_header and last is not None:
+        return last
+    key = tuple(header)
+    with _LOCK:
+        schema = _SCHEMAS.get(key)
+        if schema is None:
+            schema = Schema(key)
+            _SCHEMAS[key] = schema
+            while len(_SCHEMAS) > _SCHEMA_CACHE:
+                _SCHEMAS.popitem(last=False)
+        else:
+            _SCHEMAS.move_to_end(key)
+    _LAST = (header, schema)
+    return schema
+
+
+def for_source(header: Sequence[str]) -> Schema:
+    """for_header() for the source CSV; logs fields that changed since the last source header."""
+    global _SOURCE
+    schema = for_header(header)
+    previous, _SOURCE = _SOURCE, schema
+    if previous is not None and previous is not schema:
+        before, after = previous.resolved(), schema.resolved()
+        lost = [name for name, idx in after.items() if idx is None and before.get(name) is not None]
+        gained = [name for name, idx in after.items() if idx is not None and before.get(name) is None]
+        moved = [
+            name for name, idx in after.items()
+            if idx is not None and before.get(name) is not None and before[name] != idx
+        ]
+        if lost or gained:
+            _log(f"source header changed: lost {lost or 'none'}, gained {gained or 'none'}")
+        elif moved:
+            _log(f"source header changed: {len(moved)} field(s) moved")
+    elif previous is None:
+        missing: List[str] = [name for name, idx in schema.resolved().items() if idx is None]
+        if missing:
+            _log(f"fields not in source header: {', '.join(missing)}")
+    return schema
@@ -0,0 +1,1501 @@
+"""Columnar on-disk snapshot of the master CSV.
+
+Ingest converts ``CSV_PATH`` once into one memory-mapped array per column so
+filter scans no longer tokenize every field of every row:
+
+- low-cardinality columns (``rechtsvorm``, ``economischactief``, ...) are
+  dictionary encoded: an int32 code per row plus the list of distinct values;
+- every other column is stored as a UTF-8 heap plus int64 cell offsets;
+- numeric and date fields registered with :func:`typed_field` are also
+  stored parsed (int32/int64/float64 values plus a validity mask), so range
+  filters and analysis sums compare arrays instead of re-parsing text;
+- fields registered with :func:`range_field` also get a range index (a
+  per-zone min/max map plus a sorted permutation), so range selections skip
+  zones that cannot match or binary-search to the matching rows.
+
+Snapshots live under ``SNAPSHOT_DIR/<version>`` where the version is derived
+from the source file's path, size and mtime, so a changed CSV is picked up
+and rebuilt automatically on the next access (as a delta segment on top of
+the served version when few rows changed, see delta.py).
+"""
+from __future__ import annotations
+
+import csv
+import gc
+import hashlib
+import inspect
+import io
+import json
+import math
+import mmap
+import os
+import shutil
+import threading
+import time
+import weakref
+from array import array
+from functools import lru_cache
+from itertools import zip_longest
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from . import bitmap, schema, source
+from .bitmap import RowBitmap, TokenIndex
+from ..config import (
+    CATALOG_MAX_VALUES,
+    CSV_DELIMITER,
+    CSV_ENCODING,
+    DELTA_ENABLED,
+    SNAPSHOT_BITMAP_MAX,
+    SNAPSHOT_DICT_MAX,
+    SNAPSHOT_DIR,
+    SNAPSHOT_ENABLED,
+)
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+CATALOG_NAME = "catalog.json"
+
+# Rows are ingested and decoded in blocks of this many rows.
+BLOCK_ROWS = 65536
+# Rows per zone of a range index's min/max zone map.
+ZONE_ROWS = 4096
+# Range lookups read the sorted permutation while it yields at most
+# 1/RANGE_SORTED_SHARE of the rows a zone-map scan would have to compare.
+RANGE_SORTED_SHARE = 4
+# ... returning a RowBitmap when that is at most 1/RANGE_SCATTER_SHARE of all
+# rows; more matches are scattered into a boolean mask instead of sorted.
+RANGE_SCATTER_SHARE = 64
+
+_LOCK = threading.Lock()  # held while a version is built and activated
+_ACTIVE: Dict[str, "Snapshot"] = {}
+_REFRESH_LOCK = threading.Lock()
+_REFRESHING: Optional[threading.Thread] = None
+
+
+def _after_fork() -> None:
+    # A build or refresh running in the parent does not exist in a forked
+    # child, so locks it held there would never be released.
+    global _LOCK, _REFRESH_LOCK, _REFRESHING, _OPEN_LOCK
+    _LOCK = threading.Lock()
+    _REFRESH_LOCK = threading.Lock()
+    _REFRESHING = None
+    _OPEN_LOCK = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+# Called with each version built by refresh() before it becomes active.
+PREPARE_HOOKS: List[Callable[["Snapshot"], None]] = []
+
+# (schema field, parser) pairs parsed into typed arrays at ingest.
+TYPED_FIELDS: List[Tuple[str, Callable[[str], object]]] = []
+# Typed fields that also get a range index (see Snapshot.range_index).
+RANGE_FIELDS: List[Tuple[str, Callable[[str], object]]] = []
+
+
+def _log(msg: str) -> None:
+    print(f"[SNAPSHOT] {msg}")
+
+
+def source_signature(path: Path) -> Tuple[str, int, int]:
+    stat = path.stat()
+    return (
+        str(path.resolve()),
+        int(stat.st_size),
+        int(getattr(stat, "st_mtime_ns", int(stat.st_mtime * 1_000_000_000))),
+    )
+
+
+def version_for(signature: Tuple[str, int, int]) -> str:
+    raw = json.dumps([FORMAT_VERSION, *signature]).encode("utf-8")
+    return hashlib.sha1(raw).hexdigest()[:16]
+
+
+# Bytes that can appear in a cell that an ``_has_value`` style check treats as
+# empty: whitespace, brackets/commas, the letters of "set()", "null", "None",
+# comment/continuation characters and anything non-ASCII (unicode whitespace).
+# A cell containing any *other* byte and no ``#`` is always present.
+_SOLID_BYTE = np.ones(256, dtype=bool)
+for _b in b" \t\n\r\x0b\x0c\x1c\x1d\x1e\x1f[]{}(),#\\setnulNo":
+    _SOLID_BYTE[_b] = False
+_SOLID_BYTE[0x80:] = False
+
+
+def typed_field(name: str, parse: Callable[[str], object]) -> Callable[[str], object]:
+    """Have ingest store schema field ``name`` parsed by ``parse`` (see Snapshot.typed).
+
+    ``parse`` also becomes the field's schema converter.
+    """
+    schema.converter(name, parse)
+    if (name, parse) not in TYPED_FIELDS:
+        TYPED_FIELDS.append((name, parse))
+    return parse
+
+
+def range_field(name: str, parse: Callable[[str], object]) -> Callable[[str], object]:
+    """typed_field() whose range index is also built at ingest."""
+    typed_field(name, parse)
+    if (name, parse) not in RANGE_FIELDS:
+        RANGE_FIELDS.append((name, parse))
+    return parse
+
+
+def _typed_values(parsed: List[object]) -> Tuple[np.ndarray, np.ndarray]:
+    """``(values, valid)`` for parsed cells (None = invalid).
+
+    Integers become int64 (float64 if one does not fit), anything else float64.
+    """
+    n = len(parsed)
+    valid = np.fromiter((p is not None for p in parsed), dtype=bool, count=n)
+    fill = (p if p is not None else 0 for p in parsed)
+    if all(type(p) is int for p in parsed if p is not None):
+        try:
+            return np.fromiter(fill, dtype=np.int64, count=n), valid
+        except OverflowError:
+            fill = (p if p is not None else 0 for p in parsed)
+    return np.fromiter(fill, dtype=np.float64, count=n), valid
+
+
+def _narrow(values: np.ndarray) -> np.ndarray:
+    """int32 when every value fits, else ``values`` unchanged."""
+    if values.dtype == np.int64 and values.shape[0]:
+        info = np.iinfo(np.int32)
+        if info.min <= int(values.min()) and int(values.max()) <= info.max:
+            return values.astype(np.int32)
+    return values
+
+
+def _zone_map(values: np.ndarray, valid: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per zone of ZONE_ROWS rows: min and max valid value, and whether every row is valid.
+
+    Zones without a valid row get an empty interval (min > max).
+    """
+    n = int(values.shape[0])
+    zones = (n + ZONE_ROWS - 1) // ZONE_ROWS
+    if np.issubdtype(values.dtype, np.integer):
+        info = np.iinfo(values.dtype)
+        high, low = info.max, info.min
+    else:
+        high, low = np.inf, -np.inf
+    pad = zones * ZONE_ROWS - n
+    vals = np.concatenate((values, np.zeros(pad, dtype=values.dtype))).reshape(zones, ZONE_ROWS)
+    ok = np.concatenate((valid, np.zeros(pad, dtype=bool))).reshape(zones, ZONE_ROWS)
+    zmin = np.where(ok, vals, high).min(axis=1).astype(values.dtype)
+    zmax = np.where(ok, vals, low).max(axis=1).astype(values.dtype)
+    return zmin, zmax, ok.all(axis=1)
+
+
+def _sorted_permutation(values: np.ndarray, valid: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Ids of the valid rows ordered by value, and those values."""
+    ids = np.flatnonzero(valid)
+    keys = np.asarray(values)[ids]
+    order = np.argsort(keys, kind="stable")
+    return ids[order], keys[order]
+
+
+def _runs(flags: np.ndarray) -> np.ndarray:
+    """``(start, stop)`` pairs of the runs of True in ``flags``."""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], flags.astype(np.int8), [0]))))
+    return edges.reshape(-1, 2)
+
+
+def row_hashes(rows: Iterable[Sequence[str]]) -> np.ndarray:
+    """64-bit hash of every row's cells (in order), as stored in ``rowhash.bin``."""
+    return np.fromiter(
+        (
+            int.from_bytes(hashlib.blake2b("\x1f".join(row).encode("utf-8"), digest_size=8).digest(), "little")
+            for row in rows
+        ),
+        dtype=np.uint64,
+    )
+
+
+def _memmap(path: Path, dtype: str, length: int) -> np.ndarray:
+    if length == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(length,))
+
+
+# Columns -------------------------------------------------------------------
+
+
+class DictColumn:
+    """Dictionary-encoded column: ``values[codes[row]]``."""
+
+    kind = "dict"
+
+    def __init__(self, codes: np.ndarray, values: List[str]):
+        self.codes = codes
+        self.values = values
+
+    def __len__(self) -> int:
+        return int(self.codes.shape[0])
+
+    def chunk(self, start: int, stop: int) -> List[str]:
+        values = self.values
+        return [values[c] for c in self.codes[start:stop].tolist()]
+
+    def take(self, row_ids: np.ndarray) -> List[str]:
+        values = self.values
+        return [values[c] for c in self.codes[row_ids].tolist()]
+
+    def lookup(self, fn: Callable[[str], object], dtype=bool) -> np.ndarray:
+        """Evaluate ``fn`` once per distinct value and broadcast it to all rows."""
+        lut = np.fromiter((fn(v) for v in self.values), dtype=dtype, count=len(self.values))
+        return lut[self.codes]
+
+    def convert(self, fn: Callable[[str], Optional[float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(values, valid)`` arrays; ``fn`` returns None for invalid cells."""
+        vals, valid = _typed_values([fn(v) for v in self.values])
+        return _narrow(vals[self.codes]), valid[self.codes]
+
+    def present(self, fn: Callable[[str], bool]) -> np.ndarray:
+        return self.lookup(fn)
+
+
+class StringColumn:
+    """Plain column: UTF-8 heap plus ``offsets[row]:offsets[row + 1]`` slices."""
+
+    kind = "str"
+
+    def __init__(self, offsets: np.ndarray, heap: np.ndarray):
+        self.offsets = offsets
+        self.heap = heap
+
+    def __len__(self) -> int:
+        return max(int(self.offsets.shape[0]) - 1, 0)
+
+    def chunk(self, start: int, stop: int) -> List[str]:
+        if stop <= start:
+            return []
+        offs = self.offsets[start:stop + 1]
+        base = int(offs[0])
+        buf = self.heap[base:int(offs[-1])].tobytes()
+        bounds = (offs - base).tolist()
+        return [buf[bounds[i]:bounds[i + 1]].decode("utf-8") for i in range(len(bounds) - 1)]
+
+    def take(self, row_ids: np.ndarray) -> List[str]:
+        starts = self.offsets[row_ids].tolist()
+        ends = self.offsets[row_ids + 1].tolist()
+        heap = self.heap
+        return [heap[s:e].tobytes().decode("utf-8") for s, e in zip(starts, ends)]
+
+    def lookup(self, fn: Callable[[str], object], dtype=bool) -> np.ndarray:
+        """Evaluate ``fn`` per cell (block by block)."""
+        n = len(self)
+        out = np.empty(n, dtype=dtype)
+        for start in range(0, n, BLOCK_ROWS):
+            stop = min(start + BLOCK_ROWS, n)
+            out[start:stop] = np.fromiter(
+                (fn(c) for c in self.chunk(start, stop)), dtype=dtype, count=stop - start
+            )
+        return out
+
+    def convert(self, fn: Callable[[str], Optional[float]]) -> Tuple[np.ndarray, np.ndarray]:
+        """Return ``(values, valid)`` arrays; ``fn`` returns None for invalid cells."""
+        n = len(self)
+        parts = [
+            _typed_values([fn(c) for c in self.chunk(start, min(start + BLOCK_ROWS, n))])
+            for start in range(0, n, BLOCK_ROWS)
+        ]
+        if not parts:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=bool)
+        # A float block makes the whole column float64.
+        dtype = np.result_type(*(vals.dtype for vals, _valid in parts))
+        vals = np.concatenate([vals.astype(dtype, copy=False) for vals, _valid in parts])
+        return _narrow(vals), np.concatenate([valid for _vals, valid in parts])
+
+    def present(self, fn: Callable[[str], bool]) -> np.ndarray:
+        """Presence mask for ``_has_value`` style predicates.
+
+        Cells holding any byte outside the possibly-empty set (and no ``#``)
+        are present without decoding; ``fn`` only runs on the remainder.
+        """
+        n = len(self)
+        out = np.ones(n, dtype=bool)
+        for start in range(0, n, BLOCK_ROWS):
+            stop = min(start + BLOCK_ROWS, n)
+            offs = np.asarray(self.offsets[start:stop + 1])
+            base = int(offs[0])
+            seg = np.asarray(self.heap[base:int(offs[-1])])
+            rel = offs - base
+            solid = np.zeros(seg.shape[0] + 1, dtype=np.int64)
+            np.cumsum(_SOLID_BYTE[seg], out=solid[1:])
+            hashes = np.zeros(seg.shape[0] + 1, dtype=np.int64)
+            np.cumsum(seg == 0x23, out=hashes[1:])
+            maybe = ((solid[rel[1:]] - solid[rel[:-1]]) == 0) | ((hashes[rel[1:]] - hashes[rel[:-1]]) > 0)
+            ids = np.flatnonzero(maybe)
+            if ids.shape[0]:
+                cells = self.take(ids + start)
+                out[ids + start] = np.fromiter((fn(c) for c in cells), dtype=bool, count=len(cells))
+        return out
+
+
+# Rows ----------------------------------------------------------------------
+
+
+class _RowBlock:
+    """A run of rows whose columns are decoded lazily, one column at a time."""
+
+    __slots__ = ("_snapshot", "_start", "_stop", "_ids", "_cells", "widths")
+
+    def __init__(self, snapshot: "Snapshot", start: int, stop: int, ids: Optional[np.ndarray] = None):
+        self._snapshot = snapshot
+        self._start = start
+        self._stop = stop
+        self._ids = ids
+        self._cells: Dict[int, List[str]] = {}
+        if ids is None:
+            self.widths = snapshot.widths[start:stop].tolist()
+        else:
+            self.widths = snapshot.widths[ids].tolist()
+
+    def cells(self, col: int) -> List[str]:
+        cached = self._cells.get(col)
+        if cached is None:
+            column = self._snapshot.column(col)
+            if self._ids is None:
+                cached = column.chunk(self._start, self._stop)
+            else:
+                cached = column.take(self._ids)
+            self._cells[col] = cached
+        return cached
+
+
+class SnapshotRow:
+    """Read-only row that behaves like the ``List[str]`` from ``csv.reader``.
+
+    Cells are only decoded for columns that are actually indexed, so a filter
+    touching two columns never pays for the other forty.
+    """
+
+    __slots__ = ("_block", "_pos", "row_id")
+
+    def __init__(self, block: _RowBlock, pos: int, row_id: int):
+        self._block = block
+        self._pos = pos
+        self.row_id = row_id
+
+    @property
+    def snapshot(self) -> "Snapshot":
+        return self._block._snapshot
+
+    def __len__(self) -> int:
+        return self._block.widths[self._pos]
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        width = self._block.widths[self._pos]
+        if idx < 0:
+            idx += width
+        if idx < 0 or idx >= width:
+            raise IndexError("list index out of range")
+        return self._block.cells(idx)[self._pos]
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return f"SnapshotRow({self.row_id}, {list(self)!r})"
+
+
+# Snapshot ------------------------------------------------------------------
+
+
+class Snapshot:
+    """Memory-mapped view of one snapshot version."""
+
+    # Removed rows; only segmented versions have any (see delta.py).
+    tombstones: Optional[RowBitmap] = None
+
+    def __init__(self, path: Path):
+        self.path = path
+        manifest = json.loads((path / MANIFEST_NAME).read_text(encoding="utf-8"))
+        self.manifest = manifest
+        self.version: str = manifest["version"]
+        self.signature: Tuple[str, int, int] = tuple(manifest["signature"])  # type: ignore[assignment]
+        self.header: List[str] = list(manifest["header"])
+        self.row_count: int = int(manifest["rows"])
+        track(self)
+        self.widths = _memmap(path / "widths.bin", "int32", self.row_count)
+        self._columns: Dict[int, object] = {}
+        self._specs = {int(spec["index"]): spec for spec in manifest["columns"]}
+        self._row_index: Optional[RowIndex] = None
+        self._row_index_lock = threading.Lock()
+        self._bitmaps: Dict[object, object] = {}
+        self._bitmaps_lock = threading.RLock()
+
+    @property
+    def column_count(self) -> int:
+        return len(self._specs)
+
+    def column(self, idx: int):
+        col = self._columns.get(idx)
+        if col is not None:
+            return col
+        spec = self._specs[idx]
+        if spec["kind"] == "dict":
+            values = json.loads((self.path / spec["values"]).read_text(encoding="utf-8"))
+            col = DictColumn(_memmap(self.path / spec["codes"], "int32", self.row_count), values)
+        else:
+            offsets = _memmap(self.path / spec["offsets"], "int64", self.row_count + 1)
+            heap_len = int(offsets[-1]) if self.row_count else 0
+            col = StringColumn(offsets, _memmap(self.path / spec["heap"], "uint8", heap_len))
+        self._columns[idx] = col
+        return col
+
+    def rows(self) -> "RowStream":
+        return RowStream(self)
+
+    @property
+    def live_count(self) -> int:
+        """Rows not removed by a tombstone."""
+        return self.row_count
+
+    def live_ids(self) -> np.ndarray:
+        return np.arange(self.row_count, dtype=np.int64)
+
+    def only_live(self, selection):
+        """``selection`` (boolean mask or RowBitmap) without tombstoned rows."""
+        return selection
+
+    def row_hashes(self) -> np.ndarray:
+        """row_hashes() of every row; computed from the columns for snapshots
+        ingested before the hashes were stored."""
+        path = self.path / "rowhash.bin"
+        if not path.exists():
+            with self._bitmaps_lock:
+                if not path.exists():
+                    tmp = path.with_name(path.name + ".tmp")
+                    with tmp.open("wb") as fh:
+                        for start in range(0, self.row_count, BLOCK_ROWS):
+                            ids = np.arange(start, min(start + BLOCK_ROWS, self.row_count))
+                            row_hashes(self.iter_rows(ids)).tofile(fh)
+                    tmp.replace(path)
+        return _memmap(path, "uint64", self.row_count)
+
+    def catalog(self) -> Dict[int, Dict[str, int]]:
+        """Row count per distinct value of every dictionary column with at
+        most CATALOG_MAX_VALUES values, in first-seen order (counted at ingest)."""
+        cached = self._bitmaps.get(("catalog",))
+        if cached is not None:
+            return cached  # type: ignore[return-value]
+        with self._bitmaps_lock:
+            path = self.path / CATALOG_NAME
+            if not path.exists():
+                # Snapshots ingested before the catalog existed: count the codes.
+                columns = {}
+                for idx, spec in self._specs.items():
+                    if spec["kind"] == "dict" and spec["distinct"] <= CATALOG_MAX_VALUES:
+                        col = self.column(idx)
+                        counts = np.bincount(col.codes, minlength=len(col.values))
+                        columns[idx] = dict(zip(col.values, counts.tolist()))
+                _write_catalog(self.path, columns)
+            cached = {int(idx): values for idx, values in json.loads(path.read_text(encoding="utf-8")).items()}
+            self._bitmaps[("catalog",)] = cached
+        return cached
+
+    # Bitmap indexes --------------------------------------------------------
+
+    def value_bitmaps(self, idx: int) -> Optional[List[RowBitmap]]:
+        """Row bitmap per dictionary value of column ``idx``.
+
+        None for string columns and dictionaries above SNAPSHOT_BITMAP_MAX
+        values, where the per-value lookup table is the better index.
+        """
+        spec = self._specs[idx]
+        if spec["kind"] != "dict" or spec["distinct"] > SNAPSHOT_BITMAP_MAX:
+            return None
+        key = ("values", idx)
+        cached = self._bitmaps.get(key)
+        if cached is None:
+            with self._bitmaps_lock:
+                cached = self._bitmaps.get(key)
+                if cached is None:
+                    path = self.path / "bitmaps" / f"values-{idx}.npz"
+                    if not path.exists():
+                        column = self.column(idx)
+                        _write_value_bitmaps(self.path, idx, column.codes, len(column.values))
+                    cached = bitmap.load(path)
+                    self._bitmaps[key] = cached
+        return cached  # type: ignore[return-value]
+
+    def where(self, idx: int, fn: Callable[[str], bool]):
+        """Rows of column ``idx`` whose value satisfies ``fn``.
+
+        Dictionary columns are answered from the value bitmaps (a RowBitmap);
+        string columns fall back to a per-cell boolean mask.
+        """
+        bitmaps = self.value_bitmaps(idx)
+        if bitmaps is None:
+            return self.column(idx).lookup(fn)
+        values = self.column(idx).values
+        return bitmap.union_all((bm for v, bm in zip(values, bitmaps) if fn(v)), self.row_count)
+
+    def presence(self, idx: int, fn: Callable[[str], bool]) -> RowBitmap:
+        """Bitmap of rows where ``fn`` (a ``_has_value`` style check) holds.
+
+        Computed once per snapshot version and predicate, then kept on disk.
+        """
+        if self.value_bitmaps(idx) is not None:
+            return self.where(idx, fn)
+        digest = _function_digest(fn)
+        key = ("present", idx, digest)
+        cached = self._bitmaps.get(key)
+        if cached is None:
+            with self._bitmaps_lock:
+                cached = self._bitmaps.get(key)
+                if cached is None:
+                    path = self.path / "bitmaps" / f"present-{idx}-{digest}.npz"
+                    if path.exists():
+                        cached = bitmap.load(path)[0]
+                    else:
+                        cached = RowBitmap.from_mask(self.column(idx).present(fn))
+                        path.parent.mkdir(exist_ok=True)
+                        bitmap.save(path, [cached], self.row_count)
+                    self._bitmaps[key] = cached
+        return cached  # type: ignore[return-value]
+
+    def row_index(self) -> Optional["RowIndex"]:
+        """Byte offsets of every data row; built once per snapshot version."""
+        if self._row_index is not None:
+            return self._row_index if self._row_index.valid else None
+        with self._row_index_lock:
+            if self._row_index is None:
+                self._row_index = _load_or_build_row_index(self)
+        return self._row_index if self._row_index.valid else None
+
+    def raw_rows(self) -> Optional["RawRows"]:
+        """Open the source for byte-range copies, or None if it changed since ingest."""
+        index = self.row_index()
+        if index is None:
+            return None
+        csv_path = Path(self.signature[0])
+        try:
+            handle = csv_path.open("rb")
+        except OSError:
+            return None
+        stat = os.fstat(handle.fileno())
+        mtime = int(getattr(stat, "st_mtime_ns", int(stat.st_mtime * 1_000_000_000)))
+        if (int(stat.st_size), mtime) != tuple(self.signature[1:]) or stat.st_size == 0:
+            handle.close()
+            return None
+        return RawRows(index, handle)
+
+    def token_index(self, idx: int, tokenize: Callable[[str], Iterable[str]]) -> TokenIndex:
+        """Inverted index of a multi-valued column split into tokens by ``tokenize``.
+
+        Built once per snapshot version and tokenizer, then kept on disk.
+        """
+        digest = _function_digest(tokenize)
+        key = ("tokens", idx, digest)
+        cached = self._bitmaps.get(key)
+        if cached is None:
+            with self._bitmaps_lock:
+                cached = self._bitmaps.get(key)
+                if cached is None:
+                    path = self.path / "bitmaps" / f"tokens-{idx}-{digest}.npz"
+                    names = path.with_suffix(".json")
+                    if path.exists() and names.exists():
+                        tokens = json.loads(names.read_text(encoding="utf-8"))
+                        cached = TokenIndex(tokens, bitmap.load(path), self.row_count)
+                    else:
+                        cached = _build_token_index(self.column(idx), tokenize, self.row_count)
+                        path.parent.mkdir(exist_ok=True)
+                        bitmap.save(path, cached.bitmaps, self.row_count)
+                        names.write_text(json.dumps(cached.tokens, ensure_ascii=False), encoding="utf-8")
+                        _log(f"indexed column {idx}: {len(cached.tokens)} distinct tokens")
+                    self._bitmaps[key] = cached
+        return cached  # type: ignore[return-value]
+
+    def typed(self, idx: int, parse: Callable[[str], object]) -> Tuple[np.ndarray, np.ndarray]:
+        """``(values, valid)`` of column ``idx`` parsed by ``parse`` (None = invalid).
+
+        Fields registered with typed_field() are parsed at ingest; others
+        on first use. Either way the arrays are kept on disk per version.
+        """
+        digest = _function_digest(parse)
+        key = ("typed", idx, digest)
+        cached = self._bitmaps.get(key)
+        if cached is None:
+            with self._bitmaps_lock:
+                cached = self._bitmaps.get(key)
+                if cached is None:
+                    values_path = self.path / "typed" / f"c{idx}-{digest}.values.npy"
+                    valid_path = values_path.with_name(f"c{idx}-{digest}.valid.npy")
+                    if not (values_path.exists() and valid_path.exists()):
+                        values, valid = self.column(idx).convert(parse)
+                        values_path.parent.mkdir(exist_ok=True)
+                        for path, arr in ((values_path, values), (valid_path, valid)):
+                            tmp = path.with_name(path.name + ".tmp")
+                            with tmp.open("wb") as fh:
+                                np.save(fh, arr)
+                            tmp.replace(path)
+                    cached = (np.load(values_path, mmap_mode="r"), np.load(valid_path, mmap_mode="r"))
+                    self._bitmaps[key] = cached
+        return cached  # type: ignore[return-value]
+
+    def range_index(self, idx: int, parse: Callable[[str], object]) -> "RangeIndex":
+        """Zone map and sorted permutation of typed(idx, parse), kept on disk per version."""
+        digest = _function_digest(parse)
+        key = ("range", idx, digest)
+        cached = self._bitmaps.get(key)
+        if cached is None:
+            with self._bitmaps_lock:
+                cached = self._bitmaps.get(key)
+                if cached is None:
+                    values, valid = self.typed(idx, parse)
+                    base = self.path / "typed" / f"c{idx}-{digest}"
+                    paths = {
+                        part: base.with_name(f"{base.name}.{part}.npy")
+                        for part in ("zmin", "zmax", "zfull", "order", "sorted")
+                    }
+                    if not all(path.exists() for path in paths.values()):
+                        built = dict(zip(("zmin", "zmax", "zfull"), _zone_map(values, valid)))
+                        built["order"], built["sorted"] = _sorted_permutation(values, valid)
+                        for part, path in paths.items():
+                            tmp = path.with_name(path.name + ".tmp")
+                            with tmp.open("wb") as fh:
+                                np.save(fh, built[part])
+                            tmp.replace(path)
+                    loaded = {part: np.load(path, mmap_mode="r") for part, path in paths.items()}
+                    cached = RangeIndex(values, valid, **loaded)
+                    self._bitmaps[key] = cached
+        return cached  # type: ignore[return-value]
+
+    def value_range(self, idx: int, parse: Callable[[str], object], lo=None, hi=None):
+        """Rows whose typed value is valid and within ``[lo, hi]`` (None = unbounded)."""
+        return self.range_index(idx, parse).select(lo, hi)
+
+    def derived(self, name: str, build: Callable[[], object]):
+        """Per-version value computed once by ``build`` and kept on disk.
+
+        ``build`` returns a NumPy array (stored as ``derived/<name>.npy`` and
+        memory-mapped on later loads) or a RowBitmap (``bitmaps/<name>.npz``).
+        ``name`` must identify everything the result depends on besides the
+        source rows, e.g. a hash of the geometry it was evaluated against.
+        """
+        key = ("derived", name)
+        cached = self._bitmaps.get(key)
+        if cached is not None:
+            return cached
+        with self._bitmaps_lock:
+            cached = self._bitmaps.get(key)
+            if cached is not None:
+                return cached
+            array_path = self.path / "derived" / f"{name}.npy"
+            bitmap_path = self.path / "bitmaps" / f"{name}.npz"
+            if array_path.exists():
+                cached = np.load(array_path, mmap_mode="r")
+            elif bitmap_path.exists():
+                cached = bitmap.load(bitmap_path)[0]
+            else:
+                cached = build()
+                if isinstance(cached, RowBitmap):
+                    bitmap_path.parent.mkdir(exist_ok=True)
+                    bitmap.save(bitmap_path, [cached], self.row_count)
+                else:
+                    array_path.parent.mkdir(exist_ok=True)
+                    tmp = array_path.with_name(array_path.name + ".tmp")
+                    with tmp.open("wb") as fh:
+                        np.save(fh, cached)
+                    tmp.replace(array_path)
+            self._bitmaps[key] = cached
+        return cached
+
+    def rowwise(self, name: str, build: Callable[["Snapshot"], object]):
+        """derived() for values computed row by row: ``build(snapshot)`` returns one
+        entry per row (a RowBitmap or an array whose last axis is the rows).
+
+        A segmented version evaluates ``build`` per segment, so the base
+        segment's result is reused by every delta on top of it.
+        """
+        return self.derived(name, lambda: build(self))
+
+    def iter_rows(self, row_ids: Optional[Sequence[int]] = None) -> Iterator[SnapshotRow]:
+        """Yield rows in source order (all rows, or only ``row_ids``)."""
+        if row_ids is None:
+            for start in range(0, self.row_count, BLOCK_ROWS):
+                stop = min(start + BLOCK_ROWS, self.row_count)
+                block = _RowBlock(self, start, stop)
+                for pos in range(stop - start):
+                    yield SnapshotRow(block, pos, start + pos)
+            return
+        ids = np.asarray(row_ids, dtype=np.int64)
+        for start in range(0, ids.shape[0], BLOCK_ROWS):
+            part = ids[start:start + BLOCK_ROWS]
+            block = _RowBlock(self, 0, 0, part)
+            for pos, row_id in enumerate(part.tolist()):
+                yield SnapshotRow(block, pos, row_id)
+
+
+class RowStream:
+    """Iterable over snapshot rows that remembers which row ids it covers.
+
+    ``combinator._apply_filters`` narrows a stream with boolean masks before
+    any row is materialized; counting a stream never decodes a cell.
+    """
+
+    def __init__(self, snapshot: Snapshot, row_ids: Optional[np.ndarray] = None):
+        self.snapshot = snapshot
+        self.row_ids = row_ids
+
+    def __iter__(self) -> Iterator[SnapshotRow]:
+        return self.snapshot.iter_rows(self.row_ids)
+
+    def __len__(self) -> int:
+        if self.row_ids is None:
+            return self.snapshot.live_count
+        return int(self.row_ids.shape[0])
+
+    def ids(self) -> np.ndarray:
+        """The covered row ids (every live row when the stream is not narrowed)."""
+        return self.snapshot.live_ids() if self.row_ids is None else self.row_ids
+
+    def select(self, mask) -> "RowStream":
+        """Keep only rows where ``mask`` (over all snapshot rows) is True.
+
+        ``mask`` is a boolean array or a RowBitmap.
+        """
+        if self.row_ids is None:
+            mask = self.snapshot.only_live(mask)
+        if isinstance(mask, RowBitmap):
+            ids = mask.to_ids()
+            if self.row_ids is None:
+                return RowStream(self.snapshot, ids)
+            return RowStream(self.snapshot, np.intersect1d(self.row_ids, ids, assume_unique=True))
+        if self.row_ids is None:
+            return RowStream(self.snapshot, np.flatnonzero(mask))
+        return RowStream(self.snapshot, self.row_ids[mask[self.row_ids]])
+
+
+# Row offsets ---------------------------------------------------------------
+
+
+class RangeIndex:
+    """Range lookups over one typed column.
+
+    ``zmin``/``zmax`` bound the valid values of every zone of ZONE_ROWS rows
+    and ``zfull`` marks zones without invalid cells; ``order`` lists the
+    valid rows sorted by value and ``sorted`` holds their values.
+    """
+
+    def __init__(self, values: np.ndarray, valid: np.ndarray, zmin: np.ndarray, zmax: np.ndarray,
+                 zfull: np.ndarray, order: np.ndarray, sorted: np.ndarray):
+        # Plain ndarray views: memmap subclass overhead dominates small lookups.
+        self.values = np.asarray(values)
+        self.valid = np.asarray(valid)
+        self.zmin = np.asarray(zmin)
+        self.zmax = np.asarray(zmax)
+        self.zfull = np.asarray(zfull)
+        self.order = np.asarray(order)
+        self.sorted = np.asarray(sorted)
+
+    def select(self, lo=None, hi=None):
+        """Rows with a valid value in ``[lo, hi]`` (None = unbounded).
+
+        Two binary searches on the sorted values give the number of matches.
+        Few matches are read from the sorted permutation (a RowBitmap when
+        very few, else scattered into a mask); otherwise only zones whose
+        min/max overlaps the range are compared and zones entirely inside it
+        are accepted whole.
+        """
+        n = int(self.values.shape[0])
+        keys = self.sorted
+        if (
+            not keys.shape[0]
+            or (lo is not None and lo > keys[-1])
+            or (hi is not None and hi < keys[0])
+            or (lo is not None and hi is not None and lo > hi)
+        ):
+            return RowBitmap(n)
+        if np.issubdtype(keys.dtype, np.integer):
+            # Exact integer bounds in the column's dtype (searching with a
+            # Python int would upcast the whole array on every call).
+            lo = None if lo is None or lo <= keys[0] else keys.dtype.type(math.ceil(lo))
+            hi = None if hi is None or hi >= keys[-1] else keys.dtype.type(math.floor(hi))
+        start = 0 if lo is None else int(np.searchsorted(keys, lo, side="left"))
+        stop = keys.shape[0] if hi is None else int(np.searchsorted(keys, hi, side="right"))
+
+        touch = np.ones(self.zmin.shape[0], dtype=bool)
+        inside = np.asarray(self.zfull).copy()
+        if lo is not None:
+            touch &= self.zmax >= lo
+            inside &= self.zmin >= lo
+        if hi is not None:
+            touch &= self.zmin <= hi
+            inside &= self.zmax <= hi
+        inside &= touch
+        partial = touch & ~inside
+        matches = stop - start
+        if matches * RANGE_SORTED_SHARE <= int(partial.sum()) * ZONE_ROWS:
+            ids = self.order[start:stop]
+            if matches * RANGE_SCATTER_SHARE <= n:
+                return RowBitmap.from_ids(np.sort(ids), n)
+            out = np.zeros(n, dtype=bool)
+            out[ids] = True
+            return out
+
+        out = np.zeros(n, dtype=bool)
+        for a, b in _runs(inside):
+            out[a * ZONE_ROWS:b * ZONE_ROWS] = True
+        for a, b in _runs(partial):
+            s, e = a * ZONE_ROWS, min(b * ZONE_ROWS, n)
+            seg = out[s:e]
+            np.copyto(seg, self.valid[s:e])
+            vals = self.values[s:e]
+            if lo is not None:
+                seg &= vals >= lo
+            if hi is not None:
+                seg &= vals <= hi
+        return out
+
+
+class RowIndex:
+    """Start offset and content length (terminator excluded) per data row."""
+
+    def __init__(self, starts: np.ndarray, lengths: np.ndarray, header_length: int, size: int, valid: bool = True):
+        self.starts = starts
+        self.lengths = lengths
+        self.header_length = header_length
+        self.size = size
+        self.valid = valid
+
+    def terminator_lengths(self) -> np.ndarray:
+        ends = self.starts + self.lengths
+        nxt = np.empty_like(self.starts)
+        nxt[:-1] = self.starts[1:]
+        if nxt.shape[0]:
+            nxt[-1] = self.size
+        return nxt - ends
+
+
+class RawRows:
+    """Copy rows straight from the memory-mapped source instead of re-serializing.
+
+    Rows are emitted with CRLF terminators; runs of adjacent rows whose source
+    terminator already is CRLF are copied as a single slice.
+    """
+
+    def __init__(self, index: RowIndex, handle):
+        self.index = index
+        self._handle = handle
+        self._mm = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self._crlf = index.terminator_lengths() == 2
+
+    def close(self) -> None:
+        self._mm.close()
+        self._handle.close()
+
+    def __enter__(self) -> "RawRows":
+        return self
+
+    def __exit__(self, *_exc) -> None:
+        self.close()
+
+    def header_bytes(self) -> bytes:
+        return self._mm[:self.index.header_length] + b"\r\n"
+
+    def iter_chunks(self, row_ids: np.ndarray, chunk_bytes: int = 1 << 20) -> Iterator[bytes]:
+        ids = np.asarray(row_ids, dtype=np.int64)
+        if ids.shape[0] == 0:
+            return
+        starts = self.index.starts[ids]
+        ends = starts + self.index.lengths[ids]
+        linked = (np.diff(ids) == 1) & self._crlf[ids[:-1]]
+        run_first = np.flatnonzero(np.concatenate(([True], ~linked))).tolist()
+        run_last = [i - 1 for i in run_first[1:]] + [ids.shape[0] - 1]
+        starts_l = starts.tolist()
+        ends_l = ends.tolist()
+        mm = self._mm
+        parts: List[bytes] = []
+        size = 0
+        for first, last in zip(run_first, run_last):
+            parts.append(mm[starts_l[first]:ends_l[last]])
+            parts.append(b"\r\n")
+            size += ends_l[last] - starts_l[first] + 2
+            if size >= chunk_bytes:
+                yield b"".join(parts)
+                parts = []
+                size = 0
+        if parts:
+            yield b"".join(parts)
+
+
+def _scan_record_ends(path: Path) -> Tuple[np.ndarray, int]:
+    """Positions of record-terminating newlines (outside quotes) and file size."""
+    ends: List[np.ndarray] = []
+    pos = 0
+    parity = 0
+    with path.open("rb") as fh:
+        while True:
+            block = fh.read(1 << 24)
+            if not block:
+                break
+            arr = np.frombuffer(block, dtype=np.uint8)
+            quotes = np.cumsum(arr == 0x22, dtype=np.int64)
+            nl = np.flatnonzero(arr == 0x0A)
+            outside = ((quotes[nl] + parity) & 1) == 0
+            ends.append(nl[outside] + pos)
+            if quotes.shape[0]:
+                parity = (parity + int(quotes[-1])) & 1
+            pos += len(block)
+    return (np.concatenate(ends) if ends else np.zeros(0, dtype=np.int64)), pos
+
+
+def build_row_index(csv_path: Path) -> Tuple[np.ndarray, np.ndarray, int, int]:
+    """Split ``csv_path`` into records; returns (starts, lengths, header_length, size)."""
+    newlines, size = _scan_record_ends(csv_path)
+    starts = np.concatenate(([0], newlines + 1)).astype(np.int64)
+    ends = newlines.astype(np.int64)
+    if size > int(starts[-1]):
+        ends = np.concatenate((ends, [size]))
+    else:
+        starts = starts[:-1]
+    if size:
+        data = np.memmap(csv_path, dtype=np.uint8, mode="r")
+        has_nl = ends < size
+        cr = np.zeros(ends.shape[0], dtype=bool)
+        check = has_nl & (ends > starts)
+        cr[check] = data[ends[check] - 1] == 0x0D
+        ends = ends - cr
+        del data
+    lengths = ends - starts
+    if starts.shape[0] == 0:
+        return starts, lengths, 0, size
+    return starts[1:], lengths[1:], int(lengths[0]), size
+
+
+def _verify_row_index(snap: "Snapshot", starts: np.ndarray, lengths: np.ndarray) -> bool:
+    """Re-parse a spread of raw rows and compare them with the snapshot."""
+    n = snap.row_count
+    if n == 0:
+        return True
+    probe = np.unique(np.linspace(0, n - 1, num=min(n, 64)).astype(np.int64))
+    rows = {r.row_id: list(r) for r in snap.iter_rows(probe)}
+    with Path(snap.signature[0]).open("rb") as fh:
+        for row_id in probe.tolist():
+            fh.seek(int(starts[row_id]))
+            raw = fh.read(int(lengths[row_id])).decode(CSV_ENCODING)
+            parsed = next(csv.reader(io.StringIO(raw, newline=""), delimiter=CSV_DELIMITER), [])
+            if parsed != rows[row_id]:
+                return False
+    return True
+
+
+def _load_or_build_row_index(snap: "Snapshot") -> RowIndex:
+    meta_path = snap.path / "rowindex.json"
+    if meta_path.exists():
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if not meta.get("valid"):
+            return RowIndex(np.zeros(0, np.int64), np.zeros(0, np.int64), 0, 0, valid=False)
+        return RowIndex(
+            _memmap(snap.path / "rowindex.starts.bin", "int64", snap.row_count),
+            _memmap(snap.path / "rowindex.lengths.bin", "int64", snap.row_count),
+            int(meta["header_length"]),
+            int(meta["size"]),
+        )
+
+    csv_path = Path(snap.signature[0])
+    try:
+        if source_signature(csv_path) != snap.signature:
+            # Source moved on; do not persist anything for this version.
+            return RowIndex(np.zeros(0, np.int64), np.zeros(0, np.int64), 0, 0, valid=False)
+        if source.codec(csv_path) is not None:
+            # Raw copies are byte ranges of the file; rows are re-serialized instead.
+            _log(f"{csv_path.name} is compressed; raw copies disabled")
+            return RowIndex(np.zeros(0, np.int64), np.zeros(0, np.int64), 0, 0, valid=False)
+        starts, lengths, header_length, size = build_row_index(csv_path)
+        valid = starts.shape[0] == snap.row_count and _verify_row_index(snap, starts, lengths)
+    except (OSError, ValueError, csv.Error) as exc:
+        _log(f"row index unavailable: {exc}")
+        return RowIndex(np.zeros(0, np.int64), np.zeros(0, np.int64), 0, 0, valid=False)
+
+    if valid:
+        starts.tofile(snap.path / "rowindex.starts.bin")
+        lengths.tofile(snap.path / "rowindex.lengths.bin")
+    else:
+        _log(f"row index does not line up with the parsed rows ({starts.shape[0]} vs {snap.row_count}); raw copies disabled")
+    meta_path.write_text(
+        json.dumps({"valid": valid, "header_length": header_length, "size": size}), encoding="utf-8"
+    )
+    return RowIndex(starts, lengths, header_length, size, valid=valid)
+
+
+# Ingest --------------------------------------------------------------------
+
+
+class _ColumnWriter:
+    """Append cells to disk; keep a dictionary while cardinality stays low."""
+
+    def __init__(self, folder: Path, index: int, dict_max: int):
+        self.index = index
+        self.dict_max = dict_max
+        self.heap_path = folder / f"c{index}.heap.bin"
+        self.offsets_path = folder / f"c{index}.offsets.bin"
+        self.codes_path = folder / f"c{index}.codes.bin"
+        self.heap = self.heap_path.open("wb")
+        self.offsets = self.offsets_path.open("wb")
+        self.codes = self.codes_path.open("wb")
+        self.lookup: Optional[Dict[str, int]] = {}
+        self.counts = np.zeros(0, dtype=np.int64)  # rows per dictionary code
+        self.pos = 0
+        array("q", [0]).tofile(self.offsets)
+
+    def write(self, cells: Sequence[str]) -> None:
+        encoded = [c.encode("utf-8") for c in cells]
+        ends = np.cumsum([len(b) for b in encoded], dtype=np.int64) + self.pos
+        self.heap.write(b"".join(encoded))
+        ends.tofile(self.offsets)
+        if ends.shape[0]:
+            self.pos = int(ends[-1])
+
+        lookup = self.lookup
+        if lookup is None:
+            return
+        codes = array("i")
+        for cell in cells:
+            code = lookup.get(cell)
+            if code is None:
+                code = lookup[cell] = len(lookup)
+            codes.append(code)
+        if len(lookup) > self.dict_max:
+            self.lookup = None
+            self.codes.close()
+            self.codes_path.unlink()
+            return
+        codes.tofile(self.codes)
+        hist = np.bincount(np.frombuffer(codes, dtype=np.int32), minlength=len(lookup))
+        self.counts = np.concatenate((self.counts, np.zeros(hist.shape[0] - self.counts.shape[0], dtype=np.int64)))
+        self.counts += hist
+
+    def pad(self, count: int) -> None:
+        if count > 0:
+            self.write([""] * count)
+
+    def finish(self) -> Dict[str, object]:
+        self.heap.close()
+        self.offsets.close()
+        if self.lookup is None:
+            return {
+                "index": self.index,
+                "kind": "str",
+                "offsets": self.offsets_path.name,
+                "heap": self.heap_path.name,
+            }
+        self.codes.close()
+        self.heap_path.unlink()
+        self.offsets_path.unlink()
+        values_path = self.codes_path.with_name(f"c{self.index}.values.json")
+        values = sorted(self.lookup, key=self.lookup.__getitem__)
+        values_path.write_text(json.dumps(values, ensure_ascii=False), encoding="utf-8")
+        return {
+            "index": self.index,
+            "kind": "dict",
+            "codes": self.codes_path.name,
+            "values": values_path.name,
+            "distinct": len(values),
+        }
+
+
+def build_snapshot(csv_path: Path, root: Optional[Path] = None) -> Path:
+    """Convert ``csv_path`` into a snapshot directory and return its path."""
+    root = root or SNAPSHOT_DIR
+    signature = source_signature(csv_path)
+    version = version_for(signature)
+    target = root / version
+    if (target / MANIFEST_NAME).exists():
+        return target
+
+    root.mkdir(parents=True, exist_ok=True)
+    tmp = _tmp_dir(root, version)
+    stats = source.ReadStats()
+    started = time.perf_counter()
+    try:
+        with source.open_text(csv_path, stats) as handle:
+            rdr = csv.reader(handle, delimiter=CSV_DELIMITER)
+            header = next(rdr)
+            rows_done, columns, typed = ingest_rows(rdr, header, tmp, version, signature)
+        os.replace(tmp, target)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    ingest_seconds = max(time.perf_counter() - started - stats.seconds, 1e-9)
+
+    dict_cols = sum(1 for c in columns if c["kind"] == "dict")
+    _log(
+        f"built {version}: {rows_done} rows, {len(columns)} columns "
+        f"({dict_cols} dictionary encoded, {typed} typed)"
+    )
+    _log(
+        f"{stats.describe()}; parsed and ingested in {ingest_seconds:.2f}s "
+        f"({rows_done / ingest_seconds:.0f} rows/s)"
+    )
+    return target
+
+
+def _tmp_dir(root: Path, version: str) -> Path:
+    tmp = root / f".tmp-{version}-{os.getpid()}-{threading.get_ident()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    return tmp
+
+
+def ingest_rows(
+    rows: Iterable[Sequence[str]],
+    header: List[str],
+    folder: Path,
+    version: str,
+    signature: Tuple[str, int, int],
+    min_columns: int = 0,
+) -> Tuple[int, List[Dict[str, object]], int]:
+    """Write ``rows`` as a complete snapshot into the empty ``folder``.
+
+    Returns the row count, the column specs and the number of typed fields.
+    At least ``min_columns`` columns are written (missing cells are empty).
+    """
+    writers: List[_ColumnWriter] = []
+    rows_done = 0
+    try:
+        with (folder / "widths.bin").open("wb") as widths_out, (folder / "rowhash.bin").open("wb") as hashes_out:
+            block: List[Sequence[str]] = []
+            for row in rows:
+                block.append(row)
+                if len(block) >= BLOCK_ROWS:
+                    _ingest_block(block, writers, widths_out, hashes_out, folder, rows_done)
+                    rows_done += len(block)
+                    block = []
+            if block:
+                _ingest_block(block, writers, widths_out, hashes_out, folder, rows_done)
+                rows_done += len(block)
+        while len(writers) < max(len(header), min_columns):
+            writer = _ColumnWriter(folder, len(writers), SNAPSHOT_DICT_MAX)
+            writer.pad(rows_done)
+            writers.append(writer)
+        columns = [w.finish() for w in writers]
+    except BaseException:
+        for w in writers:
+            for fh in (w.heap, w.offsets, w.codes):
+                fh.close()
+        raise
+    for spec in columns:
+        if spec["kind"] == "dict" and spec["distinct"] <= SNAPSHOT_BITMAP_MAX:
+            codes = _memmap(folder / spec["codes"], "int32", rows_done)
+            _write_value_bitmaps(folder, int(spec["index"]), codes, spec["distinct"])
+            del codes
+    manifest = {
+        "format": FORMAT_VERSION,
+        "version": version,
+        "source": signature[0],
+        "signature": list(signature),
+        "header": header,
+        "rows": rows_done,
+        "columns": columns,
+    }
+    (folder / MANIFEST_NAME).write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+    _write_catalog(folder, {
+        w.index: dict(zip(sorted(w.lookup, key=w.lookup.__getitem__), w.counts.tolist()))
+        for w in writers
+        if w.lookup is not None and len(w.lookup) <= CATALOG_MAX_VALUES
+    })
+    return rows_done, columns, _ingest_typed(Snapshot(folder))
+
+
+def _ingest_typed(snap: Snapshot) -> int:
+    """Parse the registered typed fields present in ``snap``; returns how many."""
+    cols = schema.for_header(snap.header)
+    done = 0
+    for name, parse in TYPED_FIELDS:
+        idx = cols.resolve(name) if name in schema.FIELDS else None
+        if idx is not None and idx < snap.column_count:
+            if (name, parse) in RANGE_FIELDS:
+                snap.range_index(idx, parse)
+            else:
+                snap.typed(idx, parse)
+            done += 1
+    return done
+
+
+def _write_catalog(folder: Path, columns: Dict[int, Dict[str, int]]) -> None:
+    catalog = {str(idx): values for idx, values in sorted(columns.items())}
+    (folder / CATALOG_NAME).write_text(json.dumps(catalog, ensure_ascii=False), encoding="utf-8")
+
+
+def _write_value_bitmaps(folder: Path, idx: int, codes: np.ndarray, distinct: int) -> None:
+    """Store one RowBitmap per dictionary code (the inverted index of a column)."""
+    rows = int(codes.shape[0])
+    order = np.argsort(codes, kind="stable")
+    counts = np.bincount(codes, minlength=distinct) if rows else np.zeros(distinct, dtype=np.int64)
+    bounds = np.concatenate(([0], np.cumsum(counts)))
+    bitmaps = [
+        RowBitmap.from_ids(order[bounds[code]:bounds[code + 1]], rows) for code in range(distinct)
+    ]
+    (folder / "bitmaps").mkdir(exist_ok=True)
+    bitmap.save(folder / "bitmaps" / f"values-{idx}.npz", bitmaps, rows)
+
+
+@lru_cache(maxsize=256)
+def _function_digest(fn: Callable) -> str:
+    """Short hash identifying a predicate/tokenizer, used to name index files.
+
+    The source text is included so editing the function invalidates its index.
+    """
+    try:
+        source = inspect.getsource(fn)
+    except (OSError, TypeError):
+        source = ""
+    raw = repr((fn.__module__, fn.__qualname__, source))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
+
+
+def _build_token_index(column, tokenize: Callable[[str], Iterable[str]], rows: int) -> TokenIndex:
+    ids: Dict[str, int] = {}
+    memo: Dict[str, Tuple[int, ...]] = {}
+    token_parts: List[np.ndarray] = []
+    row_parts: List[np.ndarray] = []
+    for start in range(0, rows, BLOCK_ROWS):
+        stop = min(start + BLOCK_ROWS, rows)
+        block_tokens = array("i")
+        block_rows = array("q")
+        for row, cell in enumerate(column.chunk(start, stop), start):
+            found = memo.get(cell)
+            if found is None:
+                found = tuple(dict.fromkeys(ids.setdefault(t, len(ids)) for t in tokenize(cell)))
+                if len(memo) < SNAPSHOT_DICT_MAX:
+                    memo[cell] = found
+            for t in found:
+                block_tokens.append(t)
+                block_rows.append(row)
+        token_parts.append(np.frombuffer(block_tokens, dtype=np.int32))
+        row_parts.append(np.frombuffer(block_rows, dtype=np.int64))
+    token_ids = np.concatenate(token_parts) if token_parts else np.zeros(0, dtype=np.int32)
+    row_ids = np.concatenate(row_parts) if row_parts else np.zeros(0, dtype=np.int64)
+    # Stable sort keeps the row ids of each token in ascending order.
+    order = np.argsort(token_ids, kind="stable")
+    row_ids = row_ids[order]
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(token_ids, minlength=len(ids)))))
+    tokens = sorted(ids)
+    bitmaps = [
+        RowBitmap.from_ids(row_ids[bounds[ids[t]]:bounds[ids[t] + 1]], rows) for t in tokens
+    ]
+    return TokenIndex(tokens, bitmaps, rows)
+
+
+def _ingest_block(
+    block: List[Sequence[str]],
+    writers: List[_ColumnWriter],
+    widths_out,
+    hashes_out,
+    folder: Path,
+    rows_before: int,
+) -> None:
+    widths = array("i", (len(r) for r in block))
+    widths.tofile(widths_out)
+    row_hashes(block).tofile(hashes_out)
+    width = max(widths) if widths else 0
+    while len(writers) < width:
+        writer = _ColumnWriter(folder, len(writers), SNAPSHOT_DICT_MAX)
+        writer.pad(rows_before)
+        writers.append(writer)
+    columns = list(zip_longest(*block, fillvalue=""))
+    for idx, writer in enumerate(writers):
+        if idx < len(columns):
+            writer.write(columns[idx])
+        else:
+            writer.pad(len(block))
+
+
+def open_snapshot(path: Path) -> Snapshot:
+    """Snapshot of the version directory ``path`` (plain or segmented)."""
+    manifest = json.loads((path / MANIFEST_NAME).read_text(encoding="utf-8"))
+    if manifest.get("kind") == "delta":
+        from . import delta
+        return delta.SegmentedSnapshot(path)
+    return Snapshot(path)
+
+
+def _referenced(root: Path, name: str) -> List[str]:
+    """Version directories a version reads from: itself, plus the base and
+    segment owners of a segmented version."""
+    try:
+        manifest = json.loads((root / name / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return [name]
+    if manifest.get("kind") != "delta":
+        return [name]
+    return [name, manifest["base"]] + [Path(seg).parts[0] for seg in manifest["segments"]]
+
+
+# Snapshots opened in this process. A version directory is not pruned while
+# any of them (a running request or job, a cached part of a segmented
+# version) still maps files from it.
+_OPEN: "weakref.WeakSet[object]" = weakref.WeakSet()
+_OPEN_LOCK = threading.Lock()
+
+
+def track(snap: object) -> None:
+    """Register an opened snapshot (plain or segmented) so _prune() keeps its directory."""
+    with _OPEN_LOCK:
+        _OPEN.add(snap)
+
+
+def _in_use(root: Path) -> Set[str]:
+    """Version directories under ``root`` that snapshots still open in this process read from."""
+    gc.collect()  # snapshots only kept alive by reference cycles do not count
+    with _OPEN_LOCK:
+        paths = [snap.path for snap in list(_OPEN)]  # type: ignore[attr-defined]
+    names = set()
+    for path in paths:
+        try:
+            names.add(Path(path).relative_to(root).parts[0])
+        except ValueError:
+            continue
+    return names
+
+
+def _prune(root: Path, keep: Iterable[str]) -> None:
+    keep = {ref for name in keep for ref in _referenced(root, name)}
+    busy = {ref for name in _in_use(root) - keep for ref in _referenced(root, name)}
+    for child in root.iterdir():
+        if child.name in keep or child.name.startswith(".tmp-"):
+            continue
+        if child.is_dir() and (child / MANIFEST_NAME).exists():
+            if child.name in busy:
+                _log(f"kept stale snapshot {child.name} until the snapshots reading it are released")
+                continue
+            shutil.rmtree(child, ignore_errors=True)
+            _log(f"removed stale snapshot {child.name}")
+
+
+def active(csv_path: Path) -> Optional[Snapshot]:
+    """The snapshot currently served for ``csv_path`` (possibly of an older version), without building."""
+    return _ACTIVE.get(str(csv_path.resolve()))
+
+
+def served_signature(csv_path: Path) -> Tuple[str, int, int]:
+    """Signature of the source version requests are answered from: the active
+    snapshot's, or the file's own when there is none."""
+    current = active(csv_path)
+    return current.signature if current is not None else source_signature(csv_path)
+
+
+def _activate(csv_path: Path, prepare: bool = False) -> Optional[Snapshot]:
+    """Build the current version of ``csv_path`` and make it the active one (caller holds _LOCK).
+
+    While a version is active, delta.ingest() first tries to store the new
+    one as a delta segment on top of it; otherwise the CSV is ingested in
+    full. With ``prepare`` the PREPARE_HOOKS run on the new version first. The
+    swap is a single dictionary assignment: requests that already hold the
+    previous snapshot finish on it, and its directory is kept until the
+    next swap.
+    """
+    try:
+        path = None
+        current = _ACTIVE.get(str(csv_path.resolve()))
+        if DELTA_ENABLED and current is not None:
+            from . import delta
+            path = delta.ingest(csv_path, current)
+        if path is None:
+            path = build_snapshot(csv_path)
+        snap = open_snapshot(path)
+    except (OSError, ValueError, csv.Error, UnicodeDecodeError) as exc:
+        _log(f"unavailable for {csv_path}: {exc}")
+        return None
+    if prepare:
+        for hook in PREPARE_HOOKS:
+            try:
+                hook(snap)
+            except Exception as exc:  # a failed hook only loses a prebuilt index
+                _log(f"preparing {snap.version} with {getattr(hook, '__name__', hook)} failed: {exc}")
+    key = snap.signature[0]
+    previous = _ACTIVE.get(key)
+    _ACTIVE[key] = snap
+    if previous is not None and previous.version != snap.version:
+        _log(f"switched {Path(key).name} from {previous.version} to {snap.version}")
+    try:
+        _prune(path.parent, keep=[path.name] + ([previous.path.name] if previous is not None else []))
+    except OSError as exc:
+        _log(f"prune warning: {exc}")
+    return snap
+
+
+def refresh(csv_path: Path) -> bool:
+    """Rebuild ``csv_path`` in a background thread if its active snapshot is missing or stale.
+
+    Returns True when a rebuild was started; the new version is swapped in
+    (after PREPARE_HOOKS) once it is complete.
+    """
+    global _REFRESHING
+    if not SNAPSHOT_ENABLED:
+        return False
+    with _REFRESH_LOCK:
+        if _REFRESHING is not None and _REFRESHING.is_alive():
+            return False
+        try:
+            signature = source_signature(csv_path)
+        except OSError:
+            return False
+        current = _ACTIVE.get(signature[0])
+        if current is not None and current.signature == signature:
+            return False
+
+        def run() -> None:
+            with _LOCK:
+                current = _ACTIVE.get(signature[0])
+                try:
+                    stale = current is None or current.signature != source_signature(csv_path)
+                except OSError as exc:
+                    _log(f"refresh skipped: {exc}")
+                    return
+                if stale:
+                    _activate(csv_path, prepare=True)
+
+        _REFRESHING = threading.Thread(target=run, name="snapshot-refresh", daemon=True)
+        _REFRESHING.start()
+        return True
+
+
+def get_snapshot(csv_path: Path, wait: bool = False) -> Optional[Snapshot]:
+    """Return the snapshot for ``csv_path``.
+
+    When the source changed since the active snapshot was built, the active
+    one keeps being returned while refresh() builds the new version in the
+    background (``wait`` builds it in the caller instead). Without any
+    snapshot yet the caller builds one, unless another thread already is.
+    Returns ``None`` when snapshots are disabled, the build fails or
+    (unless ``wait``) a first build is still running elsewhere, so callers
+    can fall back to streaming the CSV.
+    """
+    if not SNAPSHOT_ENABLED:
+        return None
+    try:
+        signature = source_signature(csv_path)
+    except OSError:
+        return None
+    key = signature[0]
+    current = _ACTIVE.get(key)
+    if current is not None and current.signature == signature:
+        return current
+    if current is not None and not wait:
+        refresh(csv_path)
+        return current
+
+    if not _LOCK.acquire(blocking=wait):
+        return None
+    try:
+        current = _ACTIVE.get(key)
+        if current is not None and current.signature == signature:
+            return current
+        return _activate(csv_path)
+    finally:
+        _LOCK.release()
@@ -0,0 +1,368 @@
+"""Reading the source CSV, plain or compressed.
+
+The source may be stored gzip- or zstd-compressed (zstd needs the optional
+``zstandard`` package). The codec is detected from the file's magic bytes;
+a ``.gz``/``.zst`` extension on data without the matching magic is an error.
+:func:`open_text` reads any gzip or zstd file from the start.
+
+Parallel range scans have to start decompressing in the middle of the file,
+which needs a seekable block format: data compressed in independent blocks
+that can be located without decompressing what comes before them.
+
+- gzip: BGZF, as written by ``bgzip`` (every gzip member records its size);
+- zstd: the zstd seekable format (independent frames plus a seek table in a
+  trailing skippable frame).
+
+``python -m backend.compress_source`` writes either. Compressed files in any
+other layout are read sequentially.
+"""
+from __future__ import annotations
+
+import gzip
+import io
+import os
+import struct
+import threading
+import time
+import zlib
+from bisect import bisect_right
+from pathlib import Path
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, TextIO, Tuple
+
+from ..config import CSV_ENCODING
+
+try:
+    import zstandard
+except ImportError:  # optional: only needed for zstd-compressed sources
+    zstandard = None
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_EXTENSIONS = {".gz": "gzip", ".bgz": "gzip", ".zst": "zstd", ".zstd": "zstd"}
+
+# BGZF: members of at most 64 KiB whose "BC" extra subfield holds their size.
+BGZF_BLOCK_RAW = 0xFF00
+_BGZF_HEADER = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00"
+_BGZF_EOF = _BGZF_HEADER + b"\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00"
+# zstd seekable format: seek table in a skippable frame at the end of the file.
+_SKIPPABLE_SEEK_TABLE = 0x184D2A5E
+_SEEKABLE_MAGIC = 0x8F92EAB1
+ZSTD_BLOCK_RAW = 4 * 1024 * 1024
+
+_BLOCKS: Dict[Tuple[str, int, int], Optional[List["Block"]]] = {}
+_LOCK = threading.Lock()
+
+
+class Block(NamedTuple):
+    """One independently compressed block: its byte range in the file and
+    the range of decompressed bytes it holds."""
+
+    offset: int
+    size: int
+    raw_offset: int
+    raw_size: int
+
+
+def _signature(path: Path) -> Tuple[str, int, int]:
+    stat = path.stat()
+    return str(path.resolve()), int(stat.st_size), int(stat.st_mtime_ns)
+
+
+def _zstd():
+    if zstandard is None:
+        raise ValueError("zstd-compressed sources need the zstandard package (pip install zstandard)")
+    return zstandard
+
+
+def codec(path: Path) -> Optional[str]:
+    """``"gzip"``, ``"zstd"`` or None (plain text) for the file at ``path``."""
+    with path.open("rb") as fh:
+        magic = fh.read(4)
+    if magic[:2] == GZIP_MAGIC:
+        return "gzip"
+    if magic == ZSTD_MAGIC or (len(magic) == 4 and struct.unpack("<I", magic)[0] & 0xFFFFFFF0 == 0x184D2A50):
+        return "zstd"
+    expected = _EXTENSIONS.get(path.suffix.lower())
+    if expected is not None and magic:
+        raise ValueError(f"{path.name} has a {path.suffix} extension but is not {expected} data")
+    return None
+
+
+class ReadStats:
+    """Decompressed bytes delivered by a reader and the seconds spent reading
+    and decompressing them, so parsing can be timed separately."""
+
+    def __init__(self) -> None:
+        self.codec: Optional[str] = None
+        self.raw_bytes = 0
+        self.seconds = 0.0
+
+    def add(self, raw_bytes: int, seconds: float) -> None:
+        self.raw_bytes += raw_bytes
+        self.seconds += seconds
+
+    def describe(self) -> str:
+        mb = self.raw_bytes / 1e6
+        rate = f"{mb / self.seconds:.0f} MB/s" if self.seconds > 0 else "n/a"
+        verb = f"decompressed ({self.codec})" if self.codec else "read"
+        return f"{verb} {mb:.1f} MB in {self.seconds:.2f}s ({rate})"
+
+
+class _TimedReader(io.RawIOBase):
+    """Raw stream over a (decompressing) reader that records into a ReadStats."""
+
+    def __init__(self, inner, handle: BinaryIO, stats: Optional[ReadStats]):
+        self._inner = inner
+        self._handle = handle
+        self._stats = stats
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        started = time.perf_counter()
+        data = self._inner.read(len(buffer))
+        n = len(data)
+        buffer[:n] = data
+        if self._stats is not None:
+            self._stats.add(n, time.perf_counter() - started)
+        return n
+
+    def close(self) -> None:
+        if not self.closed:
+            if self._inner is not self._handle:
+                self._inner.close()
+            self._handle.close()
+        super().close()
+
+
+def _decompressing(kind: Optional[str], handle: BinaryIO):
+    if kind == "gzip":
+        return gzip.GzipFile(fileobj=handle, mode="rb")
+    if kind == "zstd":
+        return _zstd().ZstdDecompressor().stream_reader(handle, read_across_frames=True, closefd=False)
+    return handle
+
+
+def open_binary(path: Path, stats: Optional[ReadStats] = None) -> BinaryIO:
+    """Decompressed bytes of ``path`` from the start; ``stats`` records the read/decompress time."""
+    kind = codec(path)
+    if stats is not None:
+        stats.codec = kind
+    handle = path.open("rb")
+    try:
+        inner = _decompressing(kind, handle)
+    except BaseException:
+        handle.close()
+        raise
+    return io.BufferedReader(_TimedReader(inner, handle, stats), buffer_size=1 << 20)  # type: ignore[return-value]
+
+
+def open_text(path: Path, stats: Optional[ReadStats] = None) -> TextIO:
+    """open_binary() decoded for ``csv.reader`` (CSV_ENCODING, ``newline=""``)."""
+    return io.TextIOWrapper(open_binary(path, stats), encoding=CSV_ENCODING, newline="")
+
+
+def head(path: Path, size: int = 1 << 20) -> Tuple[bytes, int]:
+    """The first ``size`` decompressed bytes of ``path`` and its decompressed size.
+
+    Without a block layout that records it, the size is extrapolated from
+    how many compressed bytes the head took.
+    """
+    kind = codec(path)
+    total = path.stat().st_size
+    with path.open("rb") as handle:
+        inner = _decompressing(kind, handle)
+        data = inner.read(size)
+        consumed = handle.tell()
+    if kind is None:
+        return data, total
+    found = blocks(path)
+    if found is not None:
+        return data, sum(b.raw_size for b in found)
+    if len(data) < size:
+        return data, len(data)
+    return data, int(total * len(data) / max(consumed, 1))
+
+
+# Seekable block layouts --------------------------------------------------------
+
+
+def blocks(path: Path) -> Optional[List[Block]]:
+    """The independently decompressible blocks of a seekable compressed source.
+
+    None for plain files and for compressed files in another layout.
+    """
+    key = _signature(path)
+    if key in _BLOCKS:
+        return _BLOCKS[key]
+    with _LOCK:
+        if key not in _BLOCKS:
+            kind = codec(path)
+            if kind == "gzip":
+                found = _bgzf_blocks(path)
+            elif kind == "zstd":
+                found = _zstd_seek_table(path)
+            else:
+                found = None
+            _BLOCKS.clear()
+            _BLOCKS[key] = found
+    return _BLOCKS[key]
+
+
+def raw_size(path: Path) -> Optional[int]:
+    """Decompressed size of ``path`` (its size for plain files), None when unknown."""
+    if codec(path) is None:
+        return path.stat().st_size
+    found = blocks(path)
+    return None if found is None else sum(b.raw_size for b in found)
+
+
+def _bgzf_blocks(path: Path) -> Optional[List[Block]]:
+    out: List[Block] = []
+    offset = raw = 0
+    with path.open("rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        while offset < size:
+            fh.seek(offset)
+            header = fh.read(12)
+            if len(header) < 12 or header[:4] != b"\x1f\x8b\x08\x04":
+                return None
+            extra = fh.read(struct.unpack("<H", header[10:12])[0])
+            bsize = None
+            pos = 0
+            while pos + 4 <= len(extra):
+                sub_len = struct.unpack("<H", extra[pos + 2:pos + 4])[0]
+                if extra[pos:pos + 2] == b"BC" and sub_len == 2:
+                    bsize = struct.unpack("<H", extra[pos + 4:pos + 6])[0] + 1
+                pos += 4 + sub_len
+            if bsize is None:
+                return None
+            fh.seek(offset + bsize - 4)
+            isize = struct.unpack("<I", fh.read(4))[0]
+            if isize:
+                out.append(Block(offset, bsize, raw, isize))
+            offset += bsize
+            raw += isize
+    return out
+
+
+def _zstd_seek_table(path: Path) -> Optional[List[Block]]:
+    with path.open("rb") as fh:
+        size = os.fstat(fh.fileno()).st_size
+        if size < 17:
+            return None
+        fh.seek(size - 9)
+        frames, descriptor, magic = struct.unpack("<IBI", fh.read(9))
+        if magic != _SEEKABLE_MAGIC:
+            return None
+        entry = 12 if descriptor & 0x80 else 8
+        table_size = frames * entry + 9
+        if table_size + 8 > size:
+            return None
+        fh.seek(size - table_size - 8)
+        if struct.unpack("<II", fh.read(8)) != (_SKIPPABLE_SEEK_TABLE, table_size):
+            return None
+        table = fh.read(frames * entry)
+    out: List[Block] = []
+    offset = raw = 0
+    for i in range(frames):
+        compressed, decompressed = struct.unpack_from("<II", table, i * entry)
+        out.append(Block(offset, compressed, raw, decompressed))
+        offset += compressed
+        raw += decompressed
+    return out
+
+
+def _inflate(kind: str, data: bytes) -> bytes:
+    if kind == "gzip":
+        return zlib.decompress(data, wbits=31)
+    return _zstd().ZstdDecompressor().decompressobj().decompress(data)
+
+
+def read_range(path: Path, start: int, stop: int, stats: Optional[ReadStats] = None) -> bytes:
+    """Decompressed bytes ``[start, stop)`` of ``path``.
+
+    Plain files are read directly; seekable compressed files decompress only
+    the blocks overlapping the range.
+    """
+    started = time.perf_counter()
+    found = blocks(path)
+    if found is None:
+        if codec(path) is not None:
+            raise ValueError(f"{path.name} is not in a seekable block format")
+        with path.open("rb") as fh:
+            fh.seek(start)
+            data = fh.read(stop - start)
+    else:
+        kind = codec(path)
+        if stats is not None:
+            stats.codec = kind
+        first = max(bisect_right([b.raw_offset for b in found], start) - 1, 0)
+        parts: List[bytes] = []
+        with path.open("rb") as fh:
+            for block in found[first:]:
+                if block.raw_offset >= stop:
+                    break
+                fh.seek(block.offset)
+                raw = _inflate(kind, fh.read(block.size))
+                parts.append(raw[max(start - block.raw_offset, 0):stop - block.raw_offset])
+        data = b"".join(parts)
+    if stats is not None:
+        stats.add(len(data), time.perf_counter() - started)
+    return data
+
+
+# Writing -------------------------------------------------------------------------
+
+
+def _bgzf_member(chunk: bytes, level: int) -> bytes:
+    deflate = zlib.compressobj(level, zlib.DEFLATED, -15)
+    body = deflate.compress(chunk) + deflate.flush()
+    trailer = struct.pack("<II", zlib.crc32(chunk) & 0xFFFFFFFF, len(chunk))
+    return _BGZF_HEADER + struct.pack("<H", len(_BGZF_HEADER) + 2 + len(body) + 8 - 1) + body + trailer
+
+
+def write_blocks(src: BinaryIO, dst: BinaryIO, kind: str, level: Optional[int] = None,
+                 block_raw: Optional[int] = None) -> List[Block]:
+    """Compress ``src`` into ``dst`` in the seekable layout of ``kind``; returns the blocks."""
+    out: List[Block] = []
+    offset = raw = 0
+    if kind == "gzip":
+        level = 6 if level is None else level
+        step = min(block_raw or BGZF_BLOCK_RAW, BGZF_BLOCK_RAW)
+        while True:
+            chunk = src.read(step)
+            if not chunk:
+                break
+            members = [_bgzf_member(chunk, level)]
+            if len(members[0]) > 0x10000:  # incompressible: store it in two halves
+                half = len(chunk) // 2
+                members = [_bgzf_member(chunk[:half], level), _bgzf_member(chunk[half:], level)]
+                sizes = [half, len(chunk) - half]
+            else:
+                sizes = [len(chunk)]
+            for member, n in zip(members, sizes):
+                dst.write(member)
+                out.append(Block(offset, len(member), raw, n))
+                offset += len(member)
+                raw += n
+        dst.write(_BGZF_EOF)
+        return out
+    if kind != "zstd":
+        raise ValueError(f"Unknown codec {kind!r}; expected gzip or zstd")
+    compressor = _zstd().ZstdCompressor(level=3 if level is None else level)
+    step = block_raw or ZSTD_BLOCK_RAW
+    while True:
+        chunk = src.read(step)
+        if not chunk:
+            break
+        frame = compressor.compress(chunk)
+        dst.write(frame)
+        out.append(Block(offset, len(frame), raw, len(chunk)))
+        offset += len(frame)
+        raw += len(chunk)
+    table = b"".join(struct.pack("<II", b.size, b.raw_size) for b in out)
+    table += struct.pack("<IBI", len(out), 0, _SEEKABLE_MAGIC)
+    dst.write(struct.pack("<II", _SKIPPABLE_SEEK_TABLE, len(table)) + table)
+    return out
@@ -15,12 +15,16 @@ Rules:
 import ast
 from typing import Iterable, List, Generator, Optional, Dict
 
+import numpy as np
+
+from . import schema
+
 FILTER_KEY = "traditional_outreach"
 
 # columns (case-insensitive)
-FAX_COL_CANDS    = ["faxnumber_formatted", "fax", "fax_number"]
-PHONE_COL_CANDS  = ["phonenumber_formatted", "phone", "phone_number", "telephone", "telefoon"]
-POSTAL_COL_CANDS = ["postaladdress", "postal_address", "postadres", "post_adres", "postbus", "specialpostadress"]
+FAX_COL_CANDS    = schema.field("fax", ["faxnumber_formatted", "fax", "fax_number"])
+PHONE_COL_CANDS  = schema.field("phone", ["phonenumber_formatted", "phone", "phone_number", "telephone", "telefoon"])
+POSTAL_COL_CANDS = schema.field("postaladdress", ["postaladdress", "postal_address", "postadres", "post_adres", "postbus", "specialpostadress"])
 
 OPTIONS = [
     "fax=TRUE", "fax=FALSE",
@@ -34,14 +38,6 @@ def name() -> str:
 def distinct_values(*_a, **_k) -> List[str]:
     return OPTIONS
 
-def _find_col(header: List[str], candidates: List[str]) -> Optional[int]:
-    norm = [h.strip().lower() for h in header]
-    for c in candidates:
-        c2 = c.strip().lower()
-        if c2 in norm:
-            return norm.index(c2)
-    return None
-
 def _has_value(cell: Optional[str]) -> bool:
     if cell is None:
         return False
@@ -92,9 +88,10 @@ def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Li
         yield from rows_iter
         return
 
-    fax_idx   = _find_col(header, FAX_COL_CANDS)   if cons["fax"]  is not None else None
-    phone_idx = _find_col(header, PHONE_COL_CANDS) if cons["phone"] is not None else None
-    post_idx  = _find_col(header, POSTAL_COL_CANDS)if cons["post"] is not None else None
+    cols = schema.for_header(header)
+    fax_idx   = cols.find(FAX_COL_CANDS)   if cons["fax"]  is not None else None
+    phone_idx = cols.find(PHONE_COL_CANDS) if cons["phone"] is not None else None
+    post_idx  = cols.find(POSTAL_COL_CANDS)if cons["post"] is not None else None
 
     # If a constraint is required but the column is missing -> no rows can match
     if (cons["fax"]  is not None and fax_idx  is None) or \
@@ -115,3 +112,20 @@ def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Li
             ok = ok and (present == cons["post"])
         if ok:
             yield row
+
+def mask(snap, header: List[str], selected_values: List[str]) -> Optional[np.ndarray]:
+    """Vectorized variant of apply(): presence bitmaps compared per constraint."""
+    cons = _parse_constraints(selected_values)
+    out = None
+    cols = schema.for_header(header)
+    for key, cands in (("fax", FAX_COL_CANDS), ("phone", PHONE_COL_CANDS), ("post", POSTAL_COL_CANDS)):
+        if cons[key] is None:
+            continue
+        idx = cols.find(cands)
+        if idx is None:
+            return np.zeros(snap.row_count, dtype=bool)
+        present = snap.presence(idx, _has_value)
+        if not cons[key]:
+            present = ~present
+        out = present if out is None else out & present
+    return np.ones(snap.row_count, dtype=bool) if out is None else out
@@ -16,6 +16,10 @@ Only constraints that are present are applied (AND logic).
 
 import csv
 from typing import Iterable, List, Generator, Optional, Dict, Set, Tuple
+
+import numpy as np
+
+from . import bitmap, schema, snapshot
 from ..config import CSV_DELIMITER, CSV_ENCODING
 
 FILTER_KEY = "vestiging"
@@ -45,14 +49,6 @@ def distinct_values(*_a, **_k) -> List[str]:
     """Return gebruiksdoel choices; UI will add the other controls."""
     return GEBRUIKSDOEL_OPTIONS
 
-def _find_col(header: List[str], candidates: List[str]) -> Optional[int]:
-    norm = [h.strip().lower() for h in header]
-    for c in candidates:
-        c2 = c.strip().lower()
-        if c2 in norm:
-            return norm.index(c2)
-    return None
-
 def _truthy(cell: Optional[str]) -> Optional[bool]:
     """Normalize various TRUE/FALSE-like values. Returns True/False, or None if unknown/empty."""
     if cell is None:
@@ -77,6 +73,11 @@ def _to_int_or_none(s: Optional[str]) -> Optional[int]:
     except ValueError:
         return None
 
+GD_COL_CANDS  = schema.field("gebruiksdoel", ["gebruiksdoelverblijfsobject", "gebruiksdoel", "gebruiksdoel_verblijfsobject"])
+HV_COL_CANDS  = schema.field("hoofdvestiging", ["hoofdvestiging", "is_hoofdv", "ishoofdvestiging"])
+NM_COL_CANDS  = schema.field("non_mailing", ["kvk_non_mailing_indicator", "non_mailing_indicator", "nonmailing", "non_mailing"])
+OPP_COL_CANDS = schema.field("oppervlakte", ["oppervlakteverblijfsobject", "oppervlakte", "oppervlakte_verblijfsobject"])
+
 def _parse_tokens(selected_values: List[str]) -> Dict[str, object]:
     """Turn flat token list into constraints dict."""
     gd: Set[str] = set()
@@ -127,10 +128,11 @@ def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Li
         return
 
     # Column indices
-    gd_idx   = _find_col(header, ["gebruiksdoelverblijfsobject", "gebruiksdoel", "gebruiksdoel_verblijfsobject"])
-    hv_idx   = _find_col(header, ["hoofdvestiging", "is_hoofdv", "ishoofdvestiging"])
-    nm_idx   = _find_col(header, ["kvk_non_mailing_indicator", "non_mailing_indicator", "nonmailing", "non_mailing"])
-    opp_idx  = _find_col(header, ["oppervlakteverblijfsobject", "oppervlakte", "oppervlakte_verblijfsobject"])
+    cols = schema.for_header(header)
+    gd_idx   = cols.find(GD_COL_CANDS)
+    hv_idx   = cols.find(HV_COL_CANDS)
+    nm_idx   = cols.find(NM_COL_CANDS)
+    opp_idx  = cols.find(OPP_COL_CANDS)
 
     # If a constraint exists for a column we can't find, then nothing can match
     if cons["gd"] and gd_idx is None:
@@ -146,6 +148,7 @@ def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Li
     INF = 10**18
     umin = 0 if cons["oppmin"] is None else cons["oppmin"]
     umax = INF if cons["oppmax"] is None else cons["oppmax"]
+    get_opp = cols.getter("oppervlakte")
 
     want_gd: Set[str] = set(x.strip() for x in cons["gd"]) if cons["gd"] else set()
 
@@ -167,8 +170,7 @@ def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Li
             ok = (_truthy(val) == cons["nm"])
 
         if ok and (cons["oppmin"] is not None or cons["oppmax"] is not None):
-            raw = row[opp_idx] if opp_idx is not None and opp_idx < len(row) else None
-            vv = _to_int_or_none(raw)
+            vv = get_opp(row)
             if vv is None:
                 ok = False
             else:
@@ -176,3 +178,48 @@ def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Li
 
         if ok:
             yield row
+
+def _to_int_or_none_safe(s: Optional[str]) -> Optional[int]:
+    try:
+        return _to_int_or_none(s)
+    except OverflowError:
+        return None
+
+snapshot.range_field("oppervlakte", _to_int_or_none_safe)
+
+def mask(snap, header: List[str], selected_values: List[str]) -> Optional[np.ndarray]:
+    """Vectorized variant of apply(): one bitmap/mask per constraint, ANDed."""
+    cons = _parse_tokens(selected_values)
+    out = np.ones(snap.row_count, dtype=bool)
+    if not cons["gd"] and cons["hv"] is None and cons["nm"] is None and cons["oppmin"] is None and cons["oppmax"] is None:
+        return out
+
+    cols = schema.for_header(header)
+    gd_idx   = cols.find(GD_COL_CANDS)
+    hv_idx   = cols.find(HV_COL_CANDS)
+    nm_idx   = cols.find(NM_COL_CANDS)
+    opp_idx  = cols.find(OPP_COL_CANDS)
+
+    if cons["gd"] and gd_idx is None:
+        return np.zeros(snap.row_count, dtype=bool)
+    if cons["hv"] is not None and hv_idx is None:
+        return np.zeros(snap.row_count, dtype=bool)
+    if cons["nm"] is not None and nm_idx is None:
+        return np.zeros(snap.row_count, dtype=bool)
+    if (cons["oppmin"] is not None or cons["oppmax"] is not None) and opp_idx is None:
+        return np.zeros(snap.row_count, dtype=bool)
+
+    parts = []
+    if cons["gd"]:
+        want = {s.strip().lower() for s in cons["gd"]}
+        parts.append(snap.where(
+            gd_idx, lambda val: (" ".join(val.strip().lower().split()) if val else "unknown") in want
+        ))
+    if cons["hv"] is not None:
+        parts.append(snap.where(hv_idx, lambda val: _truthy(val) == cons["hv"]))
+    if cons["nm"] is not None:
+        parts.append(snap.where(nm_idx, lambda val: _truthy(val) == cons["nm"]))
+    if cons["oppmin"] is not None or cons["oppmax"] is not None:
+        umin = 0 if cons["oppmin"] is None else cons["oppmin"]
+        parts.append(snap.value_range(opp_idx, _to_int_or_none_safe, umin, cons["oppmax"]))
+    return bitmap.intersect_all(parts, snap.row_count)
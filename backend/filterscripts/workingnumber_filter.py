@@ -8,10 +8,14 @@
 
 from typing import Iterable, List, Generator, Optional
 
+import numpy as np
+
+from . import bitmap, schema, snapshot
+
 FILTER_KEY = "workingnumber"
 
-CANDS_MIN = ["workingminimum", "working_minimum", "werk_min", "min_employees"]
-CANDS_MAX = ["workingmaximum", "working_maximum", "werk_max", "max_employees"]
+CANDS_MIN = schema.field("working_min", ["workingminimum", "working_minimum", "werk_min", "min_employees"])
+CANDS_MAX = schema.field("working_max", ["workingmaximum", "working_maximum", "werk_max", "max_employees"])
 
 UNKNOWN_SENTINEL = 999_999_999  # treat as unknown, not infinity, for filtering logic
 
@@ -21,14 +25,6 @@ def name() -> str:
 def distinct_values(*_a, **_k):
     return []  # numeric input from UI
 
-def _find_col(header: List[str], candidates: List[str]) -> Optional[int]:
-    norm = [h.strip().lower() for h in header]
-    for c in candidates:
-        c2 = c.strip().lower()
-        if c2 in norm:
-            return norm.index(c2)
-    return None
-
 def _to_int_or_none(s: Optional[str]) -> Optional[int]:
     if s is None:
         return None
@@ -51,15 +47,16 @@ def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Li
         yield from rows_iter
         return
 
-    i_min = _find_col(header, CANDS_MIN)
-    i_max = _find_col(header, CANDS_MAX)
-    if i_min is None or i_max is None:
+    cols = schema.for_header(header)
+    get_min = cols.getter("working_min")
+    get_max = cols.getter("working_max")
+    if get_min is None or get_max is None:
         # Can't apply without columns
         return
 
     for row in rows_iter:
-        r_min = _to_int_or_none(row[i_min] if i_min < len(row) else None)
-        r_max = _to_int_or_none(row[i_max] if i_max < len(row) else None)
+        r_min = get_min(row)
+        r_max = get_max(row)
 
         # Mark unknown if sentinel present or either missing
         is_unknown = (
@@ -82,3 +79,32 @@ def apply(rows_iter: Iterable[List[str]], header: List[str], selected_values: Li
         # Overlap test: [r_min, r_max] ∩ [eff_u_min, eff_u_max] ≠ ∅
         if (r_min <= eff_u_max) and (eff_u_min <= r_max):
             yield row
+
+snapshot.range_field("working_min", _to_int_or_none)
+snapshot.range_field("working_max", _to_int_or_none)
+
+def mask(snap, header: List[str], selected_values: List[str]) -> Optional[np.ndarray]:
+    """Vectorized variant of apply(): same overlap rules over whole columns."""
+    u_min = _to_int_or_none(selected_values[0]) if (selected_values and len(selected_values) > 0) else None
+    u_max = _to_int_or_none(selected_values[1]) if (selected_values and len(selected_values) > 1) else None
+    if u_min is None and u_max is None:
+        return np.ones(snap.row_count, dtype=bool)
+
+    cols = schema.for_header(header)
+    i_min = cols.find(CANDS_MIN)
+    i_max = cols.find(CANDS_MAX)
+    if i_min is None or i_max is None:
+        return np.zeros(snap.row_count, dtype=bool)
+
+    # Parsed once per snapshot version (typed columns). The range indexes
+    # narrow the rows to those with min <= u_max and max >= u_min; the
+    # remaining checks only look at those candidates.
+    r_min, ok_min = snap.typed(i_min, _to_int_or_none)
+    r_max, ok_max = snap.typed(i_max, _to_int_or_none)
+    cand = bitmap.intersect_all([
+        ok_min if u_max is None else snap.value_range(i_min, _to_int_or_none, None, u_max),
+        ok_max if u_min is None else snap.value_range(i_max, _to_int_or_none, u_min, None),
+    ], snap.row_count)
+    ids = cand.to_ids() if isinstance(cand, bitmap.RowBitmap) else np.flatnonzero(cand)
+    lo, hi = r_min[ids], r_max[ids]
+    return bitmap.RowBitmap.from_ids(ids[(hi != UNKNOWN_SENTINEL) & (lo <= hi)], snap.row_count)
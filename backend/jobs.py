@@ -0,0 +1,232 @@
+"""Background jobs for long filter runs (save, analysis, tracking, fused jobs).
+
+Endpoints validate their input in the request, then hand the actual scan to
+a small thread pool and return a job id. ``/api/jobs/<id>`` reports progress
+from the :class:`JobProgress` the scan updates as it goes; cancelling sets a
+flag that makes the next progress update raise :class:`JobCancelled`.
+"""
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+from .config import JOB_HISTORY, JOB_WORKERS
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once it has been cancelled."""
+
+
+class JobProgress:
+    """Counters a running scan updates; also the cancellation point."""
+
+    def __init__(self):
+        self.rows_total: Optional[int] = None
+        self.rows_scanned = 0
+        self.rows_matched = 0
+        self.bytes_written = 0
+        self.started: Optional[float] = None
+        self._cancelled = threading.Event()
+
+    def update(
+        self,
+        total: Optional[int] = None,
+        scanned: Optional[int] = None,
+        matched: Optional[int] = None,
+        written: Optional[int] = None,
+    ) -> None:
+        if total is not None:
+            self.rows_total = int(total)
+        if scanned is not None:
+            self.rows_scanned = int(scanned)
+        if matched is not None:
+            self.rows_matched = int(matched)
+        if written is not None:
+            self.bytes_written = int(written)
+        if self._cancelled.is_set():
+            raise JobCancelled("Job cancelled")
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def eta_seconds(self) -> Optional[float]:
+        """Remaining time extrapolated from the scan rate so far (None when unknown)."""
+        if self.started is None or not self.rows_total or self.rows_scanned <= 0:
+            return None
+        elapsed = time.time() - self.started
+        remaining = max(self.rows_total - self.rows_scanned, 0)
+        return elapsed * remaining / self.rows_scanned
+
+    def rows_per_second(self) -> Optional[float]:
+        if self.started is None:
+            return None
+        elapsed = time.time() - self.started
+        return self.rows_scanned / elapsed if elapsed > 0 else None
+
+    def to_dict(self) -> Dict[str, object]:
+        eta = self.eta_seconds()
+        rate = self.rows_per_second()
+        return {
+            "rows_total": self.rows_total,
+            "rows_scanned": self.rows_scanned,
+            "rows_matched": self.rows_matched,
+            "bytes_written": self.bytes_written,
+            "rows_per_second": round(rate) if rate is not None else None,
+            "eta_seconds": round(eta, 1) if eta is not None else None,
+        }
+
+
+class Job:
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.progress = JobProgress()
+        self.result: Optional[Dict[str, object]] = None
+        self.error: Optional[str] = None
+        self.error_status: Optional[int] = None
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self._finished = threading.Event()
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "failed", "cancelled")
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the job has finished (or ``timeout``); True when finished."""
+        return self._finished.wait(timeout)
+
+    def _finish(self) -> None:
+        self.finished = time.time()
+        self._finished.set()
+
+    def to_dict(self) -> Dict[str, object]:
+        data: Dict[str, object] = {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress.to_dict(),
+            "elapsed_seconds": round((self.finished or time.time()) - (self.progress.started or self.created), 1),
+        }
+        if self.status == "done":
+            data["result"] = self.result
+        if self.error is not None:
+            data["error"] = self.error
+            data["error_status"] = self.error_status
+        return data
+
+
+def _error_response(exc: Exception) -> Tuple[int, str]:
+    """HTTP status and message the synchronous endpoints used for ``exc``."""
+    if isinstance(exc, FileNotFoundError):
+        return 404, str(exc)
+    if isinstance(exc, PermissionError):
+        return 403, f"Permission denied: {exc}"
+    if isinstance(exc, OSError):
+        return 500, f"Filesystem error: {exc}"
+    if isinstance(exc, ValueError):
+        return 400, str(exc)
+    return 500, f"{type(exc).__name__}: {exc}"
+
+
+class JobManager:
+    """Runs jobs on a thread pool and keeps the last ``history`` finished ones."""
+
+    def __init__(self, workers: int = JOB_WORKERS, history: int = JOB_HISTORY):
+        self.workers = max(1, workers)
+        self.history = history
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._groups: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def submit(
+        self,
+        kind: str,
+        fn: Callable[[JobProgress], Dict[str, object]],
+        group: Optional[str] = None,
+        inline: bool = False,
+    ) -> Job:
+        """Queue ``fn(progress)``; its return value becomes the job result.
+
+        A job submitted with the same ``group`` as an unfinished one (e.g. the
+        previews of one browser tab) supersedes and cancels it. Grouped jobs
+        get their own thread instead of waiting behind long exports in the
+        pool; ``inline`` runs the job in the calling thread and returns when
+        it has finished.
+        """
+        job = Job(kind)
+        previous: Optional[Job] = None
+        with self._lock:
+            if group is not None:
+                previous = self._jobs.get(self._groups.get(group, ""))
+                self._groups[group] = job.id
+            self._jobs[job.id] = job
+            self._prune()
+            if group is None and not inline:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="cf-job")
+                self._pool.submit(self._run, job, fn)
+        if previous is not None and not previous.done:
+            print(f"[JOBS] {previous.kind} job {previous.id} superseded by {job.id}")
+            self.cancel(previous.id)
+        if inline:
+            self._run(job, fn)
+        elif group is not None:
+            threading.Thread(target=self._run, args=(job, fn), name=f"cf-{kind}", daemon=True).start()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.progress.cancel()
+        with self._lock:
+            if job.status == "queued":
+                job.status = "cancelled"
+                job.error = "Job cancelled"
+                job._finish()
+        return job
+
+    def _run(self, job: Job, fn: Callable[[JobProgress], Dict[str, object]]) -> None:
+        with self._lock:
+            if job.status != "queued":
+                return
+            job.status = "running"
+        job.progress.started = time.time()
+        try:
+            result = fn(job.progress)
+        except JobCancelled:
+            job.status, job.error = "cancelled", "Job cancelled"
+        except Exception as exc:
+            job.error_status, job.error = _error_response(exc)
+            job.status = "failed"
+            print(f"[JOBS] {job.kind} job {job.id} failed: {job.error}")
+        else:
+            job.result = result
+            job.status = "done"
+        job._finish()
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(len(finished) - self.history, 0)]:
+            del self._jobs[job_id]
+        for group, job_id in list(self._groups.items()):
+            if job_id not in self._jobs:
+                del self._groups[group]
+
+
+manager = JobManager()
@@ -10,7 +10,7 @@ from datetime import datetime
 from pathlib import Path
 from typing import Dict, Iterable, List, Optional, Sequence, Tuple
 
-from backend.filterscripts import combinator
+from backend.filterscripts import combinator, schema
 from backend.config import CSV_DELIMITER, CSV_ENCODING
 
 REPO_ROOT = Path(__file__).resolve().parents[1]
@@ -310,6 +310,137 @@ def record_campaign_run(selected: Dict, advanced: Dict, destinations: List[Dict]
     save_latest_campaign(payload)
 
 
+class TrackingSink:
+    """Job sink (see combinator.run_job) that adds the matching KVK numbers to a tracking CSV.
+
+    Arguments are validated on construction, before anything is scanned.
+    """
+
+    needs_rows = True
+
+    def __init__(
+        self,
+        *,
+        selected: Dict,
+        advanced: Dict,
+        campaign_directory: str | Path,
+        subcampaign_base: str,
+        mode: str,
+        target_path: str | Path | None = None,
+        duplicates_source: str | Path | None = None,
+    ) -> None:
+        self.campaign_dir = Path(campaign_directory or "").expanduser()
+        if not str(self.campaign_dir):
+            raise ValueError("Campaign directory is required. Run a custom save first.")
+
+        self.base_name = (subcampaign_base or "").strip()
+        if not self.base_name:
+            raise ValueError("Base filename is required to derive campaign metadata.")
+
+        self.filters = FilterColumns.from_selected(selected)
+        raw_duplicates = duplicates_source if duplicates_source else _extract_duplicates_folder(advanced or {})
+        self.duplicates_source_resolved = ""
+        self.duplicates_lookup: Optional[set[str]] = None
+        if raw_duplicates:
+            lookup_path = Path(raw_duplicates).expanduser()
+            self.duplicates_lookup = combinator._load_existing_kvk_numbers(lookup_path)
+            self.duplicates_source_resolved = str(lookup_path.resolve())
+
+        self.mode = (mode or "create").strip().lower()
+        self.target_path = target_path
+        self.kvk_idx: Optional[int] = None
+        self.seen_kvk: set[str] = set()
+        self.rows_data: List[Dict[str, str]] = []
+
+    def start(self, header: Sequence[str], source) -> None:
+        self.kvk_idx = schema.for_header(header).kvk
+        if self.kvk_idx is None:
+            raise ValueError("Could not find a KVK column in the source CSV.")
+
+    def feed(self, ids, rows: Iterable[Sequence[str]]) -> None:
+        kvk_idx = self.kvk_idx
+        filters = self.filters
+        for row in rows:
+            if kvk_idx >= len(row):
+                continue
+            kvk = (row[kvk_idx] or "").strip()
+            if not kvk or kvk in self.seen_kvk:
+                continue
+            self.seen_kvk.add(kvk)
+            before_val = ""
+            if self.duplicates_lookup is not None:
+                before_val = "TRUE" if kvk in self.duplicates_lookup else "FALSE"
+            timestamp = datetime.now().astimezone().isoformat(timespec="seconds")
+            self.rows_data.append({
+                "kvknumber": kvk,
+                "campaign": self.campaign_dir.name,
+                "subcampaign": self.base_name,
+                "date_added": timestamp,
+                "economischactief": filters.economischactief,
+                "rechtsvorm": filters.rechtsvorm,
+                "location": filters.location,
+                "working_min": filters.working_min,
+                "working_max": filters.working_max,
+                "contactpersoon": filters.contactpersoon,
+                "media": filters.media,
+                "traditional_outreach": filters.traditional_outreach,
+                "vestiging_gebruiksdoel": filters.vestiging_gebruiksdoel,
+                "vestiging_hoofdvestiging": filters.vestiging_hoofdvestiging,
+                "vestiging_kvk_non_mailing": filters.vestiging_kvk_non_mailing,
+                "vestiging_oppervlakte_min": filters.vestiging_oppervlakte_min,
+                "vestiging_oppervlakte_max": filters.vestiging_oppervlakte_max,
+                "overige_date_min": filters.overige_date_min,
+                "overige_date_max": filters.overige_date_max,
+                "overige_tradenames": filters.overige_tradenames,
+                "sbi_main_codes": filters.sbi_main_codes,
+                "sbi_main_file": filters.sbi_main_file,
+                "sbi_sub_codes": filters.sbi_sub_codes,
+                "sbi_sub_file": filters.sbi_sub_file,
+                "sbi_all_codes": filters.sbi_all_codes,
+                "sbi_all_file": filters.sbi_all_file,
+                "thruai": "",
+                "message": "",
+                "message_send": "",
+                "status": "",
+                "website_text": "",
+                "before": before_val,
+            })
+
+    def finish(self) -> Dict[str, object]:
+        rows_data = self.rows_data
+        if not rows_data:
+            raise ValueError("No rows found for the current selection.")
+
+        target: Path
+        if self.target_path:
+            target = Path(self.target_path).expanduser().resolve()
+        else:
+            target = default_tracking_path(self.campaign_dir, self.base_name)
+
+        existing_rows, existing_ids = _read_existing_tracking(target)
+
+        if self.mode == "update" and not target.exists() and not existing_rows:
+            raise ValueError("Tracking CSV does not exist yet. Use create to generate it first.")
+
+        ordered_rows: List[Dict[str, str]] = list(existing_rows)
+        for payload in rows_data:
+            payload["id"] = _generate_unique_id(existing_ids)
+            ordered_rows.append(payload)
+
+        _write_tracking_rows(target, ordered_rows)
+
+        return {
+            "path": str(target),
+            "rows": len(ordered_rows),
+            "new_rows": len(rows_data),
+            "duplicates_folder": self.duplicates_source_resolved,
+            "duplicates_source": self.duplicates_source_resolved,
+        }
+
+    def close(self) -> None:
+        pass
+
+
 def create_or_update_tracking_csv(
     *,
     selected: Dict,
@@ -320,105 +451,16 @@ def create_or_update_tracking_csv(
     target_path: str | Path | None = None,
     duplicates_source: str | Path | None = None,
 ) -> Dict[str, object]:
-    header, rows_iter = combinator.iter_filtered_rows(selected or {}, advanced or {})
-    kvk_idx = combinator._find_kvk_index(header)
-    if kvk_idx is None:
-        raise ValueError("Could not find a KVK column in the source CSV.")
-
-    campaign_dir = Path(campaign_directory or "").expanduser()
-    if not str(campaign_dir):
-        raise ValueError("Campaign directory is required. Run a custom save first.")
-
-    base_name = (subcampaign_base or "").strip()
-    if not base_name:
-        raise ValueError("Base filename is required to derive campaign metadata.")
-
-    filters = FilterColumns.from_selected(selected)
-    raw_duplicates = duplicates_source if duplicates_source else _extract_duplicates_folder(advanced or {})
-    duplicates_source_resolved = ""
-    duplicates_lookup: Optional[set[str]] = None
-    if raw_duplicates:
-        lookup_path = Path(raw_duplicates).expanduser()
-        duplicates_lookup = combinator._load_existing_kvk_numbers(lookup_path)
-        duplicates_source_resolved = str(lookup_path.resolve())
-
-    seen_kvk: set[str] = set()
-    rows_data: List[Dict[str, str]] = []
-    for row in rows_iter:
-        if kvk_idx >= len(row):
-            continue
-        kvk = (row[kvk_idx] or "").strip()
-        if not kvk or kvk in seen_kvk:
-            continue
-        seen_kvk.add(kvk)
-        before_val = ""
-        if duplicates_lookup is not None:
-            before_val = "TRUE" if kvk in duplicates_lookup else "FALSE"
-        timestamp = datetime.now().astimezone().isoformat(timespec="seconds")
-        rows_data.append({
-            "kvknumber": kvk,
-            "campaign": campaign_dir.name,
-            "subcampaign": base_name,
-            "date_added": timestamp,
-            "economischactief": filters.economischactief,
-            "rechtsvorm": filters.rechtsvorm,
-            "location": filters.location,
-            "working_min": filters.working_min,
-            "working_max": filters.working_max,
-            "contactpersoon": filters.contactpersoon,
-            "media": filters.media,
-            "traditional_outreach": filters.traditional_outreach,
-            "vestiging_gebruiksdoel": filters.vestiging_gebruiksdoel,
-            "vestiging_hoofdvestiging": filters.vestiging_hoofdvestiging,
-            "vestiging_kvk_non_mailing": filters.vestiging_kvk_non_mailing,
-            "vestiging_oppervlakte_min": filters.vestiging_oppervlakte_min,
-            "vestiging_oppervlakte_max": filters.vestiging_oppervlakte_max,
-            "overige_date_min": filters.overige_date_min,
-            "overige_date_max": filters.overige_date_max,
-            "overige_tradenames": filters.overige_tradenames,
-            "sbi_main_codes": filters.sbi_main_codes,
-            "sbi_main_file": filters.sbi_main_file,
-            "sbi_sub_codes": filters.sbi_sub_codes,
-            "sbi_sub_file": filters.sbi_sub_file,
-            "sbi_all_codes": filters.sbi_all_codes,
-            "sbi_all_file": filters.sbi_all_file,
-            "thruai": "",
-            "message": "",
-            "message_send": "",
-            "status": "",
-            "website_text": "",
-            "before": before_val,
-        })
-
-    if not rows_data:
-        raise ValueError("No rows found for the current selection.")
-
-    mode_norm = (mode or "create").strip().lower()
-    target: Path
-    if target_path:
-        target = Path(target_path).expanduser().resolve()
-    else:
-        target = default_tracking_path(campaign_dir, base_name)
-
-    existing_rows, existing_ids = _read_existing_tracking(target)
-
-    if mode_norm == "update" and not target.exists() and not existing_rows:
-        raise ValueError("Tracking CSV does not exist yet. Use create to generate it first.")
-
-    ordered_rows: List[Dict[str, str]] = list(existing_rows)
-    for payload in rows_data:
-        payload["id"] = _generate_unique_id(existing_ids)
-        ordered_rows.append(payload)
-
-    _write_tracking_rows(target, ordered_rows)
-
-    return {
-        "path": str(target),
-        "rows": len(ordered_rows),
-        "new_rows": len(rows_data),
-        "duplicates_folder": duplicates_source_resolved,
-        "duplicates_source": duplicates_source_resolved,
-    }
+    sink = TrackingSink(
+        selected=selected,
+        advanced=advanced,
+        campaign_directory=campaign_directory,
+        subcampaign_base=subcampaign_base,
+        mode=mode,
+        target_path=target_path,
+        duplicates_source=duplicates_source,
+    )
+    return combinator.run_job(selected or {}, {"tracking": sink}, advanced or {})["tracking"]
 
 
 def revert_latest_tracking_row(
@@ -0,0 +1,161 @@
+"""Startup warm-up: build caches and indexes before the first request needs them.
+
+:func:`start` runs the components below one after another on a daemon thread.
+Requests never wait for it: whatever is not ready yet is loaded on demand as
+before, and while the snapshot is still being built the filters stream the
+CSV (``snapshot.get_snapshot`` does not block on a build in progress).
+``/api/health/ready`` reports :func:`status`.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+from . import analysis
+from .config import CSV_PATH, SNAPSHOT_ENABLED, WARMUP_ENABLED
+from .filterscripts import catalog, location_filter, sample, schema, snapshot
+
+
+class Skipped(Exception):
+    """Raised by a component that does not apply to this configuration."""
+
+
+def _log(msg: str) -> None:
+    print(f"[WARMUP] {msg}")
+
+
+def _geometry() -> str:
+    location_filter._load_all()
+    return f"{len(location_filter.distinct_values())} areas"
+
+
+def _baseline() -> str:
+    analysis._load_baseline()
+    return "reference summaries loaded"
+
+
+def _snapshot() -> str:
+    if not SNAPSHOT_ENABLED:
+        raise Skipped("snapshots disabled")
+    snap = snapshot.get_snapshot(CSV_PATH, wait=True)
+    if snap is None:
+        raise RuntimeError("snapshot build failed; requests stream the CSV")
+    return f"{snap.row_count} rows ({snap.version})"
+
+
+def _catalog() -> str:
+    return f"{len(catalog.columns(CSV_PATH))} columns"
+
+
+def _sample() -> str:
+    snap = snapshot.get_snapshot(CSV_PATH)
+    if snap is not None:
+        return f"{len(sample.snapshot_sample(snap))} rows"
+    return f"{len(sample.csv_sample(CSV_PATH)[1])} rows"
+
+
+def _locations() -> str:
+    snap = snapshot.get_snapshot(CSV_PATH)
+    if snap is None:
+        raise Skipped("no snapshot")
+    return f"{prepare_locations(snap)} areas evaluated"
+
+
+def prepare_locations(snap) -> int:
+    """Evaluate every province/custom AOI and the analysis province column on ``snap``."""
+    areas = location_filter.distinct_values()
+    header = list(snap.header)
+    for area in areas:
+        location_filter.warm(snap, header, area)
+    cols = schema.for_header(header)
+    lon_i, lat_i = cols.resolve("lon"), cols.resolve("lat")
+    if lon_i is not None and lat_i is not None:
+        location_filter.province_column(snap, lon_i, lat_i)
+    return len(areas)
+
+
+def prepare(snap) -> None:
+    """Build the per-version structures the warm-up builds, on a snapshot not yet
+    active (a snapshot.PREPARE_HOOKS entry, see watcher.py)."""
+    sample.snapshot_sample(snap)
+    prepare_locations(snap)
+
+
+# Run in this order; later components reuse what earlier ones built.
+COMPONENTS: "OrderedDict[str, Callable[[], Optional[str]]]" = OrderedDict([
+    ("geometry", _geometry),
+    ("baseline", _baseline),
+    ("snapshot", _snapshot),
+    ("catalog", _catalog),
+    ("sample", _sample),
+    ("locations", _locations),
+])
+
+def _initial_state() -> Dict[str, Dict[str, object]]:
+    return {name: {"status": "pending" if WARMUP_ENABLED else "skipped"} for name in COMPONENTS}
+
+
+_STATE: Dict[str, Dict[str, object]] = _initial_state()
+_LOCK = threading.Lock()
+_THREAD: Optional[threading.Thread] = None
+
+
+def _after_fork() -> None:
+    # A forked child (e.g. a gunicorn --preload worker) has none of the
+    # parent's threads: forget the warm-up so start() runs it again there.
+    global _STATE, _LOCK, _THREAD
+    _STATE = _initial_state()
+    _LOCK = threading.Lock()
+    _THREAD = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def _set(name: str, **fields) -> None:
+    with _LOCK:
+        _STATE[name] = dict(fields)
+
+
+def _run() -> None:
+    started = time.perf_counter()
+    for name, fn in COMPONENTS.items():
+        _set(name, status="running")
+        t0 = time.perf_counter()
+        try:
+            detail = fn()
+        except Skipped as exc:
+            _set(name, status="skipped", detail=str(exc))
+            continue
+        except Exception as exc:  # a failed component must not stop the others
+            _set(name, status="failed", seconds=round(time.perf_counter() - t0, 3), error=str(exc))
+            _log(f"{name} failed: {exc}")
+            continue
+        seconds = time.perf_counter() - t0
+        _set(name, status="ready", seconds=round(seconds, 3), detail=detail)
+        _log(f"{name} ready in {seconds:.2f}s ({detail})")
+    _log(f"done in {time.perf_counter() - started:.2f}s")
+
+
+def start() -> bool:
+    """Start the warm-up thread (once per process); False when disabled or already started."""
+    global _THREAD
+    with _LOCK:
+        if not WARMUP_ENABLED or _THREAD is not None:
+            return False
+        _THREAD = threading.Thread(target=_run, name="warmup", daemon=True)
+    _THREAD.start()
+    return True
+
+
+def status() -> Dict[str, object]:
+    """Per-component status (``pending``, ``running``, ``ready``, ``failed``,
+    ``skipped``) with build seconds; ``ready`` once none is pending or running."""
+    with _LOCK:
+        components = {name: dict(state) for name, state in _STATE.items()}
+    done = all(state["status"] not in ("pending", "running") for state in components.values())
+    return {"ready": done, "started": _THREAD is not None, "components": components}
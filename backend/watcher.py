@@ -0,0 +1,111 @@
+"""Polling watcher for new versions of the source CSV.
+
+Every WATCH_INTERVAL seconds the thread compares the signature (path, size,
+mtime) of CSV_PATH with the version requests are served from. A changed file
+is only picked up once its signature has stayed the same for one more poll,
+so a CSV that is still being written is never ingested half-way. Then:
+
+- with snapshots, snapshot.refresh() builds the new version into its own
+  directory, runs the warm-up's per-version builds on it and swaps it in;
+  requests keep using the previous version until then and finish on it;
+- without, the value catalog and preview sample of the new file are built
+  ahead of the first request.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from . import warmup
+from .config import CSV_PATH, SNAPSHOT_ENABLED, WATCH_ENABLED, WATCH_INTERVAL
+from .filterscripts import catalog, sample, snapshot
+
+_THREAD: Optional[threading.Thread] = None
+_LOCK = threading.Lock()
+_STATE: Dict[str, object] = {"last_check": None, "pending": None, "prepared": None}
+
+
+def _after_fork() -> None:
+    # A forked child (e.g. a gunicorn --preload worker) does not inherit the
+    # polling thread; forget it so start() polls from the child as well.
+    global _THREAD, _LOCK, _STATE
+    _THREAD = None
+    _LOCK = threading.Lock()
+    _STATE = {"last_check": None, "pending": None, "prepared": None}
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def _log(msg: str) -> None:
+    print(f"[WATCH] {msg}")
+
+
+def _prepare(signature: Tuple[str, int, int]) -> None:
+    if SNAPSHOT_ENABLED:
+        if snapshot.refresh(CSV_PATH):
+            _log(f"building snapshot for {CSV_PATH.name} ({signature[1]} bytes)")
+        return
+    catalog.columns(CSV_PATH)
+    sample.csv_sample(CSV_PATH)
+    _STATE["prepared"] = signature
+    _log(f"catalog and sample ready for {CSV_PATH.name} ({signature[1]} bytes)")
+
+
+def check() -> None:
+    """One poll: prepare the source's current version if it is new and has settled."""
+    try:
+        signature = snapshot.source_signature(CSV_PATH)
+    except OSError:
+        return
+    _STATE["last_check"] = time.time()
+    if _STATE["pending"] != signature:
+        _STATE["pending"] = signature  # settle for one more interval
+        return
+    if SNAPSHOT_ENABLED:
+        current = snapshot.active(CSV_PATH)
+        if current is None or current.signature != signature:
+            _prepare(signature)
+    elif _STATE["prepared"] != signature:
+        _prepare(signature)
+
+
+def _run() -> None:
+    while True:
+        try:
+            check()
+        except Exception as exc:  # keep watching after a failed rebuild
+            _log(f"check failed: {exc}")
+        time.sleep(WATCH_INTERVAL)
+
+
+def start() -> bool:
+    """Start the watcher thread (once per process); False when disabled or already started."""
+    global _THREAD
+    with _LOCK:
+        if not WATCH_ENABLED or _THREAD is not None:
+            return False
+        if warmup.prepare not in snapshot.PREPARE_HOOKS:
+            snapshot.PREPARE_HOOKS.append(warmup.prepare)
+        _THREAD = threading.Thread(target=_run, name="source-watcher", daemon=True)
+    _THREAD.start()
+    return True
+
+
+def status() -> Dict[str, object]:
+    """Served source version and the last poll time."""
+    try:
+        served = snapshot.served_signature(CSV_PATH)
+    except OSError:
+        served = None
+    current = snapshot.active(CSV_PATH)
+    return {
+        "watching": _THREAD is not None,
+        "interval": WATCH_INTERVAL,
+        "last_check": _STATE["last_check"],
+        "served": {"size": served[1], "mtime_ns": served[2]} if served else None,
+        "snapshot": current.version if current is not None else None,
+    }
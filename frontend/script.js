@@ -3,6 +3,7 @@ const API = (path) => `${location.origin}${path}`;
 
 let FILTERS_META = [];     // [{key,label,type}]
 let FILTER_OPTIONS = {};   // key -> [options]
+let FILTER_COUNTS = {};    // key -> {option: rows} (from the value catalog)
 let SELECTED = {};         // key -> [] OR custom per filter
 let ACTIVE_KEY = null;
 let SBI_FILES = { main: [], sub: [], all: [] };
@@ -595,6 +596,7 @@ async function runTracking(mode){
     if(!res.ok || (data && data.ok === false)){
       throw new Error((data && data.error) || res.statusText || "Tracking failed");
     }
+    data = await waitForJob(data, job => setTrackingStatus(formatJobProgress(mode === "update" ? "Updating…" : "Creating…", job)));
     if(pathInput && typeof data.path === "string"){
       pathInput.value = data.path;
     }
@@ -756,6 +758,68 @@ function formatNumber(value, decimals = 0){
   return value.toLocaleString();
 }
 
+// Long runs (save, analysis, tracking, uncached previews) come back as a job
+// id. followJob() listens to the job's Server-Sent Events and resolves with
+// its result as if the request had answered directly.
+function followJob(jobId, onProgress, onStart){
+  return new Promise((resolve, reject) => {
+    const source = new EventSource(API(`/api/jobs/${jobId}/events`));
+    const finish = (fn, value) => {
+      source.close();
+      fn(value);
+    };
+    if(typeof onStart === "function"){
+      onStart(() => finish(reject, new Error("Job stopped")));
+    }
+    const parse = (event) => {
+      try{ return JSON.parse(event.data); } catch(_err){ return {}; }
+    };
+    source.addEventListener("progress", event => {
+      if(typeof onProgress === "function"){
+        onProgress(parse(event));
+      }
+    });
+    source.addEventListener("done", event => finish(resolve, parse(event).result || {}));
+    ["failed", "cancelled"].forEach(status => {
+      source.addEventListener(status, event => {
+        const job = parse(event);
+        finish(reject, new Error(job.error || `Job ${status}`));
+      });
+    });
+    source.onerror = () => finish(reject, new Error("Lost connection to the job"));
+  });
+}
+
+async function waitForJob(data, onProgress){
+  if(!data || !data.job_id){
+    return data;
+  }
+  return followJob(data.job_id, onProgress);
+}
+
+function cancelJob(jobId){
+  return fetch(API(`/api/jobs/${jobId}/cancel`), { method: "POST" }).catch(() => null);
+}
+
+function formatJobProgress(label, job){
+  const progress = (job && job.progress) || {};
+  const parts = [label];
+  if(typeof progress.rows_total === "number" && progress.rows_total > 0){
+    const pct = Math.min(100, Math.round(100 * (progress.rows_scanned || 0) / progress.rows_total));
+    parts.push(`${pct}% scanned`);
+  }
+  if(progress.rows_matched){
+    parts.push(`${formatNumber(progress.rows_matched)} rows matched`);
+  }
+  if(typeof progress.rows_per_second === "number" && progress.rows_per_second > 0){
+    parts.push(`${formatNumber(progress.rows_per_second)} rows/s`);
+  }
+  if(typeof progress.eta_seconds === "number"){
+    parts.push(`~${Math.ceil(progress.eta_seconds)}s left`);
+  }
+  return parts.join(" · ");
+}
+
 function formatPercent(value){
   if(typeof value !== "number" || Number.isNaN(value)){
     return "0.00%";
@@ -1134,7 +1198,7 @@ function openPanel(key, force=false){
       const textarea = document.createElement("textarea");
       textarea.className = "sbi-codes";
       textarea.dataset.bucket = id;
-      textarea.placeholder = "e.g. 73110";
+      textarea.placeholder = "e.g. 73110 or 70*";
       textarea.value = (current[id].codes || []).join("\n");
       section.appendChild(textarea);
 
@@ -1230,7 +1294,9 @@ function openPanel(key, force=false){
       const id = `${key}__${opt.replace(/\s+/g,'_')}`;
       const wrap = document.createElement("label");
       wrap.className = "checkbox";
-      wrap.innerHTML = `<input type="checkbox" class="panel-opt" id="${id}" ${selected.has(opt)?'checked':''} data-value="${opt}"> <span>${opt}</span>`;
+      const rows = (FILTER_COUNTS[key] || {})[opt];
+      const count = rows === undefined ? '' : ` <span class="muted">(${Number(rows).toLocaleString()})</span>`;
+      wrap.innerHTML = `<input type="checkbox" class="panel-opt" id="${id}" ${selected.has(opt)?'checked':''} data-value="${opt}"> <span>${opt}</span>${count}`;
       return wrap;
     };
 
@@ -1376,6 +1442,7 @@ async function loadFilters(){
   const data = await res.json();
   FILTERS_META = data.filters || [];
   FILTER_OPTIONS = data.options || {};
+  FILTER_COUNTS = data.counts || {};
   FILTERS_META.forEach(f => {
     if(SELECTED[f.key] === undefined){
       if(f.type === "sbi"){
@@ -1396,7 +1463,56 @@ async function loadFilters(){
   markPreviewDirty();
 }
 
+// Running preview job: { id, stop } — a new preview or the stop button
+// cancels it, so previews never pile up on the server.
+let PREVIEW_JOB = null;
+
+// Identifies this tab to the server, which cancels our previous preview scan
+// as soon as a newer preview arrives (even before the stop request lands).
+const CLIENT_ID = (() => {
+  const key = "compfilterClientId";
+  try{
+    const existing = sessionStorage.getItem(key);
+    if(existing){ return existing; }
+  } catch(_err){ /* storage unavailable */ }
+  const id = (window.crypto && typeof window.crypto.randomUUID === "function")
+    ? window.crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+  try{ sessionStorage.setItem(key, id); } catch(_err){ /* storage unavailable */ }
+  return id;
+})();
+
+// "≈ 12,300 rows (12,050–12,560)" for a sample-based estimate.
+function formatEstimate(estimate){
+  if(!estimate || typeof estimate.estimate !== "number"){
+    return "";
+  }
+  const range = (typeof estimate.low === "number" && typeof estimate.high === "number")
+    ? ` (${formatNumber(estimate.low)}–${formatNumber(estimate.high)})`
+    : "";
+  return `≈ ${formatNumber(estimate.estimate)} rows${range}`;
+}
+
+function stopPreview(){
+  const job = PREVIEW_JOB;
+  PREVIEW_JOB = null;
+  setPreviewRunning(false);
+  if(job){
+    if(job.stop){ job.stop(); }
+    if(job.id){ cancelJob(job.id); }
+  }
+  return job !== null;
+}
+
+function setPreviewRunning(running){
+  const btn = document.getElementById("previewCancel");
+  if(btn){ btn.hidden = !running; }
+}
+
 async function doPreview(){
+  stopPreview();
+  const token = {};
+  PREVIEW_JOB = token;
   $("#previewOut").textContent = "…";
   let success = false;
   try{
@@ -1406,12 +1522,38 @@ async function doPreview(){
       body: JSON.stringify({
         selected: SELECTED,
         advanced: getAdvancedPayload(),
+        stream: true,
+        estimate: true,
+        clientId: CLIENT_ID,
       })
     });
-    const data = await res.json();
+    let data = await res.json();
     if(!res.ok || (data && data.ok === false)){
       throw new Error((data && data.error) || res.statusText || "Preview failed");
     }
+    if(PREVIEW_JOB !== token){
+      if(data && data.job_id){
+        cancelJob(data.job_id);
+      }
+      return false;
+    }
+    if(data && data.job_id){
+      token.id = data.job_id;
+      setPreviewRunning(true);
+      const approx = formatEstimate(data.estimate);
+      if(approx){
+        $("#previewOut").textContent = approx;
+      }
+      data = await followJob(data.job_id, job => {
+        if(PREVIEW_JOB === token && !approx){
+          $("#previewOut").textContent = formatJobProgress("Counting…", job);
+        }
+      }, stop => { token.stop = stop; });
+      if(PREVIEW_JOB === token){
+        PREVIEW_JOB = null;
+        setPreviewRunning(false);
+      }
+    }
     const count = typeof data.count === "number" ? data.count : Number.parseInt(data.count, 10) || 0;
     LAST_PREVIEW_COUNT = count;
     $("#previewOut").textContent = `${count.toLocaleString()} rows`;
@@ -1426,6 +1568,15 @@ async function doPreview(){
     updateAnalysisButtonState();
     success = true;
   }catch(err){
+    if(PREVIEW_JOB !== token){
+      // Superseded or stopped by the user; the newer run owns the indicator.
+      if(PREVIEW_JOB === null){
+        $("#previewOut").textContent = "Stopped";
+      }
+      return false;
+    }
+    PREVIEW_JOB = null;
+    setPreviewRunning(false);
     console.error('Preview failed', err);
     LAST_PREVIEW_COUNT = null;
     $("#previewOut").textContent = "Error";
@@ -1869,10 +2020,15 @@ async function runAnalysis(){
         dimensions: dims,
       }),
     });
-    const data = await res.json();
+    let data = await res.json();
     if(!res.ok || (data && data.ok === false)){
       throw new Error((data && data.error) || res.statusText || "Analysis failed");
     }
+    data = await waitForJob(data, job => {
+      if(statusEl){
+        statusEl.textContent = formatJobProgress("Running analysis…", job);
+      }
+    });
     renderAnalysisResults(data);
     if(statusEl){
       const total = typeof data.total_rows === "number" ? data.total_rows : null;
@@ -2470,6 +2626,7 @@ async function doCustomSave(){
     if(!res.ok || !data.ok){
       throw new Error(data.error || res.statusText || 'Save failed');
     }
+    data = await waitForJob(data, job => setCustomSaveStatus(formatJobProgress('Saving…', job)));
     const files = Array.isArray(data.files) ? data.files : [];
     const created = typeof data.created_files === 'number' ? data.created_files : files.length;
     const totalRows = typeof data.total_rows === 'number' ? data.total_rows : null;
@@ -2551,6 +2708,9 @@ async function handleLocationUpload(){
 
     const stem = String(data.stored_as || '').replace(/\.geojson$/i, '');
     const label = 'custom:' + stem;
+    if(typeof data.evaluation_seconds === 'number'){
+      console.info(`AOI ${label} evaluated in ${data.evaluation_seconds.toFixed(2)}s`);
+    }
     ensureLocationSelection(label);
 
     await loadFilters();
@@ -2600,6 +2760,7 @@ document.addEventListener("DOMContentLoaded", () => {
   setDuplicatesPanelVisible(false);
   loadFilters();
   $("#previewBtn")?.addEventListener("click", doPreview);
+  $("#previewCancel")?.addEventListener("click", stopPreview);
   $("#downloadBtn")?.addEventListener("click", doDownload);
   $("#createPreferenceBtn")?.addEventListener("click", (ev) => {
     ev.preventDefault();